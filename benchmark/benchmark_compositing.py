@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Compares the per-frame cost of occlusion compositing (overlay_depth_images + get_segmentation_image) with the previous
+implementation that looped over the objects with one full-image pass per object and step, for 1 to 30 objects.
+
+overlay_depth_images() no longer stacks the depth images of all objects into one array and reduces it at once: it folds
+them one by one into a running minimum within the region of each object, so that only one depth image besides the
+combined one needs to be kept, and the "running min" column measures this.
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+from StringIO import StringIO
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from perception import DepthImage
+from cuboid_utils import get_cuboid2d_visibility
+from make_segmentation_imgs import ModelConfig, MAX_DEPTH_DIFF, get_segmentation_image, overlay_depth_images
+from pose_utils import invert, poses_from_rotations_translations
+from synthetic import make_camera_intrinsics, random_depth_images
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark occlusion compositing vs. number of objects.')
+    parser.add_argument('--frames', type=int, default=10, help='number of frames per object count')
+    parser.add_argument('--max-objects', type=int, default=30)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+
+    camera_intrinsics = make_camera_intrinsics(args.width, args.height)
+    random_state = np.random.RandomState(0)
+
+    print '{} frames per object count, {}x{}'.format(args.frames, args.width, args.height)
+    print '{:>7} {:>12} {:>16} {:>8}'.format('objects', 'loop [ms]', 'running min [ms]', 'speedup')
+    for num_objects in range(1, args.max_objects + 1):
+        frames = [random_frame(camera_intrinsics, num_objects, random_state) for _ in range(args.frames)]
+        loop_time, loop_results = benchmark(composite_loop, frames, camera_intrinsics)
+        running_min_time, running_min_results = benchmark(composite_running_min, frames, camera_intrinsics)
+        for loop_result, running_min_result in zip(loop_results, running_min_results):
+            assert_identical(loop_result, running_min_result)
+        print '{:7d} {:12.2f} {:16.2f} {:7.1f}x'.format(num_objects, 1000.0 * loop_time / args.frames,
+                                                       1000.0 * running_min_time / args.frames,
+                                                       loop_time / running_min_time)
+
+
+def random_frame(camera_intrinsics, num_objects, random_state):
+    depth_images, projected_cuboids = random_depth_images(camera_intrinsics, num_objects, random_state)
+    class_names = ['object_{:02d}'.format(i) for i in range(num_objects)]
+    frame_json = {'objects': [{'class': class_name, 'projected_cuboid': projected_cuboid}
+                              for class_name, projected_cuboid in zip(class_names, projected_cuboids)]}
+    models = {class_name: ModelConfig(class_name, i + 1, None, None, None) for i, class_name in enumerate(class_names)}
+    object_poses = poses_from_rotations_translations(np.tile(np.eye(3), (num_objects, 1, 1)),
+                                                     random_state.randn(num_objects, 3))
+
+    # real depth: the first object plus noise, so that some pixels of the other objects are filtered out
+    real_depth_image = depth_images[0].raw_data.astype(np.float64)
+    real_depth_image += random_state.normal(0.0, MAX_DEPTH_DIFF, real_depth_image.shape)
+    return frame_json, depth_images, real_depth_image, object_poses, models
+
+
+def benchmark(func, frames, camera_intrinsics):
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        start = time.time()
+        results = [func(frame, camera_intrinsics) for frame in frames]
+        elapsed = time.time() - start
+    finally:
+        sys.stdout = stdout
+    return elapsed, results
+
+
+def composite_running_min(frame, camera_intrinsics):
+    frame_json, depth_images, real_depth_image, object_poses, models = frame
+    # overlay_depth_images() empties the list, which the other implementation needs, too
+    combined_depth_image, object_index_image, silhouette_bounds = overlay_depth_images(list(depth_images))
+    return get_segmentation_image(frame_json, combined_depth_image, object_index_image, silhouette_bounds,
+                                  real_depth_image, camera_intrinsics, object_poses, models)
+
+
+def composite_loop(frame, camera_intrinsics):
+    """
+    The previous implementation of overlay_depth_images + get_segmentation_image.
+    """
+    frame_json, depth_images, real_depth_image, object_poses, models = frame
+    num_objects = len(depth_images)
+
+    object_index_image = np.full_like(depth_images[0].raw_data, 255, dtype=np.uint8)
+    combined_depth_image = np.full_like(depth_images[0].raw_data, np.inf)
+    for object_index in range(num_objects):
+        depth_image = depth_images[object_index].raw_data
+        mask = np.logical_and(depth_image < combined_depth_image, depth_image != 0)
+        combined_depth_image = np.choose(mask, (combined_depth_image, depth_image))
+        object_index_image = np.choose(mask, (object_index_image, object_index))
+    combined_depth_image[object_index_image == 255] = 0.0
+    silhouettes = [depth_image.raw_data > 0 for depth_image in depth_images]
+
+    updated_frame_json = copy.deepcopy(frame_json)
+    img_height, img_width = object_index_image.shape[:2]
+    for object_index in range(num_objects):
+        silhouette = silhouettes[object_index]
+        cols = np.any(silhouette, axis=0)
+        rows = np.any(silhouette, axis=1)
+        if not np.any(cols):
+            continue
+        umin, umax = np.nonzero(cols)[0][[0, -1]]
+        vmin, vmax = np.nonzero(rows)[0][[0, -1]]
+        updated_frame_json['objects'][object_index]['bounding_box'] = {'top_left': [vmin, umin],
+                                                                       'bottom_right': [vmax, umax]}
+
+    visible_pixels_before_filtering = num_objects * [0]
+    for object_index in range(num_objects):
+        visible_pixels_before_filtering[object_index] = int(np.sum(object_index_image == object_index))
+
+    within_depth_diff_mask = np.logical_or(real_depth_image == 0.0,
+                                           np.absolute(combined_depth_image - real_depth_image) < MAX_DEPTH_DIFF)
+    object_index_image = np.choose(within_depth_diff_mask, (255, object_index_image))
+
+    for object_index in range(num_objects):
+        total_pixels = np.sum(silhouettes[object_index])
+        visible_pixels = np.sum(object_index_image == object_index)
+        if total_pixels == 0:
+            visibility = 0.0
+            ground_truth_mismatch = 0.0
+        else:
+            visibility = float(visible_pixels) / total_pixels
+            ground_truth_mismatch = float(visible_pixels_before_filtering[object_index] - visible_pixels) / total_pixels
+        visibility *= get_cuboid2d_visibility(updated_frame_json['objects'][object_index]['projected_cuboid'],
+                                              img_width, img_height)
+        updated_frame_json['objects'][object_index]['visibility'] = visibility
+        updated_frame_json['objects'][object_index]['ground_truth_mismatch'] = ground_truth_mismatch
+
+    segmentation_image = np.zeros_like(object_index_image)
+    for object_index in range(num_objects):
+        segmentation_id = models[frame_json['objects'][object_index]['class']].segmentation_class_id
+        segmentation_image = np.where(object_index_image == object_index, segmentation_id, segmentation_image)
+
+    vertmap = np.zeros((object_index_image.shape[0], object_index_image.shape[1], 3), dtype=np.float32)
+    points_camera = camera_intrinsics.deproject(DepthImage(combined_depth_image, frame=camera_intrinsics.frame))
+    points_camera_homog = np.r_[points_camera.data, np.ones([1, points_camera.num_points])]
+    for object_index in range(num_objects):
+        points_model = invert(object_poses[object_index]).dot(points_camera_homog)[0:3, :]
+        points_model_data = np.transpose(points_model).reshape(vertmap.shape)
+        vertmap = np.where(object_index_image == object_index, points_model_data, vertmap)
+
+    return segmentation_image, updated_frame_json, vertmap
+
+
+def assert_identical(loop_result, running_min_result):
+    loop_segmentation_image, loop_frame_json, loop_vertmap = loop_result
+    running_min_segmentation_image, running_min_frame_json, running_min_vertmap = running_min_result
+    assert np.array_equal(loop_segmentation_image, running_min_segmentation_image)
+    assert np.array_equal(loop_vertmap, running_min_vertmap)
+    assert loop_frame_json == running_min_frame_json
+
+
+if __name__ == "__main__":
+    main()
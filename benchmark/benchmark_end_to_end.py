@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of make_segmentation_imgs.py on synthetic data folders (see synthetic.write_dataset()), so that it
+runs without the dataset. For every resolution and number of objects per frame, it times
+
+    process_frame            per frame, with the models and renderer loaded once
+    get_segmentation_image   per frame, within these process_frame calls
+    main                     the whole tool on the folder, including loading the meshes and all file I/O
+
+and writes the results to a JSON file, so that runs before and after a change can be compared.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from StringIO import StringIO
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import make_segmentation_imgs
+from synthetic import CONFIG_DIR, write_dataset
+
+OBJECT_SETTINGS = os.path.join(CONFIG_DIR, 'ycb_object_settings.json')
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark make_segmentation_imgs.py on synthetic data.')
+    parser.add_argument('--resolutions', nargs='+', default=['640x480', '1280x720', '1920x1080'],
+                        help='image sizes as WIDTHxHEIGHT')
+    parser.add_argument('--objects', nargs='+', type=int, default=[1, 5, 10], help='numbers of objects per frame')
+    parser.add_argument('--frames', type=int, default=10, help='number of frames per folder')
+    parser.add_argument('--renderer', choices=['opengl', 'numpy'], default='opengl')
+    parser.add_argument('--grouped-passes', action='store_true')
+    parser.add_argument('--output', default=RESULTS_FILE,
+                        help='JSON file for the results. default: benchmark_results.json next to this script')
+    args = parser.parse_args()
+
+    results = []
+    print '{:>10} {:>8} {:>20} {:>26} {:>12}'.format('resolution', 'objects', 'process_frame [ms]',
+                                                    'get_segmentation_image [ms]', 'main [fps]')
+    for resolution in args.resolutions:
+        (width, height) = [int(size) for size in resolution.split('x')]
+        for num_objects in args.objects:
+            tmp_dir = tempfile.mkdtemp()
+            try:
+                random_state = np.random.RandomState(0)
+                data_dir, mesh_dir = write_dataset(tmp_dir, width, height, args.frames, num_objects, random_state)
+                tool_args = ['-d', data_dir, '-m', mesh_dir, '-o', OBJECT_SETTINGS, '-t', OBJECT_SETTINGS,
+                             '--mesh-cache-dir', os.path.join(tmp_dir, 'mesh_cache'), '--renderer', args.renderer]
+                if args.grouped_passes:
+                    tool_args.append('--grouped-passes')
+                result = benchmark_folder(tool_args)
+            finally:
+                shutil.rmtree(tmp_dir)
+            result.update({'width': width, 'height': height, 'objects': num_objects, 'frames': args.frames})
+            results.append(result)
+            print '{:>10} {:8d} {:20.1f} {:26.1f} {:12.2f}'.format(
+                resolution, num_objects, result['process_frame']['mean_ms'],
+                result['get_segmentation_image']['mean_ms'], result['main']['fps'])
+
+    with open(args.output, 'w') as f:
+        json.dump({'date': datetime.datetime.now().isoformat(), 'revision': git_revision(), 'host': platform.node(),
+                   'numpy': np.__version__, 'renderer': args.renderer, 'grouped_passes': args.grouped_passes,
+                   'results': results}, f, indent=2, sort_keys=True)
+    print 'Results written to {}'.format(args.output)
+
+
+def benchmark_folder(tool_args):
+    """
+    :param tool_args: command line arguments of make_segmentation_imgs.py for the folder
+    :return dictionary with the timings of process_frame, get_segmentation_image and main
+    """
+    args = make_segmentation_imgs.parse_args(tool_args)
+    json_files = sorted(os.path.join(args.data_dir, f) for f in os.listdir(args.data_dir) if f.endswith('.ycbm.json'))
+    camera_intrinsics, models, renderer = make_segmentation_imgs.load_folder(args)
+    frames = [make_segmentation_imgs.read_frame(json_file, args) for json_file in json_files]
+
+    # get_segmentation_image is timed within process_frame, which looks it up in the module on every call
+    get_segmentation_image = make_segmentation_imgs.get_segmentation_image
+    segmentation_seconds = []
+
+    def timed_get_segmentation_image(*func_args, **func_kwargs):
+        start = time.time()
+        try:
+            return get_segmentation_image(*func_args, **func_kwargs)
+        finally:
+            segmentation_seconds.append(time.time() - start)
+
+    process_frame_seconds = []
+    with quiet():
+        # warm-up: the first frame sets up the OpenGL context and uploads the meshes
+        make_segmentation_imgs.process_frame(frames[0][0], frames[0][1], camera_intrinsics, models, args.unit_scaling,
+                                             False, args.grouped_passes, renderer)
+    make_segmentation_imgs.get_segmentation_image = timed_get_segmentation_image
+    try:
+        with quiet():
+            for (frame_json, real_depth_image, _) in frames:
+                start = time.time()
+                make_segmentation_imgs.process_frame(frame_json, real_depth_image, camera_intrinsics, models,
+                                                     args.unit_scaling, False, args.grouped_passes, renderer)
+                process_frame_seconds.append(time.time() - start)
+    finally:
+        make_segmentation_imgs.get_segmentation_image = get_segmentation_image
+    renderer.close()
+
+    with quiet():
+        start = time.time()
+        make_segmentation_imgs.main(tool_args)
+        main_seconds = time.time() - start
+
+    return {'process_frame': statistics(process_frame_seconds),
+            'get_segmentation_image': statistics(segmentation_seconds),
+            'main': {'seconds': main_seconds, 'fps': len(json_files) / main_seconds}}
+
+
+def statistics(seconds):
+    seconds = 1000.0 * np.array(seconds)
+    (p50, p90) = np.percentile(seconds, [50, 90])
+    return {'mean_ms': np.mean(seconds), 'p50_ms': p50, 'p90_ms': p90, 'max_ms': np.max(seconds)}
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Suppresses the log output of the tool.
+    """
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        yield
+    finally:
+        sys.stdout = stdout
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    main()
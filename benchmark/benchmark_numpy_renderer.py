@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Accuracy and throughput of the NumPy CPU rasterizer compared with the OpenGL SceneRenderer (meshrender), on synthetic
+scenes. Accuracy is measured on the per-object depth images: the fraction of silhouette pixels on which both renderers
+disagree, and the depth difference on the pixels that both render.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from make_segmentation_imgs import SceneRenderer
+from numpy_renderer import NumpyRenderer
+from synthetic import make_meshes, make_camera_intrinsics, random_scene
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the NumPy rasterizer with the OpenGL renderer.')
+    parser.add_argument('--frames', type=int, default=20, help='number of frames to render')
+    parser.add_argument('--objects', type=int, default=8, help='number of objects per frame')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+
+    meshes = make_meshes()
+    camera_intrinsics = make_camera_intrinsics(args.width, args.height)
+    random_state = np.random.RandomState(0)
+    scenes = [random_scene(meshes.keys(), args.objects, random_state) for _ in range(args.frames)]
+
+    print '{} frames, {} objects per frame, {}x{}, {} faces per mesh'.format(
+        args.frames, args.objects, args.width, args.height, len(meshes.values()[0].faces))
+
+    opengl_renderer = SceneRenderer(meshes, camera_intrinsics, 1.0)
+    opengl_renderer.render_scene(*scenes[0])  # creates the GL context and uploads all meshes
+    numpy_renderer = NumpyRenderer(meshes, camera_intrinsics, 1.0)
+
+    results = {}
+    for name, renderer in [('opengl', opengl_renderer), ('numpy', numpy_renderer)]:
+        start = time.time()
+        results[name] = [renderer.render_depth_images(object_poses, class_names)
+                         for object_poses, class_names in scenes]
+        elapsed = time.time() - start
+        print '{:8} one render per object {:8.2f} frames/sec'.format(name, args.frames / elapsed)
+
+        start = time.time()
+        for object_poses, class_names in scenes:
+            renderer.render_scene(object_poses, class_names)
+        elapsed = time.time() - start
+        print '{:8} single pass           {:8.2f} frames/sec'.format(name, args.frames / elapsed)
+    opengl_renderer.close()
+
+    silhouette_pixels = 0
+    mismatched_pixels = 0
+    depth_differences = []
+    for opengl_depth_images, numpy_depth_images in zip(results['opengl'], results['numpy']):
+        for opengl_depth_image, numpy_depth_image in zip(opengl_depth_images, numpy_depth_images):
+            opengl_depth = opengl_depth_image.data
+            numpy_depth = numpy_depth_image.data
+            silhouette_pixels += np.count_nonzero(opengl_depth)
+            mismatched_pixels += np.count_nonzero((opengl_depth > 0) != (numpy_depth > 0))
+            both = (opengl_depth > 0) & (numpy_depth > 0)
+            depth_differences.append(np.abs(opengl_depth[both].astype(np.float64) - numpy_depth[both]))
+    depth_differences = np.concatenate(depth_differences)
+
+    print
+    print 'accuracy of the numpy renderer:'
+    print '  silhouette pixels that differ: {} of {} ({:.4%})'.format(mismatched_pixels, silhouette_pixels,
+                                                                      float(mismatched_pixels) / silhouette_pixels)
+    print '  depth difference: mean {:.2e}, 99th percentile {:.2e}, max {:.2e}'.format(
+        np.mean(depth_differences), np.percentile(depth_differences, 99), np.max(depth_differences))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Compares the pose math of process_frame() with one RigidTransform per object (as it used to be) and with pose_utils on
+N x 4 x 4 arrays: parsing the JSON poses, composing them with the model transforms, converting back to location and
+quaternion_xyzw, pose_transform_permuted and inverting (for the vertmap).
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from autolab_core import RigidTransform
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pose_utils import compose, invert, poses_from_json, poses_to_json, pose_transforms_permuted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pose math per object vs. on arrays of poses.')
+    parser.add_argument('--poses', type=int, default=10000, help='number of object poses')
+    args = parser.parse_args()
+
+    random_state = np.random.RandomState(0)
+    scene_objects_json = []
+    for _ in range(args.poses):
+        quaternion_xyzw = random_state.randn(4)
+        scene_objects_json.append({'location': random_state.uniform(-0.5, 0.5, 3).tolist(),
+                                   'quaternion_xyzw': (quaternion_xyzw / np.linalg.norm(quaternion_xyzw)).tolist()})
+    model_transform = RigidTransform(rotation=RigidTransform.random_rotation(), translation=random_state.randn(3),
+                                     from_frame='target_model', to_frame='source_model')
+
+    start = time.time()
+    loop_results = rigid_transform_poses(scene_objects_json, model_transform)
+    loop_time = time.time() - start
+
+    start = time.time()
+    array_results = array_poses(scene_objects_json, model_transform.matrix)
+    array_time = time.time() - start
+
+    assert loop_results[0] == array_results[0]
+    for loop_result, array_result in zip(loop_results[1:], array_results[1:]):
+        assert np.array_equal(loop_result, array_result)
+    print '{} poses: RigidTransform {:.1f} ms, pose_utils {:.1f} ms ({:.1f}x)'.format(
+        args.poses, 1000.0 * loop_time, 1000.0 * array_time, loop_time / array_time)
+
+
+def rigid_transform_poses(scene_objects_json, model_transform):
+    poses_json = []
+    poses_permuted = []
+    inverse_poses = []
+    to_lefthand = np.array([[0, 1, 0],
+                            [0, 0, -1],
+                            [1, 0, 0]])
+    for scene_object_json in scene_objects_json:
+        rotation = RigidTransform.rotation_from_quaternion(np.roll(np.array(scene_object_json['quaternion_xyzw']), 1))
+        object_pose = RigidTransform(rotation=rotation, translation=np.array(scene_object_json['location']),
+                                     from_frame='source_model', to_frame='camera')
+        object_pose = object_pose.dot(model_transform)
+        poses_json.append({'location': object_pose.translation.tolist(),
+                           'quaternion_xyzw': np.roll(object_pose.quaternion, -1).tolist()})
+
+        pose_permuted = np.eye(4)
+        pose_permuted[:3, 3] = object_pose.translation
+        pose_permuted[:3, :3] = object_pose.rotation.dot(to_lefthand)
+        poses_permuted.append(np.transpose(pose_permuted))
+        inverse_poses.append(object_pose.inverse().matrix)
+    return poses_json, np.array(poses_permuted), np.array(inverse_poses)
+
+
+def array_poses(scene_objects_json, model_transform):
+    object_poses = compose(poses_from_json(scene_objects_json), model_transform)
+    return poses_to_json(object_poses), pose_transforms_permuted(object_poses), invert(object_poses)
+
+
+if __name__ == "__main__":
+    main()
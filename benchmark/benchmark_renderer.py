@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Compares the rendering throughput of setting up a new scene for every frame (one scene per object, or one scene per
+frame with --grouped-passes) with a long-lived SceneRenderer that is shared by all frames. Like in process_frame(), the
+separately rendered depth images are overlaid, so that every variant yields the combined depth image, the object index
+image and the silhouette bounds.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from make_segmentation_imgs import SceneRenderer, get_projected_bounds, overlay_depth_images, render_depth_image
+from synthetic import make_meshes, make_camera_intrinsics, random_scene
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-frame vs. persistent rendering.')
+    parser.add_argument('--frames', type=int, default=50, help='number of frames to render')
+    parser.add_argument('--objects', type=int, default=8, help='number of objects per frame')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+
+    meshes = make_meshes()
+    camera_intrinsics = make_camera_intrinsics(args.width, args.height)
+    random_state = np.random.RandomState(0)
+    scenes = [random_scene(meshes.keys(), args.objects, random_state) for _ in range(args.frames)]
+    rois = [[get_projected_bounds(object_pose, meshes[class_name], camera_intrinsics)
+             for object_pose, class_name in zip(object_poses, class_names)] for object_poses, class_names in scenes]
+
+    def per_frame_scenes():
+        for (object_poses, class_names), frame_rois in zip(scenes, rois):
+            overlay_depth_images([render_depth_image(object_pose, camera_intrinsics, meshes[class_name], 1.0, False)
+                                  for object_pose, class_name in zip(object_poses, class_names)], frame_rois)
+
+    def per_frame_grouped_passes():
+        for object_poses, class_names in scenes:
+            renderer = SceneRenderer({class_name: meshes[class_name] for class_name in class_names},
+                                     camera_intrinsics, 1.0)
+            renderer.render_scene(object_poses, class_names)
+            renderer.close()
+
+    def persistent():
+        for (object_poses, class_names), frame_rois in zip(scenes, rois):
+            overlay_depth_images(persistent_renderer.render_depth_images(object_poses, class_names), frame_rois)
+
+    def persistent_grouped_passes():
+        for object_poses, class_names in scenes:
+            persistent_renderer.render_scene(object_poses, class_names)
+
+    print '{} frames, {} objects per frame, {}x{}'.format(args.frames, args.objects, args.width, args.height)
+
+    # the persistent renderer runs first: with EGL, closing any other scene terminates the shared display
+    persistent_renderer = SceneRenderer(meshes, camera_intrinsics, 1.0)
+    persistent_renderer.render_scene(*scenes[0])  # creates the GL context and uploads all meshes
+    benchmark('persistent renderer, one render per object', persistent, args.frames)
+    benchmark('persistent renderer, grouped passes', persistent_grouped_passes, args.frames)
+    persistent_renderer.close()
+
+    benchmark('per-frame scenes, one render per object', per_frame_scenes, args.frames)
+    benchmark('per-frame scene, grouped passes', per_frame_grouped_passes, args.frames)
+
+
+def benchmark(name, func, num_frames):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print '{:45} {:8.2f} frames/sec'.format(name, num_frames / elapsed)
+
+if __name__ == "__main__":
+    main()
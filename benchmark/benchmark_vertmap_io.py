@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Compares write time, read time, file size and precision of the vertmap formats on real frames, i.e. on the vertmaps
+(*.vertmap.npz) and segmentation images (*.seg.png) that make_segmentation_imgs.py wrote into a data dir.
+"""
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import imageio
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from vertmap_io import VERTMAP_FORMATS, load_vertmap, save_vertmap
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the vertmap formats.')
+    parser.add_argument('-d', '--data-dir', default=os.getcwd(),
+                        help='directory containing vertmap.npz and seg.png files')
+    parser.add_argument('--frames', type=int, default=20, help='maximum number of frames')
+    args = parser.parse_args()
+
+    filename_prefixes = [path[:-len('vertmap.npz')]
+                         for path in sorted(glob.glob(os.path.join(args.data_dir, '*.vertmap.npz')))][:args.frames]
+    if not filename_prefixes:
+        print 'No vertmap.npz files in {}'.format(args.data_dir)
+        sys.exit(1)
+    frames = [(load_vertmap(prefix + 'vertmap.npz'), imageio.imread(prefix + 'seg.png'))
+              for prefix in filename_prefixes]
+    print '{} frames, {}x{}'.format(len(frames), frames[0][0].shape[1], frames[0][0].shape[0])
+    print '{:8} {:>14} {:>14} {:>12} {:>12}'.format('format', 'write [ms]', 'read [ms]', 'size [kB]', 'max error')
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for vertmap_format in VERTMAP_FORMATS:
+            paths = []
+            start = time.time()
+            for i, (vertmap, labels) in enumerate(frames):
+                paths.append(save_vertmap(os.path.join(tmp_dir, '{:06d}.'.format(i)), vertmap, labels,
+                                          vertmap_format))
+            write_time = time.time() - start
+
+            start = time.time()
+            loaded_vertmaps = [np.asarray(load_vertmap(path)) for path in paths]
+            read_time = time.time() - start
+
+            size = sum(os.path.getsize(path) for path in paths)
+            max_error = max(np.max(np.abs(loaded_vertmap - vertmap))
+                            for loaded_vertmap, (vertmap, _) in zip(loaded_vertmaps, frames))
+            print '{:8} {:14.2f} {:14.2f} {:12.1f} {:12.2e}'.format(
+                vertmap_format, 1000.0 * write_time / len(frames), 1000.0 * read_time / len(frames),
+                size / 1024.0 / len(frames), max_error)
+            for path in paths:
+                os.remove(path)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Synthetic YCB-M-like scenes for the benchmarks, so that they run without the dataset: procedurally generated stand-in
+meshes (ellipsoids that fill the cuboid of each YCB class), random object poses and complete data folders.
+"""
+import json
+import os
+
+import imageio
+import numpy as np
+import trimesh
+from perception import CameraIntrinsics, DepthImage
+
+from numpy_renderer import NumpyRenderer
+from pose_utils import poses_from_rotations_translations, poses_to_json, rotations_from_quaternions
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config')
+
+
+def load_object_settings(object_settings=os.path.join(CONFIG_DIR, 'aligned_m_object_settings.json')):
+    with open(object_settings, 'r') as f:
+        return json.load(f)['exported_objects']
+
+
+def make_mesh(cuboid_dimensions, subdivisions=5):
+    # type: (np.array, int) -> trimesh.Trimesh
+    """
+    Ellipsoid that touches the faces of the cuboid. With 5 subdivisions, the mesh has about as many vertices as the
+    google_16k YCB meshes.
+    """
+    mesh = trimesh.creation.icosphere(subdivisions=subdivisions)
+    mesh.vertices = mesh.vertices * (np.array(cuboid_dimensions) / 2.0)
+    return mesh
+
+
+def make_meshes(subdivisions=5):
+    return {model_json['class']: make_mesh(model_json['cuboid_dimensions'], subdivisions)
+            for model_json in load_object_settings()}
+
+
+def make_camera_intrinsics(width, height):
+    return CameraIntrinsics(
+        frame='camera',
+        fx=0.8 * width,
+        fy=0.8 * width,
+        cx=width / 2.0,
+        cy=height / 2.0,
+        skew=0.0,
+        height=height,
+        width=width
+    )
+
+
+def random_object_pose(random_state):
+    quaternion_wxyz = random_state.randn(4)
+    quaternion_wxyz /= np.linalg.norm(quaternion_wxyz)
+    translation = np.array([random_state.uniform(-0.25, 0.25),
+                            random_state.uniform(-0.15, 0.15),
+                            random_state.uniform(0.6, 1.2)])
+    [object_pose] = poses_from_rotations_translations(rotations_from_quaternions([np.roll(quaternion_wxyz, -1)]),
+                                                      [translation])
+    return object_pose
+
+
+def random_scene(class_names, num_objects, random_state):
+    """
+    :return (object_poses, class_names) of num_objects objects of distinct classes
+    """
+    scene_class_names = list(random_state.choice(sorted(class_names), num_objects, replace=False))
+    object_poses = [random_object_pose(random_state) for _ in scene_class_names]
+    return object_poses, scene_class_names
+
+
+def random_depth_images(camera_intrinsics, num_objects, random_state):
+    """
+    Depth images of ellipsoidal blobs at random image positions and depths, standing in for rendered objects where
+    only the compositing matters.
+
+    :return (depth_images, projected_cuboids); the projected cuboid of each object is its 2D bounding box
+    """
+    v, u = np.mgrid[0:camera_intrinsics.height, 0:camera_intrinsics.width]
+    depth_images = []
+    projected_cuboids = []
+    for _ in range(num_objects):
+        center_u = random_state.uniform(0, camera_intrinsics.width)
+        center_v = random_state.uniform(0, camera_intrinsics.height)
+        radius_u, radius_v = random_state.uniform(0.05, 0.2, 2) * camera_intrinsics.width
+        depth = random_state.uniform(0.6, 1.2)
+        r2 = ((u - center_u) / radius_u) ** 2 + ((v - center_v) / radius_v) ** 2
+        data = np.where(r2 < 1.0, depth - 0.05 * np.sqrt(np.clip(1.0 - r2, 0.0, 1.0)), 0.0).astype(np.float32)
+        depth_images.append(DepthImage(data, frame=camera_intrinsics.frame))
+        corners = [[center_u - radius_u, center_v - radius_v], [center_u + radius_u, center_v - radius_v],
+                   [center_u + radius_u, center_v + radius_v], [center_u - radius_u, center_v + radius_v]]
+        projected_cuboids.append(corners + corners)
+    return depth_images, projected_cuboids
+
+
+def write_dataset(root_dir, width, height, num_frames, num_objects, random_state, subdivisions=5):
+    """
+    Writes a synthetic YCB-M-like folder that make_segmentation_imgs.py can process with the object settings
+    config/ycb_object_settings.json (as both -o and -t): stand-in meshes of all classes (in cm, like the google_16k
+    meshes), the camera settings and, for every frame, the annotation with random poses of num_objects distinct classes
+    and a depth PNG that shows the rendered objects (with noise) in front of a wall.
+
+    :return (data_dir, mesh_dir)
+    """
+    data_dir = os.path.join(root_dir, 'data')
+    mesh_dir = os.path.join(root_dir, 'meshes')
+    os.makedirs(data_dir)
+    meshes = make_meshes(subdivisions)
+    for class_name, mesh in meshes.items():
+        os.makedirs(os.path.join(mesh_dir, class_name, 'google_16k'))
+        mesh_cm = mesh.copy()
+        mesh_cm.vertices = mesh_cm.vertices * 100.0
+        mesh_cm.export(os.path.join(mesh_dir, class_name, 'google_16k', 'textured.obj'))
+
+    camera_intrinsics = make_camera_intrinsics(width, height)
+    with open(os.path.join(data_dir, '_camera_settings.json'), 'w') as f:
+        json.dump({'camera_settings': [{
+            'name': 'synthetic',
+            'intrinsic_settings': {'fx': camera_intrinsics.fx, 'fy': camera_intrinsics.fy,
+                                   'cx': camera_intrinsics.cx, 'cy': camera_intrinsics.cy, 's': 0.0,
+                                   'resX': width, 'resY': height},
+            'captured_image_size': {'width': width, 'height': height}}]}, f)
+
+    renderer = NumpyRenderer(meshes, camera_intrinsics, 1.0)
+    for frame_index in range(num_frames):
+        object_poses, class_names = random_scene(meshes.keys(), num_objects, random_state)
+        objects_json = poses_to_json(np.array(object_poses))
+        for object_json, class_name in zip(objects_json, class_names):
+            object_json['class'] = class_name
+        with open(os.path.join(data_dir, '{:06d}.ycbm.json'.format(frame_index)), 'w') as f:
+            json.dump({'camera_data': {'location_worldframe': [0.0, 0.0, 0.0],
+                                       'quaternion_xyzw_worldframe': [0.0, 0.0, 0.0, 1.0]},
+                       'objects': objects_json}, f, indent=2, sort_keys=True)
+
+        (depth, _, _) = renderer.render_scene(object_poses, class_names)
+        depth = np.where(depth[:, :, 0] > 0, depth[:, :, 0], 1.5)
+        depth = depth + random_state.normal(0.0, 0.005, depth.shape)
+        imageio.imwrite(os.path.join(data_dir, '{:06d}.depth.png'.format(frame_index)),
+                        np.clip(depth * 10000.0, 0, 65535).astype(np.uint16))
+    return data_dir, mesh_dir
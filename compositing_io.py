@@ -0,0 +1,60 @@
+"""
+Compositing intermediates of a frame (make_segmentation_imgs.py --save-compositing).
+
+Everything that the depth filter needs from the rendering is kept in <frame>.compositing.npz (np.savez_compressed), so
+that make_segmentation_imgs.py --rethreshold can recompute the segmentation image, the visibilities and the vertmap
+for another --max-depth-diff without rendering:
+
+    object_index_image  H x W x 1 uint8 index of the object at each pixel before the depth filter, 255 = no object
+    object_depths       float32 synthetic depth of the object pixels (object index != 255) in row-major order; the
+                        combined depth image is 0 at all other pixels
+    total_pixels        number of pixels of the unoccluded silhouette of each object
+    bounding_boxes      N x 4 (vmin, umin, vmax, umax) bounds of each silhouette (inclusive), -1 for an empty one
+    rois                N x 4 (umin, vmin, umax, vmax) image regions of the objects, see get_projected_bounds()
+"""
+import collections
+
+import numpy as np
+
+Compositing = collections.namedtuple('Compositing',
+                                     'combined_depth_image object_index_image total_pixels bounding_boxes rois')
+
+
+def compositing_filename(filename_prefix):
+    # type: (str) -> str
+    return filename_prefix + 'compositing.npz'
+
+
+def save_compositing(filename_prefix, compositing):
+    # type: (str, Compositing) -> str
+    """
+    :param filename_prefix: e.g. '/path/to/000000.'
+    :param compositing: Compositing of the frame; the bounding box of an empty silhouette is None
+    :return path of the written file
+    """
+    path = compositing_filename(filename_prefix)
+    object_pixels = compositing.object_index_image.ravel() != 255
+    bounding_boxes = np.array([(-1, -1, -1, -1) if bounding_box is None else bounding_box
+                               for bounding_box in compositing.bounding_boxes], dtype=np.int64).reshape(-1, 4)
+    np.savez_compressed(path,
+                        object_index_image=compositing.object_index_image.astype(np.uint8),
+                        object_depths=compositing.combined_depth_image.ravel()[object_pixels].astype(np.float32),
+                        total_pixels=np.array(compositing.total_pixels, dtype=np.int64),
+                        bounding_boxes=bounding_boxes,
+                        rois=np.array(compositing.rois, dtype=np.int64).reshape(-1, 4))
+    return path
+
+
+def load_compositing(filename_prefix):
+    # type: (str) -> Compositing
+    """
+    :return the Compositing of the frame, with the combined depth image as H x W x 1 float32 array
+    """
+    with np.load(compositing_filename(filename_prefix)) as f:
+        object_index_image = f['object_index_image']
+        combined_depth_image = np.zeros(object_index_image.shape, dtype=np.float32)
+        combined_depth_image.reshape(-1)[object_index_image.ravel() != 255] = f['object_depths']
+        bounding_boxes = [None if bounding_box[0] < 0 else tuple(int(x) for x in bounding_box)
+                          for bounding_box in f['bounding_boxes']]
+        return Compositing(combined_depth_image, object_index_image, [int(x) for x in f['total_pixels']],
+                           bounding_boxes, [tuple(int(x) for x in roi) for roi in f['rois']])
@@ -2,39 +2,49 @@
 import argparse
 from copy import deepcopy as dc
 import json
+import os
 import numpy as np
 
-parser = argparse.ArgumentParser(description='Convert translation units in NVidia Dataset format.')
-parser.add_argument('infile', type=argparse.FileType('r'),
-                    help='json file to convert (frame annotation or object settings)')
-parser.add_argument('outfile', type=argparse.FileType('w'), help='output filename')
-parser.add_argument('--object-settings-mode', action='store_true',
-                    help='process a _object_settings.json file. If false (default), process a frame annotations file.')
-parser.add_argument('--unit-scaling', type=float, default=100.0,
-                    help='scaling factor for depth units (e.g. 100 to convert from m to cm)')
-args = parser.parse_args()
 
+def main():
+    parser = argparse.ArgumentParser(description='Convert translation units in NVidia Dataset format.')
+    parser.add_argument('infile', type=argparse.FileType('r'),
+                        help='json file to convert (frame annotation or object settings)')
+    parser.add_argument('outfile', type=argparse.FileType('w'), help='output filename')
+    parser.add_argument('--object-settings-mode', action='store_true',
+                        help='process a _object_settings.json file. If false (default), process a frame annotations '
+                             'file.')
+    parser.add_argument('--unit-scaling', type=float, default=100.0,
+                        help='scaling factor for depth units (e.g. 100 to convert from m to cm)')
+    args = parser.parse_args()
+
+    in_json = json.load(args.infile)
+    if args.object_settings_mode:
+        out_json = convert_object_settings(in_json, args.unit_scaling)
+    else:
+        out_json = convert_frame(in_json, args.unit_scaling)
+    json.dump(out_json, args.outfile, indent=2, sort_keys=True)
 
-def scale_vector(vector):
-    return (np.array(vector) * args.unit_scaling).tolist()
 
+def scale_vector(vector, unit_scaling):
+    return (np.array(vector) * unit_scaling).tolist()
 
-def scale_matrix(matrix):
+
+def scale_matrix(matrix, unit_scaling):
     output = np.array(matrix)
-    output[3, :3] *= args.unit_scaling
+    output[3, :3] *= unit_scaling
     return output.tolist()
 
 
-def scale_transformation_matrix(matrix):
-    output = np.array(matrix) * args.unit_scaling
+def scale_transformation_matrix(matrix, unit_scaling):
+    output = np.array(matrix) * unit_scaling
     output[3, 3] = 1
     return output.tolist()
 
 
-if args.object_settings_mode:
+def convert_object_settings(in_json, unit_scaling):
+    # type: (dict, float) -> dict
     # TODO
-    in_json = json.load(args.infile)
-
     # copy relevant fields of json
     out_json = {
         'exported_object_classes': dc(in_json['exported_object_classes']),
@@ -45,38 +55,55 @@ if args.object_settings_mode:
         out_json['exported_objects'].append({
             'class': dc(i['class']),
             'segmentation_class_id': dc(i['segmentation_class_id']),
-            'fixed_model_transform': scale_transformation_matrix(i['fixed_model_transform']),
-            'cuboid_dimensions': scale_vector(i['cuboid_dimensions'])
+            'fixed_model_transform': scale_transformation_matrix(i['fixed_model_transform'], unit_scaling),
+            'cuboid_dimensions': scale_vector(i['cuboid_dimensions'], unit_scaling)
         })
+    return out_json
 
-    json.dump(out_json, args.outfile, indent=2, sort_keys=True)
-
-else:
-    in_json = json.load(args.infile)
 
+def convert_frame(in_json, unit_scaling):
+    # type: (dict, float) -> dict
+    """
+    Converts a frame annotation (*.ycbm_full.json, see make_segmentation_imgs.py).
+    """
     # copy relevant fields of json
     out_json = {'camera_data': {}, 'objects': []}
     if in_json['camera_data']:
         out_json['camera_data']['location_worldframe'] = scale_vector(
-            in_json['camera_data']['location_worldframe'])
+            in_json['camera_data']['location_worldframe'], unit_scaling)
         out_json['camera_data']['quaternion_xyzw_worldframe'] = dc(
             in_json['camera_data']['quaternion_xyzw_worldframe'])
     else:
         print 'Warning: no `camera_data` field!'
 
-
     for i in in_json['objects']:
         out_json['objects'].append({
             'class': dc(i['class']),
             'visibility': dc(i['visibility']),
-            'location': scale_vector(i['location']),
+            'location': scale_vector(i['location'], unit_scaling),
             'quaternion_xyzw': dc(i['quaternion_xyzw']),
-            'pose_transform_permuted': scale_matrix(i['pose_transform_permuted']),
-            'cuboid_centroid': scale_vector(i['cuboid_centroid']),
+            'pose_transform_permuted': scale_matrix(i['pose_transform_permuted'], unit_scaling),
+            'cuboid_centroid': scale_vector(i['cuboid_centroid'], unit_scaling),
             'projected_cuboid_centroid': dc(i['projected_cuboid_centroid']),
             'bounding_box': dc(i['bounding_box']),
-            'cuboid': scale_vector(i['cuboid']),
+            'cuboid': scale_vector(i['cuboid'], unit_scaling),
             'projected_cuboid': dc(i['projected_cuboid'])
         })
+    return out_json
 
-    json.dump(out_json, args.outfile, indent=2, sort_keys=True)
+
+def get_converted_filename(prefix):
+    # type: (str) -> str
+    """
+    :param prefix: path of a frame up to (including) the '.'
+    :return name of the converted frame annotation, next to the rgb (preferred) or intensity image of the frame; None
+            if neither exists
+    """
+    for image_type in ['rgb', 'intensity']:
+        if os.path.exists(prefix + image_type + '.jpg'):
+            return prefix + image_type + '.json'
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Cuboids of the objects in a frame and their projections into the image, computed for all objects at once.
+"""
+import numpy as np
+
+
+def get_cuboid_corners(cuboid_dimensions):
+    # type: (np.array) -> np.array
+    """
+    :param cuboid_dimensions: N x 3 array
+    :return N x 8 x 3 array of the cuboid corners in the model frames, in the order used by nvdu_viz
+    """
+    half_dimensions = np.asarray(cuboid_dimensions, dtype=np.float64) / 2
+    # colors in nvdu_viz:    b   b   m  m  g   g   y  y                 (b)lue, (m)agenta, (g)reen, (y)ellow
+    corner_signs = np.array([[1, -1, -1, 1, 1, -1, -1, 1],
+                             [-1, -1, 1, 1, -1, -1, 1, 1],
+                             [1, 1, 1, 1, -1, -1, -1, -1]]).T
+    return corner_signs[np.newaxis, :, :] * half_dimensions[:, np.newaxis, :]
+
+
+def get_cuboids(object_poses, cuboid_dimensions, camera_intrinsics):
+    # type: (np.array, np.array, CameraIntrinsics) -> (np.array, np.array, np.array, np.array)
+    """
+    :param object_poses: N x 4 x 4 array of object poses (model frame to camera frame)
+    :param cuboid_dimensions: N x 3 array
+    :return (cuboids, cuboid_centroids, projected_cuboids, projected_cuboid_centroids) as N x 8 x 3, N x 3, N x 8 x 2
+            and N x 2 arrays
+    """
+    object_poses = np.asarray(object_poses, dtype=np.float64)
+    corners = get_cuboid_corners(cuboid_dimensions)
+    corners_homog = np.concatenate([corners, np.ones(corners.shape[:2] + (1,))], axis=2)
+    cuboids = np.matmul(object_poses, np.transpose(corners_homog, (0, 2, 1)))[:, 0:3, :].transpose((0, 2, 1))
+    cuboid_centroids = object_poses[:, 0:3, 3]
+    return (cuboids, cuboid_centroids, project_points(camera_intrinsics, cuboids),
+            project_points(camera_intrinsics, cuboid_centroids))
+
+
+def project_points(camera_intrinsics, points):
+    # type: (CameraIntrinsics, np.array) -> np.array
+    """
+    Projects points in the camera frame to subpixel image coordinates.
+
+    :param points: ... x 3 array
+    :return ... x 2 array
+    """
+    points_proj = np.matmul(camera_intrinsics.proj_matrix, points[..., np.newaxis])[..., 0]
+    return points_proj[..., 0:2] / points_proj[..., 2:3]
+
+
+def cuboids_to_json(cuboids, cuboid_centroids, projected_cuboids, projected_cuboid_centroids):
+    """
+    :return list with the JSON dictionary of each cuboid, see get_cuboids()
+    """
+    return [{'cuboid_centroid': cuboid_centroid.tolist(),
+             'cuboid': cuboid.tolist(),
+             'projected_cuboid_centroid': projected_cuboid_centroid.tolist(),
+             'projected_cuboid': projected_cuboid.tolist()}
+            for cuboid, cuboid_centroid, projected_cuboid, projected_cuboid_centroid
+            in zip(cuboids, cuboid_centroids, projected_cuboids, projected_cuboid_centroids)]
+
+
+def get_cuboid(object_pose, cuboid_dimensions, camera_intrinsics):
+    # type: (np.array, np.array, CameraIntrinsics) -> dict
+    """
+    Single-object version of get_cuboids().
+
+    :param object_pose: 4 x 4 object pose (model frame to camera frame)
+    :return JSON dictionary with cuboid, cuboid_centroid, projected_cuboid and projected_cuboid_centroid
+    """
+    [cuboid_json] = cuboids_to_json(*get_cuboids(object_pose[np.newaxis], np.array([cuboid_dimensions]),
+                                                 camera_intrinsics))
+    return cuboid_json
+
+
+def get_cuboid2d_visibility(cuboid2d, img_width, img_height):
+    # type: (list, int, int) -> float
+    """
+    Single-cuboid version of get_cuboid2d_visibilities().
+
+    :param cuboid2d: list of 2D points, e.g. the projected_cuboid
+    """
+    return float(get_cuboid2d_visibilities(np.array([cuboid2d], dtype=np.float64), img_width, img_height)[0])
+
+
+def get_cuboid2d_visibilities(projected_cuboids, img_width, img_height):
+    # type: (np.array, int, int) -> np.array
+    """
+    Fraction of the area of each projected cuboid (i.e. of the convex hull of its points) that lies within the image.
+
+    :param projected_cuboids: N x K x 2 array of K image points per cuboid
+    :return array of N visibilities in [0, 1]; 0 for cuboids without area
+    """
+    projected_cuboids = np.asarray(projected_cuboids, dtype=np.float64)
+    hulls = get_convex_hulls(projected_cuboids)
+    hull_areas = polygon_areas(hulls)
+
+    clipped = hulls
+    for axis, bound, sign in [(0, 0.0, 1.0), (0, img_width, -1.0), (1, 0.0, 1.0), (1, img_height, -1.0)]:
+        clipped = clip_polygons(clipped, axis, bound, sign)
+    clipped_areas = polygon_areas(clipped)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        visibilities = np.where(hull_areas > 0, clipped_areas / hull_areas, 0.0)
+    # exactly 1 if the cuboid is completely within the image
+    within_image = np.all((projected_cuboids >= 0) & (projected_cuboids <= [img_width, img_height]), axis=(1, 2))
+    visibilities[within_image & (hull_areas > 0)] = 1.0
+    return np.clip(visibilities, 0.0, 1.0)
+
+
+def get_convex_hulls(points):
+    # type: (np.array) -> np.array
+    """
+    Convex hulls of small point sets. An edge (i, j) is on the hull if no point lies to its right; of collinear hull
+    points, only the outermost ones form an edge.
+
+    :param points: N x K x 2 array
+    :return N x K x 2 array of the hull vertices in counter-clockwise order (with x to the right and y up), padded by
+            repeating the first hull vertex
+    """
+    num_polygons, num_points = points.shape[:2]
+    edges = points[:, np.newaxis, :, :] - points[:, :, np.newaxis, :]  # edges[n, i, j] = p_j - p_i
+    # cross[n, i, j, k] = (p_j - p_i) x (p_k - p_i); dot[n, i, j, k] = (p_j - p_i) . (p_k - p_i)
+    cross = edges[:, :, :, np.newaxis, 0] * edges[:, :, np.newaxis, :, 1] - \
+        edges[:, :, :, np.newaxis, 1] * edges[:, :, np.newaxis, :, 0]
+    dot = np.sum(edges[:, :, :, np.newaxis, :] * edges[:, :, np.newaxis, :, :], axis=4)
+    edge_lengths_sq = np.sum(edges * edges, axis=3)
+    on_segment = (cross == 0) & (dot >= 0) & (dot <= edge_lengths_sq[:, :, :, np.newaxis])
+    is_hull_edge = np.all((cross > 0) | on_segment, axis=3)
+
+    # duplicate points are represented by their first occurrence only
+    duplicate = np.any(np.all(edges == 0, axis=3) & np.tril(np.ones((num_points, num_points), dtype=bool), -1),
+                       axis=2)
+    is_hull_edge &= ~duplicate[:, :, np.newaxis] & ~duplicate[:, np.newaxis, :]
+    is_hull_edge &= ~np.eye(num_points, dtype=bool)
+
+    # follow the hull edges from the first hull vertex
+    successors = np.argmax(is_hull_edge, axis=2)
+    has_successor = np.any(is_hull_edge, axis=2)
+    start = np.argmax(has_successor, axis=1)
+    polygon_indices = np.arange(num_polygons)
+    order = np.empty((num_polygons, num_points), dtype=np.int64)
+    order[:, 0] = start
+    closed = ~np.any(has_successor, axis=1)
+    for k in range(1, num_points):
+        successor = successors[polygon_indices, order[:, k - 1]]
+        closed |= successor == start
+        order[:, k] = np.where(closed, start, successor)
+    return points[polygon_indices[:, np.newaxis], order]
+
+
+def clip_polygons(polygons, axis, bound, sign):
+    # type: (np.array, int, float, float) -> np.array
+    """
+    Clips convex polygons to the half-plane sign * (p[axis] - bound) >= 0 (one step of Sutherland-Hodgman).
+
+    :param polygons: N x K x 2 array of polygon vertices, padded by repeating vertices
+    :return N x (K + 1) x 2 array of the clipped polygons, padded by repeating the first vertex (all vertices are
+            meaningless if a polygon is clipped away completely)
+    """
+    num_polygons, num_points = polygons.shape[:2]
+    next_polygons = np.roll(polygons, -1, axis=1)
+    distances = sign * (polygons[:, :, axis] - bound)
+    next_distances = np.roll(distances, -1, axis=1)
+
+    # every edge (p, q) emits the intersection with the boundary (if p and q are on different sides) and q (if inside)
+    crossing = (distances >= 0) != (next_distances >= 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(crossing, distances / (distances - next_distances), 0.0)
+    intersections = polygons + t[:, :, np.newaxis] * (next_polygons - polygons)
+    intersections[:, :, axis] = np.where(crossing, bound, intersections[:, :, axis])
+    candidates = np.stack([intersections, next_polygons], axis=2).reshape(num_polygons, 2 * num_points, 2)
+    valid = np.stack([crossing, next_distances >= 0], axis=2).reshape(num_polygons, 2 * num_points)
+
+    # a convex polygon gains at most one vertex
+    order = np.argsort(~valid, axis=1, kind='mergesort')[:, :num_points + 1]
+    polygon_indices = np.arange(num_polygons)[:, np.newaxis]
+    clipped = candidates[polygon_indices, order]
+    num_valid = np.sum(valid, axis=1)
+    padding = np.arange(num_points + 1)[np.newaxis, :] >= num_valid[:, np.newaxis]
+    clipped[padding] = np.broadcast_to(clipped[:, 0:1, :], clipped.shape)[padding]
+    clipped[num_valid == 0] = 0.0
+    return clipped
+
+
+def polygon_areas(polygons):
+    # type: (np.array) -> np.array
+    """
+    :param polygons: N x K x 2 array of polygon vertices
+    :return array of N (unsigned) polygon areas
+    """
+    x = polygons[:, :, 0]
+    y = polygons[:, :, 1]
+    return np.abs(np.sum(x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y, axis=1)) / 2.0
@@ -0,0 +1,97 @@
+"""
+On-disk cache of the rendered depth images of single objects.
+
+Changing a threshold or an output option does not change what the objects look like to the camera, so a re-run over
+the same dataset can take the depth images of the objects from the cache instead of rendering them again. Every entry
+holds the depth image of one object, cropped to the bounding box of its silhouette and compressed with
+np.savez_compressed. Entries are keyed on everything the depth image depends on: the class, the mesh cache key of its
+mesh (see mesh_cache.py), the pose of the object in the camera frame (rounded to POSE_DECIMALS decimals), the camera
+intrinsics, the renderer and the unit scaling, which determines the clipping planes (z range) of the renderers.
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+from perception import CameraIntrinsics, DepthImage
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ycb_multicam_dataset_tools', 'depth')
+POSE_DECIMALS = 6  # 1 micrometer for poses in meters, far below what changes a rendered pixel
+
+
+class DepthCache(object):
+
+    def __init__(self, cache_dir, mesh_keys, renderer_name, unit_scaling):
+        """
+        :param cache_dir: directory of the cache; created when the first entry is saved
+        :param mesh_keys: dictionary mapping class names to the mesh cache keys of their meshes
+        :param renderer_name: name of the renderer (e.g. opengl or numpy); the renderers differ in the last bits
+        :param unit_scaling: scaling factor for depth units, which determines the clipping planes
+        """
+        self._cache_dir = cache_dir
+        self._mesh_keys = mesh_keys
+        self._renderer_name = renderer_name
+        self._unit_scaling = unit_scaling
+
+    def key(self, class_name, object_pose, camera_intrinsics):
+        # type: (str, np.array, CameraIntrinsics) -> str
+        """
+        :param object_pose: 4 x 4 pose of the object in the camera frame
+        """
+        # adding 0.0 turns -0.0 into 0.0, so that both round to the same key
+        pose = np.round(np.asarray(object_pose, dtype=np.float64), POSE_DECIMALS) + 0.0
+        intrinsics = [camera_intrinsics.fx, camera_intrinsics.fy, camera_intrinsics.cx, camera_intrinsics.cy,
+                      camera_intrinsics.skew, camera_intrinsics.width, camera_intrinsics.height]
+        key = '{}:{}:{}:{!r}:{}:{}'.format(class_name, self._mesh_keys[class_name], self._renderer_name,
+                                           float(self._unit_scaling), ','.join(repr(float(x)) for x in intrinsics),
+                                           ','.join(repr(float(x)) for x in pose.flat))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        # type: (str) -> str
+        # one subdirectory per first two hex digits keeps the directories small
+        return os.path.join(self._cache_dir, key[:2], key + '.npz')
+
+    def load(self, key, camera_intrinsics):
+        # type: (str, CameraIntrinsics) -> DepthImage
+        """
+        :return the cached depth image; None if there is no entry for the key
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as entry:
+            (v, u) = entry['offset']
+            crop = entry['depth']
+        depth_data = np.zeros((camera_intrinsics.height, camera_intrinsics.width), dtype=np.float32)
+        depth_data[v:v + crop.shape[0], u:u + crop.shape[1]] = crop
+        return DepthImage(depth_data, frame=camera_intrinsics.frame)
+
+    def save(self, key, depth_image):
+        # type: (str, DepthImage) -> None
+        """
+        Saves a depth image, so that concurrent readers either see the complete entry or none at all.
+        """
+        depth_data = depth_image.raw_data[:, :, 0]
+        (rows, cols) = np.nonzero(depth_data)
+        if len(rows) == 0:
+            (v, u, crop) = (0, 0, depth_data[:0, :0])
+        else:
+            (v, u) = (rows.min(), cols.min())
+            crop = depth_data[v:rows.max() + 1, u:cols.max() + 1]
+        path = self._path(key)
+        if not os.path.isdir(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                # created concurrently by another process
+                if not os.path.isdir(os.path.dirname(path)):
+                    raise
+        (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, offset=np.array([v, u], dtype=np.int32), depth=crop.astype(np.float32))
+            os.rename(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
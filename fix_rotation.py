@@ -6,6 +6,8 @@ import numpy as np
 import copy
 from autolab_core import RigidTransform
 
+from pose_utils import compose, object_pose_from_json, poses_from_json, poses_to_json
+
 """
 Usage:
 
@@ -13,7 +15,7 @@ Usage:
 
     for f in *.ycbm.json; do fix_rotation.py $f $(basename $f .ycbm.json).ycbm_fixed.json; done
     for f in *.ycbm.json; do mv $(basename $f .ycbm.json).ycbm_fixed.json $f; done
-    process_single_folder.sh
+    process_dataset.py --mesh-dir <mesh dir>
 """
 
 
@@ -1103,21 +1105,6 @@ target_model_json = json.loads("""
 """)
 
 
-def object_pose_from_json(scene_object_json):
-    # type: (dict) -> (np.array, np.array)
-    """
-    Parses object pose from "location" and "quaternion_xyzw".
-
-    :param scene_object_json: JSON fragment of a single scene object
-    :return (translation, rotation) in meters
-    """
-    quaternion_xyzw = np.array(scene_object_json['quaternion_xyzw'])
-    quaternion_wxyz = np.roll(quaternion_xyzw, 1)
-    rotation = RigidTransform.rotation_from_quaternion(quaternion_wxyz)
-    translation = np.array(scene_object_json['location'])
-    return translation, rotation
-
-
 parser = argparse.ArgumentParser(description='Fix rotation')
 parser.add_argument('infile', type=argparse.FileType('r'), help='json file to convert (frame annotation)')
 parser.add_argument('outfile', type=argparse.FileType('w'), help='output filename')
@@ -1187,23 +1174,13 @@ if len(frame_json['objects']) == 0:
     print "no objects in frame!"
     sys.exit(1)
 
-for object_index in range(num_objects):
-    model_name = frame_json['objects'][object_index]['class']
-    if model_name != MODEL_NAME:
-        continue
-
-    scene_object_json = frame_json['objects'][object_index]
-    (translation, rotation) = object_pose_from_json(scene_object_json)
-    object_pose = RigidTransform(
-        rotation=rotation,
-        translation=translation,
-        from_frame='source_model',
-        to_frame='camera'
-    )
-    object_pose = object_pose.dot(src_model_to_src_model_fixed)
-
-    frame_json['objects'][object_index]['location'] = object_pose.translation.tolist()
-    frame_json['objects'][object_index]['quaternion_xyzw'] = np.roll(object_pose.quaternion, -1).tolist()
+object_indices = [object_index for object_index in range(num_objects)
+                  if frame_json['objects'][object_index]['class'] == MODEL_NAME]
+if object_indices:
+    object_poses = compose(poses_from_json([frame_json['objects'][object_index] for object_index in object_indices]),
+                           src_model_to_src_model_fixed.matrix)
+    for object_index, pose_json in zip(object_indices, poses_to_json(object_poses)):
+        frame_json['objects'][object_index].update(pose_json)
 
 json.dump(frame_json, args.outfile, indent=2, sort_keys=True)
 args.outfile.close()
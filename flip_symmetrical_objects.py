@@ -9,9 +9,11 @@ import re
 import sys
 
 import numpy as np
-from autolab_core import RigidTransform, PointCloud, Point
+from autolab_core import RigidTransform
 from perception import CameraIntrinsics
-from shapely.geometry import MultiPoint
+
+from cuboid_utils import cuboids_to_json, get_cuboids
+from pose_utils import compose, poses_from_json, poses_to_json, pose_transforms_permuted
 
 ModelConfig = collections.namedtuple('ModelConfig',
                                      'class_name segmentation_class_id model_transform cuboid_dimensions')
@@ -72,7 +74,8 @@ def main():
             from_frame='ycb_model',
             to_frame='target_model_original'
         )
-        model_transform = fixed_model_transform.dot(target_fixed_model_transform.inverse())
+        # stored as 4 x 4 matrix (target_model_original to source_model), see pose_utils
+        model_transform = fixed_model_transform.dot(target_fixed_model_transform.inverse()).matrix
 
         models[class_name] = ModelConfig(class_name, segmentation_class_id, model_transform, cuboid_dimensions)
 
@@ -133,135 +136,39 @@ def process_frame(frame_json, camera_intrinsics, models):
         updated_frame_json['objects'][i]['visibility'] = copy.deepcopy(frame_json['objects'][i]['visibility'])
 
     # get object poses and flip symmetrical objects if necessary
-    object_poses = []
-    for object_index in range(num_objects):
-        model_name = updated_frame_json['objects'][object_index]['class']
-        scene_object_json = frame_json['objects'][object_index]
-        (translation, rotation) = object_pose_from_json(scene_object_json)
-        object_pose = RigidTransform(
-            rotation=rotation,
-            translation=translation,
-            from_frame='source_model',
-            to_frame='camera'
-        )
-        object_pose = object_pose.dot(models[model_name].model_transform)
-
-        # Handle symmetrical objects: if z axis (= x axis in mesh) points towards camera,
-        # rotate by 180 degrees around x (= z axis in mesh).
-        # This always keeps the "green/yellow" short side (in nvdu_viz) pointed towards
-        # the camera; the "blue/magenta" short side should never be visible. This is necessary
-        # for DOPE training, since both sides look the same because the KLT box is symmetrical.
-        symmetry_flip_tf = RigidTransform(
-            from_frame='target_model',
-            to_frame='target_model_original'
-        )
-        z_axis = rotation.dot(np.array([0.0, 0.0, 1.0], dtype=np.float64))
-        if z_axis.dot(translation) < 0:
-            symmetry_flip_tf.rotation = RigidTransform.x_axis_rotation(math.pi)
-        object_pose = object_pose.dot(symmetry_flip_tf)
-
-        object_poses.append(object_pose)
-
-        updated_frame_json['objects'][object_index]['location'] = object_pose.translation.tolist()
-        updated_frame_json['objects'][object_index]['quaternion_xyzw'] = np.roll(object_pose.quaternion, -1).tolist()
+    class_names = [scene_object_json['class'] for scene_object_json in frame_json['objects']]
+    source_object_poses = poses_from_json(frame_json['objects'])
+    object_poses = compose(source_object_poses,
+                           np.array([models[class_name].model_transform for class_name in class_names]))
+
+    # Handle symmetrical objects: if z axis (= x axis in mesh) points towards camera,
+    # rotate by 180 degrees around x (= z axis in mesh).
+    # This always keeps the "green/yellow" short side (in nvdu_viz) pointed towards
+    # the camera; the "blue/magenta" short side should never be visible. This is necessary
+    # for DOPE training, since both sides look the same because the KLT box is symmetrical.
+    z_axes = source_object_poses[:, :3, 2]
+    translations = source_object_poses[:, :3, 3]
+    flip = np.matmul(z_axes[:, np.newaxis, :], translations[:, :, np.newaxis])[:, 0, 0] < 0
+    symmetry_flip_tfs = np.tile(np.eye(4), (num_objects, 1, 1))  # target_model to target_model_original
+    symmetry_flip_tfs[flip, :3, :3] = RigidTransform.x_axis_rotation(math.pi)
+    object_poses = compose(object_poses, symmetry_flip_tfs)
+
+    for object_index, pose_json in enumerate(poses_to_json(object_poses)):
+        updated_frame_json['objects'][object_index].update(pose_json)
 
     # add pose_transform_permuted
-    for object_index in range(num_objects):
-        ptp_json = pose_transform_permuted_to_json(object_poses[object_index].translation,
-                                                   object_poses[object_index].rotation)
-        updated_frame_json['objects'][object_index].update(ptp_json)
-
-    # compute cuboid, cuboid_centroid, projected_cuboid, projected_cuboid_centroid, bounding_box
-    for object_index in range(num_objects):
-        model_name = updated_frame_json['objects'][object_index]['class']
-        cuboid_json = get_cuboid(object_poses[object_index], models[model_name].cuboid_dimensions, camera_intrinsics)
+    for object_index, pose_transform_permuted in enumerate(pose_transforms_permuted(object_poses)):
+        updated_frame_json['objects'][object_index][u'pose_transform'] = pose_transform_permuted.tolist()
+
+    # compute cuboid, cuboid_centroid, projected_cuboid, projected_cuboid_centroid
+    cuboid_dimensions = np.array([models[scene_object_json['class']].cuboid_dimensions
+                                  for scene_object_json in updated_frame_json['objects']])
+    cuboids = get_cuboids(object_poses, cuboid_dimensions, camera_intrinsics)
+    for object_index, cuboid_json in enumerate(cuboids_to_json(*cuboids)):
         updated_frame_json['objects'][object_index].update(cuboid_json)
 
     return updated_frame_json
 
 
-def get_cuboid(object_pose, cuboid_dimensions, camera_intrinsics):
-    # cuboid centroid
-    cuboid_centroid = object_pose.translation
-    result_json = {'cuboid_centroid': cuboid_centroid.tolist()}
-
-    # cuboid
-    x = cuboid_dimensions[0] / 2
-    y = cuboid_dimensions[1] / 2
-    z = cuboid_dimensions[2] / 2
-    # colors in nvdu_viz:       b   b   m  m  g   g   y  y                 (b)lue, (m)agenta, (g)reen, (y)ellow
-    cuboid_corners = np.array([[x, -x, -x, x, x, -x, -x, x],
-                               [-y, -y, y, y, -y, -y, y, y],
-                               [z, z, z, z, -z, -z, -z, -z]])
-    cuboid_points_model = PointCloud(cuboid_corners, 'target_model')
-    cuboid_points_camera = object_pose.apply(cuboid_points_model)
-    result_json['cuboid'] = np.transpose(cuboid_points_camera.data).tolist()
-
-    # projected_cuboid_centroid
-    cuboid_centroid_image_coords = project_subpixel(camera_intrinsics, Point(cuboid_centroid, 'camera'))
-    result_json['projected_cuboid_centroid'] = cuboid_centroid_image_coords.tolist()
-
-    # projected_cuboid
-    cuboid_image_coords = project_subpixel(camera_intrinsics, cuboid_points_camera)
-    result_json['projected_cuboid'] = np.transpose(cuboid_image_coords).tolist()
-
-    return result_json
-
-
-def project_subpixel(camera_intrinsics, point_cloud):
-    # modified from CameraIntrinsics.project()
-    if not isinstance(point_cloud, PointCloud) and not (isinstance(point_cloud, Point) and point_cloud.dim == 3):
-        raise ValueError('Must provide PointCloud or 3D Point object for projection')
-    if point_cloud.frame != camera_intrinsics.frame:
-        raise ValueError('Cannot project points in frame %s into camera with frame %s' % (
-            point_cloud.frame, camera_intrinsics.frame))
-
-    points_proj = camera_intrinsics.proj_matrix.dot(point_cloud.data)
-    if len(points_proj.shape) == 1:
-        points_proj = points_proj[:, np.newaxis]
-    point_depths = np.tile(points_proj[2, :], [3, 1])
-    points_proj = np.divide(points_proj, point_depths)
-
-    return points_proj[:2, :].squeeze()
-
-
-def get_cuboid2d_visibility(cuboid2d, img_width, img_height):
-    cuboid_poly = MultiPoint(cuboid2d).convex_hull
-    img_poly = MultiPoint([(0, 0), (0, img_height), (img_width, img_height), (img_width, 0)]).convex_hull
-    return cuboid_poly.intersection(img_poly).area / cuboid_poly.area
-
-
-def object_pose_from_json(scene_object_json):
-    # type: (dict) -> (np.array, np.array)
-    """
-    Parses object pose from "location" and "quaternion_xyzw".
-
-    :param scene_object_json: JSON fragment of a single scene object
-    :return (translation, rotation) in meters
-    """
-    quaternion_xyzw = np.array(scene_object_json['quaternion_xyzw'])
-    quaternion_wxyz = np.roll(quaternion_xyzw, 1)
-    rotation = RigidTransform.rotation_from_quaternion(quaternion_wxyz)
-    translation = np.array(scene_object_json['location'])
-    return translation, rotation
-
-
-def pose_transform_permuted_to_json(translation, rotation):
-    # type: (np.array, np.array) -> dict
-    """
-    :param translation: location (in meters) as 3x1 array
-    :param rotation: rotation as 3x3 matrix
-    :return JSON dictionary of pose_transform_permuted (in cm)
-    """
-    pose_transform_permuted = np.eye(4)
-    pose_transform_permuted[:3, 3] = translation
-    to_lefthand = np.array([[0, 1, 0],
-                            [0, 0, -1],
-                            [1, 0, 0]])
-    pose_transform_permuted[:3, :3] = rotation.dot(to_lefthand)
-    pose_transform_permuted = np.transpose(pose_transform_permuted)
-    return {u'pose_transform': pose_transform_permuted.tolist()}
-
-
 if __name__ == "__main__":
     main()
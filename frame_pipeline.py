@@ -0,0 +1,114 @@
+"""
+Overlaps the disk I/O of the frames with their processing.
+
+A reader thread loads the inputs of the next frames into a bounded queue (prefetch()), while a thread pool encodes and
+writes the outputs of the previous frames (BackgroundWriter). Decoding and encoding PNGs and compressing the vertmap
+mostly run in zlib, which releases the GIL, so they overlap with rendering. The queue depths bound the number of frames
+held in memory.
+"""
+import Queue
+import collections
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
+
+_END = object()
+
+
+def prefetch(load, items, depth):
+    """
+    Calls load(item) for each item in a reader thread, at most depth items ahead of the consumer.
+
+    :param depth: maximum number of loaded items waiting in the queue; 0 loads each item when it is consumed
+    :return generator of (item, load(item)) in the order of items; exceptions of load() are re-raised in the consumer
+    """
+    if depth <= 0:
+        for item in items:
+            yield item, load(item)
+        return
+
+    queue = Queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry):
+        # gives up if the consumer stopped, so that the reader thread does not block forever on a full queue
+        while not stop.is_set():
+            try:
+                queue.put(entry, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def reader():
+        for item in items:
+            try:
+                entry = (item, load(item), None)
+            except Exception:
+                entry = (item, None, sys.exc_info())
+            if not put(entry) or entry[2] is not None:
+                return
+        put(_END)
+
+    thread = threading.Thread(target=reader, name='prefetch')
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            entry = queue.get()
+            if entry is _END:
+                break
+            (item, loaded, exc_info) = entry
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            yield item, loaded
+    finally:
+        stop.set()
+        thread.join()
+
+
+class BackgroundWriter(object):
+    """
+    Runs write jobs in a thread pool.
+
+    At most max_pending jobs are queued or running; submit() blocks beyond that. The callback of a job runs in the
+    submitting thread once the job and all jobs submitted before it are done, so callbacks run in submission order
+    (e.g. to record finished frames in the manifest). Exceptions of a job are re-raised by submit() or close().
+    """
+
+    def __init__(self, num_threads, max_pending):
+        """
+        :param num_threads: number of writer threads; 0 runs each job synchronously in submit()
+        :param max_pending: maximum number of jobs queued or running
+        """
+        self._pool = ThreadPool(num_threads) if num_threads > 0 else None
+        self._max_pending = max(max_pending, 1)
+        self._pending = collections.deque()  # (AsyncResult, callback) in submission order
+
+    def submit(self, func, args=(), callback=None):
+        if self._pool is None:
+            func(*args)
+            if callback is not None:
+                callback()
+            return
+        self._pending.append((self._pool.apply_async(func, args), callback))
+        while self._pending and (len(self._pending) > self._max_pending or self._pending[0][0].ready()):
+            self._complete_oldest()
+
+    def _complete_oldest(self):
+        (result, callback) = self._pending.popleft()
+        result.get()
+        if callback is not None:
+            callback()
+
+    def close(self):
+        """
+        Waits for all pending jobs and shuts down the threads.
+        """
+        try:
+            while self._pending:
+                self._complete_oldest()
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
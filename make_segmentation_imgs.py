@@ -6,29 +6,260 @@ import sys
 import re
 import imageio
 import copy
+import functools
+import multiprocessing
+import StringIO
 import numpy as np
-import trimesh
 import collections
-from shapely.geometry import MultiPoint
-from autolab_core import RigidTransform, PointCloud, Point
+import contextlib
+import time
+from autolab_core import RigidTransform
 from perception import CameraIntrinsics, RenderMode
 
 # os.environ['MESHRENDER_EGL_OFFSCREEN'] = 't'
-from meshrender import Scene, MaterialProperties, SceneObject, VirtualCamera, SceneViewer
+try:
+    from meshrender import Scene, MaterialProperties, SceneObject, VirtualCamera, SceneViewer
+except ImportError:
+    # only the OpenGL renderer needs meshrender; --renderer numpy works without it
+    Scene = None
+
+from compositing_io import Compositing, compositing_filename, load_compositing, save_compositing
+from convert_json_units import convert_frame, get_converted_filename
+from cuboid_utils import cuboids_to_json, get_cuboid2d_visibilities, get_cuboids
+from depth_cache import DepthCache, DEFAULT_CACHE_DIR as DEFAULT_DEPTH_CACHE_DIR
+from frame_pipeline import BackgroundWriter, prefetch
+from manifest import MANIFEST_FILENAME, file_hash, inputs_hash, load_manifest, save_manifest, shard_manifest_filename
+from mesh_cache import load_mesh, mesh_cache_key, DEFAULT_CACHE_DIR
+from numpy_renderer import NumpyRenderer
+from profiling import PROFILE_FILENAME, PROFILER, SETUP
+from pose_utils import compose, invert, poses_from_json, poses_to_json, pose_transforms_permuted
+from sharding import FRAMES, check_markers, in_range, load_markers, marker_selection, parse_range, parse_shard, \
+    remove_markers, select_glob, select_shard, write_marker
+from vertmap_io import VERTMAP_FORMATS, remove_vertmaps, save_vertmap, vertmap_filename
 
 ModelConfig = collections.namedtuple('ModelConfig',
                                      'class_name segmentation_class_id model_transform cuboid_dimensions mesh')
 
-MAX_DEPTH_DIFF = 0.04  # difference allowed between synthetic and real depth image
+MAX_DEPTH_DIFF = 0.04  # default difference allowed between synthetic and real depth image, see --max-depth-diff
+PNG_END = '\x00\x00\x00\x00IEND\xaeB`\x82'  # the IEND chunk that ends every PNG file
+DEPTH_PNG_SCALE = 10000.0  # values of the 16-bit depth PNGs per meter
+MANIFEST_SAVE_INTERVAL = 100  # frames after which the manifest is saved while processing, see ManifestWriter
 
 
-def main():
+def main(argv=None, models=None, renderer=None, frame_callback=None):
+    """
+    :param argv: command line arguments (default: sys.argv[1:])
+    :param models: preloaded models of (at least) all classes in the folder, see load_models(); by default, the models
+                   are loaded from the object settings and mesh dir in argv
+    :param renderer: renderer with the meshes of (at least) these models that is reused (and not closed); by default,
+                     a renderer is set up for the folder. Not used with --workers
+    :param frame_callback: called with (json_file, profile_records) after each frame, see frame_done()
+    """
+    args = parse_args(argv)
+    if args.merge_shards is not None:
+        problems = check_shards(args.data_dir, args.merge_shards)
+        for problem in problems:
+            print 'ERROR: ' + problem
+        if problems:
+            sys.exit(1)
+        merge_shards(args.data_dir, args.merge_shards)
+        print 'Merged {} shards.'.format(args.merge_shards)
+        return
+    if args.watch:
+        with profiling(args):
+            watch_folder(args, load_manifest(args.data_dir) if args.incremental else {}, models, renderer,
+                         frame_callback)
+        return
+
+    # ====================================
+    # process each frame
+    # ====================================
+    json_files = select_frames(list_frames(args.data_dir), args.frames, args.frame_glob)
+    if args.shard is not None:
+        json_files = select_shard(json_files, args.shard)
+    shard_frames = [os.path.basename(json_file) for json_file in json_files]
+    frame_classes = get_frame_classes(json_files)
+    if args.output_unit_scaling is not None:
+        # the converted frame annotations are named after the image of the frame
+        for json_file in json_files:
+            if get_converted_filename(json_file[:-len('ycbm.json')]) is None:
+                raise IOError('No such file: {}*.jpg'.format(json_file[:-len('ycbm.json')]))
+
+    manifest = {}
+    if args.incremental:
+        manifest = load_manifest(args.data_dir)
+        if args.shard is not None:
+            # a shard keeps the hashes of its frames in a manifest of its own, see merge_shards()
+            manifest.update(load_manifest(args.data_dir, shard_manifest_filename(args.shard)))
+            manifest = {frame: manifest[frame] for frame in shard_frames if frame in manifest}
+    (json_files, input_hashes) = select_outdated_frames(json_files, frame_classes, args, manifest)
+    if args.rethreshold:
+        problems = check_compositing_files(json_files, frame_classes)
+        for problem in problems:
+            print 'ERROR: ' + problem
+        if problems:
+            sys.exit(1)
+    if json_files:
+        with profiling(args):
+            process_json_files(json_files, frame_classes, args, manifest, input_hashes, models, renderer,
+                               frame_callback)
+    if args.shard is not None:
+        write_marker(args.data_dir, FRAMES, args.shard, shard_frames,
+                     {'frames': args.frames, 'frame_glob': args.frame_glob})
+
+
+@contextlib.contextmanager
+def profiling(args):
+    """
+    Profiles the frames processed within the context if --profile is given and prints the summary at the end.
+    """
+    if args.profile is not None:
+        PROFILER.start(args.profile or os.path.join(args.data_dir, PROFILE_FILENAME))
+    try:
+        yield
+    finally:
+        if PROFILER.enabled:
+            print '\n' + PROFILER.stop()
+
+
+def select_outdated_frames(json_files, frame_classes, args, manifest):
+    # type: (list, dict, argparse.Namespace, dict) -> (list, dict)
+    """
+    :return (json_files, input_hashes): with --incremental, the frames whose inputs changed since they were recorded in
+            the manifest or whose outputs are missing (all frames with --force) and the input hashes of all frames;
+            otherwise all frames and no hashes
+    """
+    if not args.incremental:
+        return json_files, {}
+    input_hashes = get_input_hashes(json_files, frame_classes, args)
+    if not args.force:
+        num_frames = len(json_files)
+        json_files = [json_file for json_file in json_files
+                      if manifest.get(os.path.basename(json_file)) != input_hashes[json_file]
+                      or not all(os.path.exists(output_file) for output_file in get_output_files(json_file, args))]
+        if len(json_files) < num_frames:
+            print 'Skipping {} of {} frames that are up to date.'.format(num_frames - len(json_files), num_frames)
+    return json_files, input_hashes
+
+
+def check_compositing_files(json_files, frame_classes):
+    # type: (list, dict) -> list
+    """
+    Checks that the compositing files that --rethreshold needs exist, so that a missing one is reported before any
+    frame is processed.
+
+    :return list of problems, one per frame with objects but without a compositing file
+    """
+    return ['{} has no compositing file {}; process it with --save-compositing first'.format(
+                os.path.basename(json_file), os.path.basename(compositing_filename(json_file[:-len('ycbm.json')])))
+            for json_file in json_files
+            if frame_classes[json_file] and not os.path.exists(compositing_filename(json_file[:-len('ycbm.json')]))]
+
+
+def watch_folder(args, manifest, models=None, renderer=None, frame_callback=None):
+    """
+    Processes the frames of the data dir while they are being recorded (--watch): every --watch-interval seconds, the
+    new frames that are complete (see frame_is_complete()) are processed as one batch, until no new frame has arrived
+    for --watch-timeout seconds or until interrupted. The models of the classes of a frame are loaded when the first
+    frame with that class arrives and are added to the renderer.
+
+    :param models: see main(); by default, no models are loaded up front
+    :param renderer: see main()
+    """
+    models = {} if models is None else dict(models)
+    own_renderer = renderer is None
+    mesh_cache_dir = None if args.no_mesh_cache else args.mesh_cache_dir
+    require_image = args.output_unit_scaling is not None  # see get_converted_filename()
+    seen = set()  # frames that were complete in an earlier poll
+    last_frame_time = time.time()
+    print 'Watching {} for new frames (Ctrl-C to stop).'.format(args.data_dir)
+    try:
+        while True:
+            json_files = [json_file for json_file in select_frames(list_frames(args.data_dir), args.frames,
+                                                                   args.frame_glob)
+                          if json_file not in seen and frame_is_complete(json_file, require_image)]
+            if not json_files:
+                if args.watch_timeout is not None and time.time() - last_frame_time >= args.watch_timeout:
+                    print 'No new frames for {} s, stopped watching.'.format(args.watch_timeout)
+                    break
+                time.sleep(args.watch_interval)
+                continue
+            seen.update(json_files)
+            last_frame_time = time.time()
+
+            frame_classes = get_frame_classes(json_files)
+            new_class_names = set(class_name for class_names in frame_classes.values() for class_name in class_names
+                                  if class_name not in models)
+            if new_class_names:
+                new_models = load_models(args.object_settings, args.target_object_settings, args.mesh_dir,
+                                         args.mesh_scaling, mesh_cache_dir, new_class_names)
+                models.update(new_models)
+                if renderer is not None:
+                    for (class_name, model) in sorted(new_models.items()):
+                        renderer.add_mesh(class_name, model.mesh)
+            if renderer is None:
+                (_, _, renderer) = load_folder(args, models=models)
+            (json_files, input_hashes) = select_outdated_frames(json_files, frame_classes, args, manifest)
+            if json_files:
+                process_json_files(json_files, frame_classes, args, manifest, input_hashes, models, renderer,
+                                   frame_callback)
+    except KeyboardInterrupt:
+        print 'Stopped watching.'
+    finally:
+        if own_renderer and renderer is not None:
+            renderer.close()
+
+
+def process_json_files(json_files, frame_classes, args, manifest, input_hashes, models=None, renderer=None,
+                       frame_callback=None):
+    """
+    Processes the frames and records them in the manifest.
+    """
+    manifest_writer = ManifestWriter(manifest, input_hashes, args.data_dir, get_manifest_filename(args))
+    class_names = set()
+    for json_file in json_files:
+        class_names.update(frame_classes[json_file])
+
+    try:
+        if args.workers > 1:
+            # the log output of each frame is collected in the worker and printed in order
+            pool = multiprocessing.Pool(args.workers, init_worker, (args, class_names, models))
+            for json_file, (log_output, profile_records, frame_has_outputs) in zip(
+                    json_files, pool.imap(process_json_file_in_worker, json_files)):
+                sys.stdout.write(log_output)
+                frame_done(json_file, args, manifest_writer, profile_records, frame_callback, frame_has_outputs)
+            pool.close()
+            pool.join()
+        else:
+            # the next frames are read and the previous frames are written while the current frame is rendered
+            own_renderer = renderer is None
+            camera_intrinsics, models, renderer = load_folder(args, class_names, models, renderer)
+            depth_cache = open_depth_cache(args, models)
+            writer = BackgroundWriter(args.writer_threads, args.write_queue)
+            try:
+                for json_file, frame_inputs in prefetch(lambda json_file: read_frame(json_file, args), json_files,
+                                                        args.prefetch):
+                    outputs = compute_frame(json_file, frame_inputs, args, camera_intrinsics, models, renderer,
+                                            depth_cache)
+                    writer.submit(write_frame, (json_file, args) + outputs,
+                                  functools.partial(frame_done, json_file, args, manifest_writer, None, frame_callback,
+                                                    has_outputs(outputs)))
+            finally:
+                writer.close()
+            if own_renderer and renderer is not None:
+                renderer.close()
+    finally:
+        if args.incremental:
+            manifest_writer.save()
+
+
+def parse_args(argv=None):
     # ====================================
     # parse arguments
     # ====================================
     parser = argparse.ArgumentParser(description='Generate segmentation images and updated json files.')
     parser.add_argument('-d', '--data-dir', default=os.getcwd(), help='directory containing images and json files')
-    parser.add_argument('-m', '--mesh-dir', required=True, help='directory containing the mesh files')
+    parser.add_argument('-m', '--mesh-dir', help='directory containing the mesh files (required)')
     parser.add_argument('-o', '--object-settings',
                         help='object_settings file where the fixed_model_transform corresponds to the poses'
                              'in the frame annotation jsons.'
@@ -39,22 +270,352 @@ def main():
                         help='scaling factor for depth units (e.g. 100.0 to convert from m to cm)')
     parser.add_argument('--mesh-scaling', type=float, default=0.01,
                         help='scaling factor for meshes (e.g. 100.0 to convert from m to cm)')
+    parser.add_argument('--mesh-cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='directory of the binary mesh cache. default: ' + DEFAULT_CACHE_DIR)
+    parser.add_argument('--no-mesh-cache', action='store_true', help='Always parse the mesh files.')
+    parser.add_argument('--depth-cache', nargs='?', const=DEFAULT_DEPTH_CACHE_DIR, metavar='CACHE_DIR',
+                        help='Cache the rendered depth image of every object on disk (see depth_cache.py) and take it '
+                             'from there when the same object is rendered with the same pose and camera again, e.g. '
+                             'when re-running a dataset with other options. default CACHE_DIR: ' +
+                             DEFAULT_DEPTH_CACHE_DIR)
+    parser.add_argument('--output-unit-scaling', type=float,
+                        help='if given, also write the frame annotations with the translations scaled by this factor '
+                             '(e.g. 100.0 to convert from m to cm) to <frame>.rgb.json or <frame>.intensity.json, '
+                             'depending on the image of the frame (see convert_json_units.py)')
+    parser.add_argument('--no-save-full-json', action='store_true',
+                        help='Do not save the ycbm_full.json files; requires --output-unit-scaling.')
     parser.add_argument('--no-save-vertmap', action='store_true',
                         help='Do not save vertmap.npz files. vertmap files are useful for PoseCNN training.')
+    parser.add_argument('--vertmap-format', choices=VERTMAP_FORMATS.keys(), default='npz',
+                        help='file format of the vertmaps (see vertmap_io.py). default: npz')
+    parser.add_argument('--renderer', choices=['opengl', 'numpy'], default='opengl',
+                        help='opengl: render with meshrender; numpy: CPU rasterizer that needs no OpenGL '
+                             '(see numpy_renderer.py). default: opengl')
+    parser.add_argument('--grouped-passes', action='store_true',
+                        help='Render the objects of a frame in one depth-only pass per group of objects whose '
+                             'image regions do not overlap, instead of one pass per object (same results). This '
+                             'replaces an earlier single-pass mode that rendered all objects at once into an object '
+                             'index buffer; it was dropped because that one color pass cost more than rendering '
+                             'every object separately (see SceneRenderer.render_scene()).')
+    parser.add_argument('--max-depth-diff', type=float, default=MAX_DEPTH_DIFF,
+                        help='pixels where the synthetic depth differs from the real depth by this much or more are '
+                             'removed from the segmentation (in meters, or in the units of --unit-scaling). '
+                             'default: {}'.format(MAX_DEPTH_DIFF))
+    parser.add_argument('--save-compositing', action='store_true',
+                        help='Also save the compositing intermediates of each frame to <frame>.compositing.npz (see '
+                             'compositing_io.py), so that --rethreshold can be used later. Without this option, '
+                             'processing a frame removes its outdated compositing file.')
+    parser.add_argument('--rethreshold', action='store_true',
+                        help='Do not render; recompute the segmentation images, visibilities and vertmaps from the '
+                             'compositing files of an earlier run with --save-compositing, e.g. for another '
+                             '--max-depth-diff.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only process frames whose inputs changed since the last run (see ' + MANIFEST_FILENAME +
+                             ' in the data dir).')
+    parser.add_argument('--force', action='store_true',
+                        help='With --incremental, process all frames anyway (and update the manifest).')
+    parser.add_argument('--frames', type=parse_range, metavar='START:END',
+                        help='only process the frames with numbers from START to END (exclusive); either one may be '
+                             'omitted')
+    parser.add_argument('--frame-glob', metavar='PATTERN',
+                        help='only process the frames whose annotation filename matches this glob pattern')
+    parser.add_argument('--shard', type=parse_shard, metavar='K/N',
+                        help='only process every N-th of the selected frames, starting with the K-th (1 <= K <= N), '
+                             'and write a completion marker when done (see sharding.py). With --incremental, the shard '
+                             'keeps a manifest of its own until the shards are merged.')
+    parser.add_argument('--merge-shards', type=int, metavar='N',
+                        help='Do not process any frames; check that the N shards of the data dir are done and covered '
+                             'every selected frame exactly once, then merge their manifests into the folder manifest.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep watching the data dir for new frames while they are being recorded and process each '
+                             'frame as soon as its annotation and depth image are complete. Combine with --incremental '
+                             'to skip the frames that were processed before.')
+    parser.add_argument('--watch-interval', type=float, default=0.2,
+                        help='With --watch, seconds between two looks at the data dir. default: 0.2')
+    parser.add_argument('--watch-timeout', type=float,
+                        help='With --watch, stop when no new frame has arrived for this many seconds. default: watch '
+                             'until interrupted')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes; each worker loads the meshes and sets up a renderer once.')
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help='number of frames that a reader thread loads ahead (0: read synchronously). '
+                             'Only without --workers. default: 2')
+    parser.add_argument('--writer-threads', type=int, default=2,
+                        help='number of threads that write the outputs in the background (0: write synchronously). '
+                             'Only without --workers. default: 2')
+    parser.add_argument('--write-queue', type=int, default=4,
+                        help='maximum number of frames whose outputs are waiting to be written. default: 4')
+    parser.add_argument('--profile', nargs='?', const='', metavar='TRACE_FILE',
+                        help='Time the stages of every frame, write them to a JSON-lines trace (default: '
+                             '<data_dir>/' + PROFILE_FILENAME + ') and print a summary with percentiles at the end.')
     parser.add_argument('--gui', action='store_true', help='Start a GUI after rendering each depth image.')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.merge_shards is not None:
+        return args
+    if not args.mesh_dir:
+        parser.error('argument -m/--mesh-dir is required')
+    if args.renderer == 'opengl' and Scene is None:
+        parser.error('meshrender is not installed; use --renderer numpy')
+    if args.renderer == 'numpy' and args.gui:
+        parser.error('--gui requires --renderer opengl')
+    if args.prefetch < 0 or args.writer_threads < 0 or args.write_queue < 1:
+        parser.error('--prefetch and --writer-threads must not be negative, --write-queue must be positive')
+    if args.no_save_full_json and args.output_unit_scaling is None:
+        parser.error('--no-save-full-json requires --output-unit-scaling')
+    if args.rethreshold and args.save_compositing:
+        parser.error('--rethreshold reads the compositing files; it cannot be combined with --save-compositing')
+    if args.depth_cache is not None and args.grouped_passes:
+        parser.error('--depth-cache caches the depth images of single objects; it cannot be combined with '
+                     '--grouped-passes')
+    if args.watch and (args.shard is not None or args.workers > 1 or args.rethreshold):
+        parser.error('--watch cannot be combined with --shard, --workers or --rethreshold')
 
     if not args.object_settings:
         args.object_settings = os.path.join(args.data_dir, '_object_settings.json')
     if not args.target_object_settings:
         args.target_object_settings = args.object_settings
+    return args
+
+
+def frame_done(json_file, args, manifest_writer, profile_records=None, frame_callback=None, frame_has_outputs=True):
+    """
+    Records a processed frame in the profile (if profiling) and in the manifest (if processing incrementally).
+
+    :param manifest_writer: ManifestWriter of the frames being processed
+    :param profile_records: profile records of the frame from a worker process; by default, the stages of the frame
+                            in this process are recorded
+    :param frame_callback: if given, called with (json_file, profile_records); the profile records are None if not
+                           profiling
+    :param frame_has_outputs: False for a frame without objects, which is not recorded in the manifest, see
+                              has_outputs()
+    """
+    if PROFILER.enabled:
+        if profile_records is None:
+            profile_records = [PROFILER.finish_frame(json_file)]
+        for record in profile_records:
+            PROFILER.add_record(record)
+    if frame_callback is not None:
+        frame_callback(json_file, profile_records)
+    if not args.incremental or not frame_has_outputs:
+        return
+    manifest_writer.record(json_file)
+
+
+def get_manifest_filename(args):
+    # type: (argparse.Namespace) -> str
+    return MANIFEST_FILENAME if args.shard is None else shard_manifest_filename(args.shard)
+
+
+class ManifestWriter(object):
+    """
+    Records processed frames in a manifest and saves it every MANIFEST_SAVE_INTERVAL recorded frames, so that little
+    work is lost if processing is interrupted.
+    """
 
-    # =====================================
-    # parse object_settings and load meshes
-    # =====================================
-    with open(args.object_settings, 'r') as f:
+    def __init__(self, manifest, input_hashes, data_dir, filename=MANIFEST_FILENAME):
+        """
+        :param manifest: dictionary mapping frame annotation filenames to their input hashes, updated in place
+        :param input_hashes: input hashes of the frames to be recorded, see select_outdated_frames()
+        """
+        self.manifest = manifest
+        self.input_hashes = input_hashes
+        self.data_dir = data_dir
+        self.filename = filename
+        # counted separately, since re-processed frames do not change the size of the manifest
+        self.unsaved_frames = 0
+
+    def record(self, json_file):
+        self.manifest[os.path.basename(json_file)] = self.input_hashes[json_file]
+        self.unsaved_frames += 1
+        if self.unsaved_frames >= MANIFEST_SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        save_manifest(self.data_dir, self.manifest, self.filename)
+        self.unsaved_frames = 0
+
+
+def list_frames(data_dir):
+    # type: (str) -> list
+    """
+    :return sorted list of the frame annotation files in data_dir
+    """
+    pattern = re.compile(r'\d{3,}.ycbm.json')
+    return sorted([os.path.join(data_dir, f) for f in os.listdir(data_dir) if pattern.match(f)])
+
+
+def frame_is_complete(json_file, require_image=False):
+    # type: (str, bool) -> bool
+    """
+    Checks whether a frame that is being recorded has been written completely: its annotation must be valid JSON and
+    its depth PNG must end with the IEND chunk.
+
+    :param require_image: if True, the rgb.jpg or intensity.jpg of the frame must exist, too
+    """
+    filename_prefix = json_file[:-len('ycbm.json')]
+    try:
+        with open(json_file, 'r') as f:
+            json.load(f)
+        with open(filename_prefix + 'depth.png', 'rb') as f:
+            f.seek(-len(PNG_END), os.SEEK_END)
+            if f.read() != PNG_END:
+                return False
+    except (IOError, ValueError):
+        return False
+    return not require_image or get_converted_filename(filename_prefix) is not None
+
+
+def select_frames(json_files, frame_range=None, frame_glob=None):
+    # type: (list, tuple, str) -> list
+    """
+    :param frame_range: (start, end) of the frame numbers, see sharding.parse_range()
+    :param frame_glob: glob pattern of the frame annotation filenames
+    """
+    if frame_range is not None:
+        json_files = [json_file for json_file in json_files
+                      if in_range(int(os.path.basename(json_file).split('.')[0]), frame_range)]
+    if frame_glob is not None:
+        json_files = select_glob(json_files, frame_glob)
+    return json_files
+
+
+def check_shards(data_dir, num_shards):
+    # type: (str, int) -> list
+    """
+    Checks that the shards of a folder are done and together processed every selected frame exactly once.
+
+    :return list of problems, see sharding.check_markers()
+    """
+    markers = load_markers(data_dir, FRAMES, num_shards)
+    selection = marker_selection(markers) or {}
+    json_files = select_frames(list_frames(data_dir), selection.get('frames'), selection.get('frame_glob'))
+    return check_markers(markers, [os.path.basename(json_file) for json_file in json_files], num_shards)
+
+
+def merge_shards(data_dir, num_shards):
+    # type: (str, int) -> None
+    """
+    Merges the manifests of the shards of a folder into the folder manifest and removes them and the completion
+    markers. Call check_shards() first.
+    """
+    shard_manifest_paths = [os.path.join(data_dir, shard_manifest_filename((k, num_shards)))
+                            for k in range(1, num_shards + 1)]
+    shard_manifest_paths = [path for path in shard_manifest_paths if os.path.exists(path)]
+    if shard_manifest_paths:
+        manifest = load_manifest(data_dir)
+        for path in shard_manifest_paths:
+            manifest.update(load_manifest(data_dir, os.path.basename(path)))
+        save_manifest(data_dir, manifest)
+        for path in shard_manifest_paths:
+            os.remove(path)
+    remove_markers(data_dir, FRAMES, num_shards)
+
+
+def get_frame_classes(json_files):
+    # type: (list) -> dict
+    """
+    Quick prepass over the frame annotations.
+
+    :return dictionary mapping each frame annotation file to the list of classes of its objects
+    """
+    frame_classes = {}
+    for json_file in json_files:
+        with open(json_file, 'r') as f:
+            frame_classes[json_file] = [scene_object_json['class'] for scene_object_json in json.load(f)['objects']]
+    return frame_classes
+
+
+def get_input_hashes(json_files, frame_classes, args):
+    # type: (list, dict, argparse.Namespace) -> dict
+    """
+    Hashes all inputs of each frame: the frame annotation, the depth image, both object settings files, the mesh cache
+    keys of the classes in the frame and all parameters that influence the outputs.
+
+    :return dictionary mapping each frame annotation file to its input hash
+    """
+    settings_hash = inputs_hash(file_hash(args.object_settings),
+                                file_hash(args.target_object_settings),
+                                file_hash(os.path.join(args.data_dir, '_camera_settings.json')),
+                                args.unit_scaling,
+                                args.mesh_scaling,
+                                args.no_save_vertmap,
+                                args.grouped_passes,
+                                args.renderer,
+                                args.max_depth_diff)
+    if args.output_unit_scaling is not None:
+        settings_hash = inputs_hash(settings_hash, args.output_unit_scaling, args.no_save_full_json)
+    mesh_keys = {}
+    input_hashes = {}
+    for json_file in json_files:
+        for class_name in frame_classes[json_file]:
+            if class_name not in mesh_keys:
+                mesh_keys[class_name] = mesh_cache_key(get_mesh_path(args.mesh_dir, class_name), args.mesh_scaling)
+        filename_prefix = json_file[:-len('ycbm.json')]
+        input_hashes[json_file] = inputs_hash(settings_hash,
+                                              file_hash(json_file),
+                                              file_hash(filename_prefix + 'depth.png'),
+                                              [mesh_keys[class_name] for class_name in frame_classes[json_file]])
+    return input_hashes
+
+
+def get_output_files(json_file, args):
+    # type: (str, argparse.Namespace) -> list
+    filename_prefix = json_file[:-len('ycbm.json')]
+    output_files = [filename_prefix + 'seg.png']
+    if not args.no_save_full_json:
+        output_files.append(filename_prefix + 'ycbm_full.json')
+    if args.output_unit_scaling is not None:
+        output_files.append(get_converted_filename(filename_prefix))
+    if not args.no_save_vertmap:
+        output_files.append(vertmap_filename(filename_prefix, args.vertmap_format))
+    if args.save_compositing:
+        output_files.append(compositing_filename(filename_prefix))
+    return output_files
+
+
+def load_folder(args, class_names=None, models=None, renderer=None):
+    """
+    Loads everything that is shared by all frames of a folder.
+
+    :param class_names: if given, only load the meshes of these classes
+    :param models: if given, the models are taken from these preloaded models instead of being loaded
+    :param renderer: if given, this renderer is set up for the camera of the folder instead of creating a new one
+    :return (camera_intrinsics, models, renderer); the renderer is None with --rethreshold
+    """
+    if models is None:
+        mesh_cache_dir = None if args.no_mesh_cache else args.mesh_cache_dir
+        models = load_models(args.object_settings, args.target_object_settings, args.mesh_dir, args.mesh_scaling,
+                             mesh_cache_dir, class_names, load_meshes=not args.rethreshold)
+    elif class_names is not None:
+        models = {class_name: model for (class_name, model) in models.items() if class_name in class_names}
+    camera_intrinsics = load_camera_intrinsics(args.data_dir)
+    if args.rethreshold:
+        # nothing is rendered
+        return camera_intrinsics, models, None
+    if renderer is not None:
+        renderer.set_camera(camera_intrinsics)
+        return camera_intrinsics, models, renderer
+    renderer_class = NumpyRenderer if args.renderer == 'numpy' else SceneRenderer
+    with PROFILER.stage('renderer_setup'):
+        renderer = renderer_class({class_name: model.mesh for (class_name, model) in models.items()},
+                                  camera_intrinsics, args.unit_scaling)
+    return camera_intrinsics, models, renderer
+
+
+def load_models(object_settings, target_object_settings, mesh_dir, mesh_scaling, mesh_cache_dir=None,
+                class_names=None, load_meshes=True):
+    # type: (str, str, str, float, str, set, bool) -> dict
+    """
+    Parses object_settings and loads meshes.
+
+    :param class_names: if given, only the models of these classes are loaded; the meshes of all other classes are
+                        never touched
+    :param load_meshes: if False, the mesh of every model is None
+    :return dictionary mapping class names to ModelConfigs
+    """
+    with open(object_settings, 'r') as f:
         object_settings_json = json.load(f)
-    with open(args.target_object_settings, 'r') as f:
+    with open(target_object_settings, 'r') as f:
         target_object_settings_json = json.load(f)
 
     if not len(object_settings_json['exported_objects']) == len(target_object_settings_json['exported_objects']):
@@ -67,14 +628,15 @@ def main():
         if not class_name == target_model_json['class']:
             print "FATAL: object_settings and target_object_settings do not match!"
             sys.exit(-1)
-        if class_name.endswith('_16k'):
-            mesh_path = os.path.join(args.mesh_dir, class_name[:-4], 'google_16k/textured.obj')
-        else:
-            mesh_path = os.path.join(args.mesh_dir, class_name, 'google_16k/textured.obj')
+        if class_names is not None and class_name not in class_names:
+            continue
+        mesh_path = get_mesh_path(mesh_dir, class_name)
         segmentation_class_id = model_json['segmentation_class_id']
         cuboid_dimensions = np.array(model_json['cuboid_dimensions'])
-        mesh = trimesh.load_mesh(mesh_path)
-        mesh.apply_scale(args.mesh_scaling)
+        mesh = None
+        if load_meshes:
+            with PROFILER.stage('mesh_load'):
+                mesh = load_mesh(mesh_path, mesh_scaling, mesh_cache_dir)
 
         # calculate model_transform
         fixed_model_transform_mat = np.transpose(np.array(model_json['fixed_model_transform']))
@@ -91,18 +653,43 @@ def main():
             from_frame='ycb_model',
             to_frame='target_model'
         )
-        model_transform = fixed_model_transform.dot(target_fixed_model_transform.inverse())
+        # stored as 4 x 4 matrix (target_model to source_model), see pose_utils
+        model_transform = fixed_model_transform.dot(target_fixed_model_transform.inverse()).matrix
 
         models[class_name] = ModelConfig(class_name, segmentation_class_id, model_transform, cuboid_dimensions,
                                          mesh)
+    return models
+
+
+def open_depth_cache(args, models):
+    # type: (argparse.Namespace, dict) -> DepthCache
+    """
+    :return the DepthCache for the models (see depth_cache.py); None without --depth-cache
+    """
+    if args.depth_cache is None:
+        return None
+    mesh_keys = {class_name: mesh_cache_key(get_mesh_path(args.mesh_dir, class_name), args.mesh_scaling)
+                 for class_name in models}
+    return DepthCache(args.depth_cache, mesh_keys, args.renderer, args.unit_scaling)
 
-    # ==================================================
-    # parse camera_settings and set up camera intrinsics
-    # ==================================================
-    with open(os.path.join(args.data_dir, '_camera_settings.json'), 'r') as f:
+
+def get_mesh_path(mesh_dir, class_name):
+    # type: (str, str) -> str
+    if class_name.endswith('_16k'):
+        return os.path.join(mesh_dir, class_name[:-4], 'google_16k/textured.obj')
+    else:
+        return os.path.join(mesh_dir, class_name, 'google_16k/textured.obj')
+
+
+def load_camera_intrinsics(data_dir):
+    # type: (str) -> CameraIntrinsics
+    """
+    Parses camera_settings and sets up camera intrinsics.
+    """
+    with open(os.path.join(data_dir, '_camera_settings.json'), 'r') as f:
         camera_settings_json = json.load(f)['camera_settings'][0]
 
-    camera_intrinsics = CameraIntrinsics(
+    return CameraIntrinsics(
         frame='camera',
         fx=camera_settings_json['intrinsic_settings']['fx'],
         fy=camera_settings_json['intrinsic_settings']['fy'],
@@ -113,40 +700,230 @@ def main():
         width=camera_settings_json['captured_image_size']['width']
     )
 
-    # ====================================
-    # process each frame
-    # ====================================
-    pattern = re.compile(r'\d{3,}.ycbm.json')
-    json_files = sorted([os.path.join(args.data_dir, f) for f in os.listdir(args.data_dir) if pattern.match(f)])
-    for json_file in json_files:
-        filename_prefix = json_file[:-len('ycbm.json')]
-        print '\n---------------------- {}*'.format(filename_prefix)
-        with open(json_file, 'r') as f:
-            frame_json = json.load(f)
-
-        real_depth_image = np.expand_dims(imageio.imread(filename_prefix + 'depth.png'), 2) / (
-                10000.0 / args.unit_scaling)
-        segmentation_image, updated_frame_json, vertmap = process_frame(frame_json,
-                                                                        real_depth_image,
-                                                                        camera_intrinsics,
-                                                                        models,
-                                                                        args.unit_scaling,
-                                                                        args.gui)
-        if segmentation_image is not None:
-            imageio.imwrite(filename_prefix + 'seg.png', segmentation_image)
-        with open(filename_prefix + 'ycbm_full.json', 'w') as f:
-            json.dump(updated_frame_json, f, indent=2, sort_keys=True)
-        if not args.no_save_vertmap:
-            np.savez_compressed(filename_prefix + 'vertmap.npz', vertmap=vertmap)
 
+def process_json_file(json_file, args, camera_intrinsics, models, renderer, depth_cache=None):
+    """
+    Processes one frame: reads the frame annotation and depth image and writes the segmentation image, the updated
+    frame annotation and the vertmap.
+
+    :return whether the frame has outputs, see has_outputs()
+    """
+    outputs = compute_frame(json_file, read_frame(json_file, args), args, camera_intrinsics, models, renderer,
+                            depth_cache)
+    write_frame(json_file, args, *outputs)
+    return has_outputs(outputs)
+
+
+def read_frame(json_file, args):
+    """
+    :return (frame_json, real_depth_image, compositing) of a frame; the real depth image is kept as the H x W x 1
+            uint16 values of the depth PNG, see process_frame(); the Compositing is only loaded with --rethreshold
+            (and None for a frame without objects)
+    """
+    filename_prefix = json_file[:-len('ycbm.json')]
+    with PROFILER.frame(json_file):
+        with PROFILER.stage('json_load'):
+            with open(json_file, 'r') as f:
+                frame_json = json.load(f)
+        with PROFILER.stage('depth_decode'):
+            real_depth_image = np.expand_dims(imageio.imread(filename_prefix + 'depth.png'), 2)
+        compositing = None
+        # frames without objects have no outputs and thus no compositing, see write_frame()
+        if args.rethreshold and frame_json['objects']:
+            with PROFILER.stage('compositing_load'):
+                compositing = load_compositing(filename_prefix)
+    return frame_json, real_depth_image, compositing
+
+
+def compute_frame(json_file, frame_inputs, args, camera_intrinsics, models, renderer, depth_cache=None):
+    """
+    :param frame_inputs: (frame_json, real_depth_image, compositing), see read_frame()
+    :return (segmentation_image, updated_frame_json, vertmap, compositing), see process_frame()
+    """
+    filename_prefix = json_file[:-len('ycbm.json')]
+    print '\n---------------------- {}*'.format(filename_prefix)
+    (frame_json, real_depth_image, compositing) = frame_inputs
+    with PROFILER.frame(json_file):
+        if args.rethreshold:
+            return rethreshold_frame(frame_json, real_depth_image, compositing, camera_intrinsics, models,
+                                     args.unit_scaling, args.max_depth_diff)
+        return process_frame(frame_json, real_depth_image, camera_intrinsics, models, args.unit_scaling, args.gui,
+                             args.grouped_passes, renderer, depth_cache, args.max_depth_diff)
+
+
+def has_outputs(outputs):
+    # type: (tuple) -> bool
+    """
+    :param outputs: (segmentation_image, updated_frame_json, vertmap, compositing), see process_frame()
+    :return False for a frame without objects, for which nothing is written
+    """
+    return outputs[1] is not None
+
+
+def write_frame(json_file, args, segmentation_image, updated_frame_json, vertmap, compositing=None):
+    """
+    Writes the outputs of a frame; nothing for a frame without objects.
 
-def process_frame(frame_json, real_depth_image, camera_intrinsics, models, unit_scaling, start_viewer=False):
+    :param compositing: Compositing of a rendered frame, saved with --save-compositing; None with --rethreshold
+    """
+    if updated_frame_json is None:
+        return
+    filename_prefix = json_file[:-len('ycbm.json')]
+    with PROFILER.frame(json_file):
+        if segmentation_image is not None:
+            with PROFILER.stage('png_encode'):
+                imageio.imwrite(filename_prefix + 'seg.png', segmentation_image)
+        with PROFILER.stage('json_dump'):
+            if not args.no_save_full_json:
+                with open(filename_prefix + 'ycbm_full.json', 'w') as f:
+                    json.dump(updated_frame_json, f, indent=2, sort_keys=True)
+            if args.output_unit_scaling is not None:
+                with open(get_converted_filename(filename_prefix), 'w') as f:
+                    json.dump(convert_frame(updated_frame_json, args.output_unit_scaling), f, indent=2, sort_keys=True)
+        with PROFILER.stage('vertmap_write'):
+            # vertmaps of an earlier run in another format (or at all, with --no-save-vertmap) would be stale
+            if args.no_save_vertmap:
+                remove_vertmaps(filename_prefix)
+            else:
+                save_vertmap(filename_prefix, vertmap, segmentation_image, args.vertmap_format)
+                remove_vertmaps(filename_prefix, keep_format=args.vertmap_format)
+        if compositing is not None:
+            with PROFILER.stage('compositing_write'):
+                if args.save_compositing:
+                    save_compositing(filename_prefix, compositing)
+                elif os.path.exists(compositing_filename(filename_prefix)):
+                    # it may not match the new outputs, see --rethreshold
+                    os.remove(compositing_filename(filename_prefix))
+
+
+# state of a worker process, set up once by init_worker(): (args, camera_intrinsics, models, renderer)
+worker_state = None
+
+
+def init_worker(args, class_names, models=None):
+    global worker_state
+    PROFILER.enabled = args.profile is not None
+    camera_intrinsics, models, renderer = load_folder(args, class_names, models)
+    worker_state = (args, camera_intrinsics, models, renderer, open_depth_cache(args, models))
+
+
+def process_json_file_in_worker(json_file):
+    """
+    Processes one frame in a worker process.
+
+    :return (log_output, profile_records, has_outputs) of the frame; the profile records include the setup of the
+            worker with its first frame
+    """
+    (args, camera_intrinsics, models, renderer, depth_cache) = worker_state
+    log_output = StringIO.StringIO()
+    stdout = sys.stdout
+    sys.stdout = log_output
+    try:
+        frame_has_outputs = process_json_file(json_file, args, camera_intrinsics, models, renderer, depth_cache)
+    finally:
+        sys.stdout = stdout
+    profile_records = []
+    if PROFILER.enabled:
+        profile_records = [record for record in [PROFILER.finish_frame(SETUP), PROFILER.finish_frame(json_file)]
+                           if record['stages']]
+    return log_output.getvalue(), profile_records, frame_has_outputs
+
+
+def process_frame(frame_json, real_depth_image, camera_intrinsics, models, unit_scaling, start_viewer=False,
+                  grouped_passes=False, renderer=None, depth_cache=None, max_depth_diff=MAX_DEPTH_DIFF):
+    """
+    :param real_depth_image: H x W x 1 uint16 values of the depth PNG (DEPTH_PNG_SCALE per meter, 0 = no measurement)
+    :param depth_cache: if given, the depth images of single objects are taken from this DepthCache where possible
+                        (not with grouped_passes)
+    :return (segmentation_image, updated_frame_json, vertmap, compositing); the Compositing holds the intermediates
+            that rethreshold_frame() needs. All None if the frame has no objects
+    """
     num_objects = len(frame_json['objects'])
     if len(frame_json['objects']) == 0:
         print "no objects in frame!"
-        return None, None
+        return None, None, None, None
+
+    (updated_frame_json, object_poses) = get_updated_frame_json(frame_json, camera_intrinsics, models)
+    class_names = [scene_object_json['class'] for scene_object_json in frame_json['objects']]
+
+    rois = [get_projected_bounds(object_poses[object_index], models[class_names[object_index]].mesh, camera_intrinsics)
+            for object_index in range(num_objects)]
+
+    # render depth images: either in passes of non-overlapping objects, or one per object, and overlay them
+    with PROFILER.stage('render'):
+        if renderer is None and grouped_passes:
+            # no long-lived renderer, so set up a scene for this frame only
+            renderer = SceneRenderer({class_name: models[class_name].mesh for class_name in class_names},
+                                     camera_intrinsics, unit_scaling)
+        if grouped_passes:
+            combined_depth_image, object_index_image, silhouette_bounds = renderer.render_scene(object_poses,
+                                                                                                class_names,
+                                                                                                start_viewer)
+        else:
+            depth_images = render_object_depth_images(object_poses, class_names, camera_intrinsics, models,
+                                                      unit_scaling, start_viewer, renderer, depth_cache)
+            with PROFILER.stage('compositing'):
+                combined_depth_image, object_index_image, silhouette_bounds = overlay_depth_images(depth_images, rois)
+
+    # calculate segmentation image, visibility, bounding_box
+    with PROFILER.stage('compositing'):
+        segmentation_image, updated_frame_json, vertmap = get_segmentation_image(updated_frame_json,
+                                                                                 combined_depth_image,
+                                                                                 object_index_image,
+                                                                                 silhouette_bounds,
+                                                                                 real_depth_image,
+                                                                                 camera_intrinsics,
+                                                                                 object_poses,
+                                                                                 models,
+                                                                                 rois,
+                                                                                 DEPTH_PNG_SCALE / unit_scaling,
+                                                                                 max_depth_diff)
+    remove_invisible_objects(updated_frame_json)
+    compositing = Compositing(combined_depth_image, object_index_image, silhouette_bounds[0], silhouette_bounds[1],
+                              rois)
+    return segmentation_image, updated_frame_json, vertmap, compositing
+
+
+def rethreshold_frame(frame_json, real_depth_image, compositing, camera_intrinsics, models, unit_scaling,
+                      max_depth_diff):
+    """
+    Recomputes the outputs of a frame from the compositing intermediates of an earlier run (see --save-compositing)
+    instead of rendering, e.g. for another max_depth_diff.
 
-    # copy relevant fields of json
+    :param compositing: Compositing of the frame, see compositing_io.load_compositing()
+    :return (segmentation_image, updated_frame_json, vertmap, None), like process_frame()
+    """
+    if len(frame_json['objects']) == 0:
+        print "no objects in frame!"
+        return None, None, None, None
+    if len(compositing.total_pixels) != len(frame_json['objects']):
+        raise ValueError('The compositing file has {} objects, but the frame has {}; process the frame again'.format(
+            len(compositing.total_pixels), len(frame_json['objects'])))
+    (updated_frame_json, object_poses) = get_updated_frame_json(frame_json, camera_intrinsics, models)
+    with PROFILER.stage('compositing'):
+        segmentation_image, updated_frame_json, vertmap = get_segmentation_image(updated_frame_json,
+                                                                                 compositing.combined_depth_image,
+                                                                                 compositing.object_index_image,
+                                                                                 (compositing.total_pixels,
+                                                                                  compositing.bounding_boxes),
+                                                                                 real_depth_image,
+                                                                                 camera_intrinsics,
+                                                                                 object_poses,
+                                                                                 models,
+                                                                                 compositing.rois,
+                                                                                 DEPTH_PNG_SCALE / unit_scaling,
+                                                                                 max_depth_diff)
+    remove_invisible_objects(updated_frame_json)
+    return segmentation_image, updated_frame_json, vertmap, None
+
+
+def get_updated_frame_json(frame_json, camera_intrinsics, models):
+    """
+    Copies the relevant fields of a frame annotation and adds the poses and cuboids of its objects in the target model
+    frame.
+
+    :return (updated_frame_json, object_poses); the object poses are the N x 4 x 4 poses (target_model to camera)
+    """
     updated_frame_json = {'camera_data': {}, 'objects': []}
     if frame_json['camera_data']:
         updated_frame_json['camera_data']['location_worldframe'] = copy.deepcopy(
@@ -160,71 +937,98 @@ def process_frame(frame_json, real_depth_image, camera_intrinsics, models, unit_
         updated_frame_json['objects'].append({})
         updated_frame_json['objects'][i]['class'] = copy.deepcopy(frame_json['objects'][i]['class'])
 
-    # get object poses and render separate depth images
-    object_poses = []
-    depth_images = []
-    for object_index in range(num_objects):
-        model_name = updated_frame_json['objects'][object_index]['class']
-        scene_object_json = frame_json['objects'][object_index]
-        (translation, rotation) = object_pose_from_json(scene_object_json)
-        object_pose = RigidTransform(
-            rotation=rotation,
-            translation=translation,
-            from_frame='source_model',
-            to_frame='camera'
-        )
-        object_pose = object_pose.dot(models[model_name].model_transform)
-        object_poses.append(object_pose)
-
-        updated_frame_json['objects'][object_index]['location'] = object_pose.translation.tolist()
-        updated_frame_json['objects'][object_index]['quaternion_xyzw'] = np.roll(object_pose.quaternion, -1).tolist()
-
-        mesh = models[scene_object_json['class']].mesh
-        depth_images.append(render_depth_image(object_pose, camera_intrinsics, mesh, unit_scaling, start_viewer))
+    # get object poses (source_model to camera), transformed into target_model
+    class_names = [scene_object_json['class'] for scene_object_json in frame_json['objects']]
+    object_poses = compose(poses_from_json(frame_json['objects']),
+                           np.array([models[class_name].model_transform for class_name in class_names]))
+    for object_index, pose_json in enumerate(poses_to_json(object_poses)):
+        updated_frame_json['objects'][object_index].update(pose_json)
 
     # add pose_transform_permuted
-    for object_index in range(num_objects):
-        ptp_json = pose_transform_permuted_to_json(object_poses[object_index].translation,
-                                                   object_poses[object_index].rotation)
-        updated_frame_json['objects'][object_index].update(ptp_json)
-
-    # compute cuboid, cuboid_centroid, projected_cuboid, projected_cuboid_centroid, bounding_box
-    for object_index in range(num_objects):
-        model_name = updated_frame_json['objects'][object_index]['class']
-        cuboid_json = get_cuboid(object_poses[object_index], models[model_name].cuboid_dimensions, camera_intrinsics)
+    for object_index, pose_transform_permuted in enumerate(pose_transforms_permuted(object_poses)):
+        updated_frame_json['objects'][object_index][u'pose_transform_permuted'] = pose_transform_permuted.tolist()
+
+    # compute cuboid, cuboid_centroid, projected_cuboid, projected_cuboid_centroid
+    cuboid_dimensions = np.array([models[scene_object_json['class']].cuboid_dimensions
+                                  for scene_object_json in updated_frame_json['objects']])
+    cuboids = get_cuboids(object_poses, cuboid_dimensions, camera_intrinsics)
+    for object_index, cuboid_json in enumerate(cuboids_to_json(*cuboids)):
         updated_frame_json['objects'][object_index].update(cuboid_json)
+    return updated_frame_json, object_poses
 
-    # overlay depth images, calculate segmentation image, visibility, bounding_box
-    segmentation_image, updated_frame_json, vertmap = get_segmentation_image(updated_frame_json,
-                                                                             depth_images,
-                                                                             real_depth_image,
-                                                                             camera_intrinsics,
-                                                                             object_poses,
-                                                                             models)
 
-    # remove objects with zero visibility
-    for obj in list(updated_frame_json['objects']):  # temporary copy for deletion while iterating
+def remove_invisible_objects(frame_json):
+    """
+    Removes the objects with zero visibility from a frame annotation.
+    """
+    for obj in list(frame_json['objects']):  # temporary copy for deletion while iterating
         if obj['visibility'] == 0.0:
             print "Removing object because of zero visibility: {}".format(obj['class'])
-            updated_frame_json['objects'].remove(obj)
+            frame_json['objects'].remove(obj)
 
-    return segmentation_image, updated_frame_json, vertmap
 
-
-def get_segmentation_image(frame_json, depth_images, real_depth_image, camera_intrinsics, object_poses, models):
+def overlay_depth_images(depth_images, rois=None):
+    """
+    Overlays separately rendered depth images of all objects in a frame. The depth images are folded one by one into a
+    running minimum within the region of their object, and each one is removed from the list once it is folded in, so
+    that it can be freed right away.
+
+    :param depth_images: list of DepthImages, one per object, each 0 outside of its region; emptied (all None) on return
+    :param rois: see get_segmentation_image(). Default: whole image
+    :return (combined_depth_image, object_index_image, silhouette_bounds); the combined depth image is 0 where there is
+            no object, the object index image is 255 there; silhouette_bounds are (total_pixels, bounding_boxes) with
+            the get_mask_bounds() of the unoccluded silhouette of each object
+    """
+    img_height, img_width = depth_images[0].raw_data.shape[:2]
+    if rois is None:
+        rois = len(depth_images) * [(0, 0, img_width - 1, img_height - 1)]
+    combined_depth_image = np.full((img_height, img_width, 1), np.inf, dtype=np.float32)
+    object_index_image = np.full((img_height, img_width, 1), 255, dtype=np.uint8)  # 255 = invalid object index
+    total_pixels = []
+    bounding_boxes = []
+    for object_index, (roi_umin, roi_vmin, roi_umax, roi_vmax) in enumerate(rois):
+        depth = depth_images[object_index].raw_data[roi_vmin:roi_vmax + 1, roi_umin:roi_umax + 1]
+        depth_images[object_index] = None
+        silhouette = depth > 0
+        (silhouette_pixels, bounding_box) = get_mask_bounds(silhouette[:, :, 0], roi_umin, roi_vmin)
+        total_pixels.append(silhouette_pixels)
+        bounding_boxes.append(bounding_box)
+
+        # on equal depth, the object with the lower index stays in front
+        combined_depth = combined_depth_image[roi_vmin:roi_vmax + 1, roi_umin:roi_umax + 1]
+        in_front = silhouette & (depth < combined_depth)
+        combined_depth[in_front] = depth[in_front]
+        object_index_image[roi_vmin:roi_vmax + 1, roi_umin:roi_umax + 1][in_front] = object_index
+    combined_depth_image[object_index_image == 255] = 0.0
+
+    return combined_depth_image, object_index_image, (total_pixels, bounding_boxes)
+
+
+def get_segmentation_image(frame_json, combined_depth_image, object_index_image, silhouette_bounds, real_depth_image,
+                           camera_intrinsics, object_poses, models, rois=None, real_depth_scale=1.0,
+                           max_depth_diff=MAX_DEPTH_DIFF):
+    """
+    :param silhouette_bounds: (total_pixels, bounding_boxes) of the unoccluded silhouettes of the objects, see
+                              overlay_depth_images()
+    :param real_depth_image: real depth image, in units of 1 / real_depth_scale (e.g. the uint16 values of the depth
+                             PNG); 0 where there is no measurement
+    :param rois: list of (umin, vmin, umax, vmax) image regions (inclusive) that contain the silhouette of each object,
+                 see get_projected_bounds(); per-object work is restricted to these regions. Default: whole image
+    :param max_depth_diff: object pixels where the synthetic and the real depth differ by this much or more are removed
+    """
     updated_frame_json = copy.deepcopy(frame_json)
     num_objects = len(frame_json['objects'])
+    img_height, img_width = object_index_image.shape[:2]
+    if rois is None:
+        rois = num_objects * [(0, 0, img_width - 1, img_height - 1)]
 
     # calculate bounding_box and update json
+    (total_pixels, bounding_boxes) = silhouette_bounds
     for object_index in range(num_objects):
-        depth_image = depth_images[object_index].raw_data
-        cols = np.any(depth_image, axis=0)
-        rows = np.any(depth_image, axis=1)
-        if not np.any(cols):
+        if bounding_boxes[object_index] is None:
             # depth image is empty, so bounding box is undefined
             continue
-        umin, umax = np.nonzero(cols)[0][[0, -1]]
-        vmin, vmax = np.nonzero(rows)[0][[0, -1]]
+        (vmin, umin, vmax, umax) = bounding_boxes[object_index]
 
         # TODO: remove this quirk of the FAT dataset; corrds should be (u, v), not (v, u)
         bbox_top_left = [vmin, umin]
@@ -234,39 +1038,35 @@ def get_segmentation_image(frame_json, depth_images, real_depth_image, camera_in
         updated_frame_json['objects'][object_index]['bounding_box']['top_left'] = bbox_top_left
         updated_frame_json['objects'][object_index]['bounding_box']['bottom_right'] = bbox_bottom_right
 
-    # calculate object index image
-    object_index_image = np.full_like(depth_images[0].raw_data, 255, dtype=np.uint8)  # 255 = invalid object index
-    combined_depth_image = np.full_like(depth_images[0].raw_data, np.inf)
-    for object_index in range(num_objects):
-        depth_image = depth_images[object_index].raw_data
-        mask = np.logical_and(depth_image < combined_depth_image, depth_image != 0)
-        combined_depth_image = np.choose(mask, (combined_depth_image, depth_image))
-        object_index_image = np.choose(mask, (object_index_image, object_index))
+    visible_pixels_before_filtering = np.bincount(object_index_image.ravel(), minlength=256)
 
-    visible_pixels_before_filtering = num_objects * [0]
-    for object_index in range(num_objects):
-        visible_pixels_before_filtering[object_index] = int(np.sum(object_index_image == object_index))
+    # filter segmentation image by comparison with real_depth_image; only object pixels can be filtered out, so the
+    # depth difference is computed for these pixels only, in float32 units of the real depth image
+    object_pixels = np.flatnonzero(object_index_image != 255)
+    real_depth = real_depth_image.ravel()[object_pixels]
+    synthetic_depth = combined_depth_image.ravel()[object_pixels] * np.float32(real_depth_scale)
+    within_depth_diff_mask = np.logical_or(real_depth == 0, np.absolute(synthetic_depth - real_depth) <
+                                           np.float32(max_depth_diff * real_depth_scale))
+    object_index_image = object_index_image.astype(np.uint8)
+    object_index_image.reshape(-1)[object_pixels[~within_depth_diff_mask]] = 255
 
-    # filter segmentation image by comparison with real_depth_image
-    within_depth_diff_mask = np.logical_or(real_depth_image == 0.0,
-                                           np.absolute(combined_depth_image - real_depth_image) < MAX_DEPTH_DIFF)
-    object_index_image = np.choose(within_depth_diff_mask, (255, object_index_image))
+    visible_pixels = np.bincount(object_index_image.ravel(), minlength=256)
 
     # calculate visibility and update json
+    cuboid_visibilities = get_cuboid2d_visibilities(
+        [scene_object_json['projected_cuboid'] for scene_object_json in updated_frame_json['objects']],
+        img_width, img_height).tolist()
     for object_index in range(num_objects):
-        total_pixels = np.sum(depth_images[object_index].raw_data > 0)
-        visible_pixels = np.sum(object_index_image == object_index)
-
-        if total_pixels == 0:
+        if total_pixels[object_index] == 0:
             visibility = 0.0
             ground_truth_mismatch = 0.0
         else:
-            visibility = float(visible_pixels) / total_pixels
-            ground_truth_mismatch = float(visible_pixels_before_filtering[object_index] - visible_pixels) / total_pixels
+            visibility = float(visible_pixels[object_index]) / total_pixels[object_index]
+            ground_truth_mismatch = float(visible_pixels_before_filtering[object_index] -
+                                          visible_pixels[object_index]) / total_pixels[object_index]
 
         # adjust visibility based on fraction of cuboid in camera frustum
-        visibility *= get_cuboid2d_visibility(updated_frame_json['objects'][object_index]['projected_cuboid'],
-                                              depth_images[object_index].width, depth_images[object_index].height)
+        visibility *= cuboid_visibilities[object_index]
 
         updated_frame_json['objects'][object_index]['visibility'] = visibility
         updated_frame_json['objects'][object_index]['ground_truth_mismatch'] = ground_truth_mismatch
@@ -278,22 +1078,64 @@ def get_segmentation_image(frame_json, depth_images, real_depth_image, camera_in
                 updated_frame_json['objects'][object_index]['class'], visibility)
 
     # convert object_index_image to segmentation_image
-    segmentation_image = np.zeros_like(object_index_image)
+    segmentation_id_lut = np.zeros(256, dtype=np.uint8)
     for object_index in range(num_objects):
-        segmentation_id = models[frame_json['objects'][object_index]['class']].segmentation_class_id
-        segmentation_image = np.where(object_index_image == object_index, segmentation_id, segmentation_image)
+        segmentation_id_lut[object_index] = models[frame_json['objects'][object_index]['class']].segmentation_class_id
+    segmentation_image = segmentation_id_lut[object_index_image]
 
-    # compute vertmap
-    vertmap = np.zeros((object_index_image.shape[0], object_index_image.shape[1], 3), dtype=np.float32)
-    for object_index in range(num_objects):
-        points_camera = camera_intrinsics.deproject(depth_images[object_index])
-        points_model = object_poses[object_index].inverse().apply(points_camera)
-        points_model_data = np.transpose(points_model.data).reshape(vertmap.shape)
-        vertmap = np.where(object_index_image == object_index, points_model_data, vertmap)
+    with PROFILER.stage('vertmap'):
+        vertmap = get_vertmap(combined_depth_image, object_index_image, camera_intrinsics, object_poses, rois)
 
     return segmentation_image, updated_frame_json, vertmap
 
 
+def get_mask_bounds(mask, umin_offset=0, vmin_offset=0):
+    # type: (np.array, int, int) -> (int, tuple)
+    """
+    :param mask: H x W bool array
+    :param umin_offset: column of the mask in the image
+    :param vmin_offset: row of the mask in the image
+    :return (number of pixels, bounding box) of the mask; the bounding box is (vmin, umin, vmax, umax) in the image
+            (inclusive), None for an empty mask
+    """
+    num_pixels = np.count_nonzero(mask)
+    if num_pixels == 0:
+        return 0, None
+    umin, umax = np.flatnonzero(np.any(mask, axis=0))[[0, -1]] + umin_offset
+    vmin, vmax = np.flatnonzero(np.any(mask, axis=1))[[0, -1]] + vmin_offset
+    return num_pixels, (int(vmin), int(umin), int(vmax), int(umax))
+
+
+def get_vertmap(combined_depth_image, object_index_image, camera_intrinsics, object_poses, rois):
+    """
+    Computes the vertmap, i.e. the coordinates of each visible object point in the model frame of its object. Only the
+    pixels that the object index image assigns to an object are deprojected and transformed.
+
+    :param rois: list of (umin, vmin, umax, vmax) image regions (inclusive) that contain the silhouette of each object
+    :return H x W x 3 float64 array, 0 where there is no object
+    """
+    img_height, img_width = object_index_image.shape[:2]
+    # float64, like the vertmaps written so far (the float32 zeros used to be promoted by np.where)
+    vertmap = np.zeros((img_height, img_width, 3), dtype=np.float64)
+    K_inv = np.linalg.inv(camera_intrinsics.K)
+    inverse_object_poses = invert(object_poses)
+    for object_index, (umin, vmin, umax, vmax) in enumerate(rois):
+        v, u = np.nonzero(object_index_image[vmin:vmax + 1, umin:umax + 1, 0] == object_index)
+        if len(v) == 0:
+            continue
+        v += vmin
+        u += umin
+
+        # the combined depth image equals each object's own depth image wherever that object is visible
+        pixels_homog = np.array([u, v, np.ones_like(u)], dtype=np.float64)
+        points_camera = combined_depth_image[v, u, 0] * K_inv.dot(pixels_homog)
+        points_camera_homog = np.r_[points_camera, np.ones([1, len(v)])]
+        points_model = inverse_object_poses[object_index].dot(points_camera_homog)[0:3, :]
+        vertmap[v, u] = points_model.T
+
+    return vertmap
+
+
 # def get_segmentation_image_slow(frame_json, depth_images, segmentation_class_ids):
 #     updated_frame_json = copy.deepcopy(frame_json)
 #     num_objects = len(frame_json['objects'])
@@ -345,6 +1187,42 @@ def get_segmentation_image(frame_json, depth_images, real_depth_image, camera_in
 #     return segmentation_image, updated_frame_json
 
 
+def render_object_depth_images(object_poses, class_names, camera_intrinsics, models, unit_scaling, start_viewer=False,
+                               renderer=None, depth_cache=None):
+    """
+    Renders a separate depth image for each object; objects whose depth image is in the depth cache are not rendered
+    again, and all newly rendered depth images are added to it.
+
+    :param renderer: SceneRenderer or NumpyRenderer; by default, a scene is set up for each object
+    :param depth_cache: DepthCache; by default, all objects are rendered
+    :return list of DepthImages, like render_depth_image()
+    """
+    depth_images = [None] * len(object_poses)
+    if depth_cache is not None:
+        with PROFILER.stage('depth_cache'):
+            keys = [depth_cache.key(class_name, object_pose, camera_intrinsics)
+                    for object_pose, class_name in zip(object_poses, class_names)]
+            depth_images = [depth_cache.load(key, camera_intrinsics) for key in keys]
+    missing = [object_index for object_index, depth_image in enumerate(depth_images) if depth_image is None]
+    if not missing:
+        return depth_images
+
+    if renderer is None:
+        rendered_images = [render_depth_image(object_poses[object_index], camera_intrinsics,
+                                              models[class_names[object_index]].mesh, unit_scaling, start_viewer)
+                           for object_index in missing]
+    else:
+        rendered_images = renderer.render_depth_images([object_poses[object_index] for object_index in missing],
+                                                       [class_names[object_index] for object_index in missing],
+                                                       start_viewer)
+    for object_index, depth_image in zip(missing, rendered_images):
+        depth_images[object_index] = depth_image
+        if depth_cache is not None:
+            with PROFILER.stage('depth_cache'):
+                depth_cache.save(keys[object_index], depth_image)
+    return depth_images
+
+
 def render_depth_image(object_pose, camera_intrinsics, mesh, unit_scaling, start_viewer):
     scene = Scene()
 
@@ -357,7 +1235,7 @@ def render_depth_image(object_pose, camera_intrinsics, mesh, unit_scaling, start
         alpha=10.0,
         smooth=False
     )
-    scene_obj = SceneObject(mesh=mesh, T_obj_world=object_pose, material=blue_material)
+    scene_obj = SceneObject(mesh=mesh, T_obj_world=rigid_transform_from_pose(object_pose), material=blue_material)
     scene.add_object('target_model', scene_obj)
 
     camera_pose = RigidTransform(from_frame='camera', to_frame='world')
@@ -372,114 +1250,185 @@ def render_depth_image(object_pose, camera_intrinsics, mesh, unit_scaling, start
     return depth_image
 
 
-def get_cuboid(object_pose, cuboid_dimensions, camera_intrinsics):
-    # cuboid centroid
-    cuboid_centroid = object_pose.translation
-    result_json = {'cuboid_centroid': cuboid_centroid.tolist()}
-
-    # cuboid
-    x = cuboid_dimensions[0] / 2
-    y = cuboid_dimensions[1] / 2
-    z = cuboid_dimensions[2] / 2
-    # colors in nvdu_viz:       b   b   m  m  g   g   y  y                 (b)lue, (m)agenta, (g)reen, (y)ellow
-    cuboid_corners = np.array([[x, -x, -x, x, x, -x, -x, x],
-                               [-y, -y, y, y, -y, -y, y, y],
-                               [z, z, z, z, -z, -z, -z, -z]])
-    cuboid_points_model = PointCloud(cuboid_corners, 'target_model')
-    cuboid_points_camera = object_pose.apply(cuboid_points_model)
-    result_json['cuboid'] = np.transpose(cuboid_points_camera.data).tolist()
-
-    # projected_cuboid_centroid
-    cuboid_centroid_image_coords = project_subpixel(camera_intrinsics, Point(cuboid_centroid, 'camera'))
-    result_json['projected_cuboid_centroid'] = cuboid_centroid_image_coords.tolist()
-
-    # projected_cuboid
-    cuboid_image_coords = project_subpixel(camera_intrinsics, cuboid_points_camera)
-    result_json['projected_cuboid'] = np.transpose(cuboid_image_coords).tolist()
-
-    return result_json
-
-
-def project_subpixel(camera_intrinsics, point_cloud):
-    # modified from CameraIntrinsics.project()
-    if not isinstance(point_cloud, PointCloud) and not (isinstance(point_cloud, Point) and point_cloud.dim == 3):
-        raise ValueError('Must provide PointCloud or 3D Point object for projection')
-    if point_cloud.frame != camera_intrinsics.frame:
-        raise ValueError('Cannot project points in frame %s into camera with frame %s' % (
-            point_cloud.frame, camera_intrinsics.frame))
-
-    points_proj = camera_intrinsics.proj_matrix.dot(point_cloud.data)
-    if len(points_proj.shape) == 1:
-        points_proj = points_proj[:, np.newaxis]
-    point_depths = np.tile(points_proj[2, :], [3, 1])
-    points_proj = np.divide(points_proj, point_depths)
-
-    return points_proj[:2, :].squeeze()
-
-
-def get_cuboid2d_visibility(cuboid2d, img_width, img_height):
-    cuboid_poly = MultiPoint(cuboid2d).convex_hull
-    img_poly = MultiPoint([(0, 0), (0, img_height), (img_width, img_height), (img_width, 0)]).convex_hull
-    return cuboid_poly.intersection(img_poly).area / cuboid_poly.area
-
-
-def object_pose_from_json(scene_object_json):
-    # type: (dict) -> (np.array, np.array)
+class SceneRenderer(object):
     """
-    Parses object pose from "location" and "quaternion_xyzw".
-
-    :param scene_object_json: JSON fragment of a single scene object
-    :return (translation, rotation) in meters
+    Long-lived renderer that keeps one meshrender scene (and thus one OpenGL context) with every mesh uploaded once.
+    Per frame, only the poses of the objects in that frame are updated and all other objects are disabled.
     """
-    quaternion_xyzw = np.array(scene_object_json['quaternion_xyzw'])
-    quaternion_wxyz = np.roll(quaternion_xyzw, 1)
-    rotation = RigidTransform.rotation_from_quaternion(quaternion_wxyz)
-    translation = np.array(scene_object_json['location'])
-    return translation, rotation
-
 
-def pose_transform_permuted_from_json(scene_object_json):
-    # type: (dict) -> (np.array, np.array)
+    def __init__(self, meshes, camera_intrinsics, unit_scaling):
+        """
+        :param meshes: dictionary mapping class names to meshes
+        :param camera_intrinsics: CameraIntrinsics of the camera to render
+        :param unit_scaling: scaling factor for depth units, used for the clipping planes
+        """
+        self._meshes = meshes
+        self._unit_scaling = unit_scaling
+        self._scene = Scene()
+        self._scene_objs = {}  # class name -> list of SceneObjects, one per instance of that class in a frame
+        for class_name in sorted(meshes.keys()):
+            self._add_scene_obj(class_name)
+        self._camera_pose = RigidTransform(from_frame='camera', to_frame='world')
+        self.set_camera(camera_intrinsics)
+
+    def set_camera(self, camera_intrinsics):
+        self._scene.camera = VirtualCamera(camera_intrinsics, self._camera_pose, z_near=(0.05 * self._unit_scaling),
+                                           z_far=(6.5535 * self._unit_scaling))
+
+    def close(self):
+        self._scene.close()
+
+    def add_mesh(self, class_name, mesh):
+        """
+        Makes another class available for rendering.
+        """
+        self._meshes[class_name] = mesh
+        self._add_scene_obj(class_name)
+
+    def _add_scene_obj(self, class_name):
+        # only used for visualization, like in render_depth_image()
+        blue_material = MaterialProperties(
+            color=np.array([0.1, 0.1, 0.5]),
+            k_a=0.3,
+            k_d=1.0,
+            k_s=1.0,
+            alpha=10.0,
+            smooth=False
+        )
+        scene_obj = SceneObject(mesh=self._meshes[class_name], material=blue_material)
+        scene_obj.enabled = False
+        # adding an object to the scene closes the renderer, so all meshes are uploaded again on the next render
+        self._scene.add_object('{}_{}'.format(class_name, len(self._scene_objs.get(class_name, []))), scene_obj)
+        self._scene_objs.setdefault(class_name, []).append(scene_obj)
+
+    def _update_poses(self, object_poses, class_names):
+        """
+        Enables one scene object per frame object and updates its pose.
+
+        :return list of the SceneObjects of the frame objects
+        """
+        for scene_objs in self._scene_objs.values():
+            for scene_obj in scene_objs:
+                scene_obj.enabled = False
+
+        frame_scene_objs = []
+        for object_pose, class_name in zip(object_poses, class_names):
+            instance = class_names[:len(frame_scene_objs)].count(class_name)
+            while instance >= len(self._scene_objs[class_name]):
+                self._add_scene_obj(class_name)
+            scene_obj = self._scene_objs[class_name][instance]
+            scene_obj.T_obj_world = rigid_transform_from_pose(object_pose)
+            scene_obj.enabled = True
+            frame_scene_objs.append(scene_obj)
+        return frame_scene_objs
+
+    def _show_viewer(self):
+        SceneViewer(self._scene, raymond_lighting=True, starting_camera_pose=self._camera_pose)
+
+    def render_depth_images(self, object_poses, class_names, start_viewer=False):
+        """
+        Renders a separate depth image for each object.
+
+        :return list of DepthImages, like render_depth_image()
+        """
+        frame_scene_objs = self._update_poses(object_poses, class_names)
+        depth_images = []
+        for scene_obj in frame_scene_objs:
+            for other_scene_obj in frame_scene_objs:
+                other_scene_obj.enabled = other_scene_obj is scene_obj
+            if start_viewer:
+                self._show_viewer()
+            [depth_image] = self._scene.wrapped_render([RenderMode.DEPTH])
+            depth_images.append(depth_image)
+        return depth_images
+
+    def render_scene(self, object_poses, class_names, start_viewer=False):
+        """
+        Renders all objects of a frame in as few passes as possible (--grouped-passes).
+
+        Objects whose projected bounds do not overlap cannot cover the same pixel, so they are rendered together in one
+        depth-only pass, and the depth image of each object is its region of that pass. Every object is still drawn
+        exactly once, but the clearing, read-back and conversion of a full image is paid once per group of
+        non-overlapping objects instead of once per object. The result is the same as overlaying the depth images of
+        render_depth_images(), and the number of passes still grows with the number of overlapping objects.
+
+        An object index buffer from a single color pass of all objects (with the remaining passes only for the
+        silhouettes of overlapping objects) is not used: meshrender shades the color pass with its full lighting
+        shader, and at 640x480 with 8 objects that pass alone took about 105 ms, more than the about 80 ms of all 8
+        per-object depth passes. Cropping the passes to the object regions does not help either: the cost of a pass
+        is dominated by the triangles drawn, and a crop changes the projection and thus the last bits of the depth.
+
+        :return (combined_depth_image, object_index_image, silhouette_bounds), like overlay_depth_images()
+        """
+        num_objects = len(object_poses)
+        frame_scene_objs = self._update_poses(object_poses, class_names)
+        if start_viewer:
+            self._show_viewer()
+
+        camera_intrinsics = self._scene.camera.intrinsics
+        rois = [get_projected_bounds(object_poses[object_index], self._meshes[class_names[object_index]],
+                                     camera_intrinsics) for object_index in range(num_objects)]
+        render_groups = []
+        for object_index in range(num_objects):
+            for render_group in render_groups:
+                if not any(bounds_overlap(rois[object_index], rois[other_index]) for other_index in render_group):
+                    render_group.append(object_index)
+                    break
+            else:
+                render_groups.append([object_index])
+
+        depth_images = num_objects * [None]
+        for render_group in render_groups:
+            for object_index, scene_obj in enumerate(frame_scene_objs):
+                scene_obj.enabled = object_index in render_group
+            [group_depth_image] = self._scene.wrapped_render([RenderMode.DEPTH])
+            for object_index in render_group:
+                depth_images[object_index] = group_depth_image
+
+        with PROFILER.stage('compositing'):
+            return overlay_depth_images(depth_images, rois)
+
+
+def rigid_transform_from_pose(object_pose):
+    # type: (np.array) -> RigidTransform
     """
-    Parses object pose from "pose_transform_permuted". Equivalent to parse_object_pose.
-
-    *Note:*  Like the `fixed_model_transform`, the `pose_transform_permuted` is actually the transpose of the matrix.
-    Moreover, after transposing, the columns are permuted, and there is a sign flip (due to UE4's use of a lefthand
-    coordinate system).  Specifically, if `A` is the matrix given by `pose_transform_permuted`, then actual transform
-    is given by `A^T * P`, where `^T` denotes transpose, `*` denotes matrix multiplication, and the permutation matrix
-    `P` is given by
-
-        [ 0  0  1]
-    P = [ 1  0  0]
-        [ 0 -1  0]
-
-    :param scene_object_json: JSON fragment of a single scene object
-    :return (translation, rotation) in meters
+    :param object_pose: 4 x 4 pose of an object in the camera frame
+    :return the pose as meshrender expects it for SceneObject.T_obj_world
     """
-    pose_transform = np.transpose(np.array(scene_object_json['pose_transform_permuted']))
-    to_righthand = np.array([[0, 0, 1],
-                             [1, 0, 0],
-                             [0, -1, 0]])
-    rotation = pose_transform[:3, :3].dot(to_righthand)
-    translation = pose_transform[:3, 3]
-    return translation, rotation
+    return RigidTransform(rotation=object_pose[:3, :3], translation=object_pose[:3, 3], from_frame='target_model',
+                          to_frame='camera')
 
 
-def pose_transform_permuted_to_json(translation, rotation):
-    # type: (np.array, np.array) -> dict
+def get_projected_bounds(object_pose, mesh, camera_intrinsics):
+    # type: (np.array, trimesh.Trimesh, CameraIntrinsics) -> (int, int, int, int)
     """
-    :param translation: location (in meters) as 3x1 array
-    :param rotation: rotation as 3x3 matrix
-    :return JSON dictionary of pose_transform_permuted (in cm)
+    Conservative image-space bounds of a mesh, computed by projecting the corners of its axis-aligned bounding box.
+
+    :return (umin, vmin, umax, vmax) in pixels (inclusive, clipped to the image, empty if the mesh is outside of the
+            image); the whole image if any corner is not in front of the camera
     """
-    pose_transform_permuted = np.eye(4)
-    pose_transform_permuted[:3, 3] = translation
-    to_lefthand = np.array([[0, 1, 0],
-                            [0, 0, -1],
-                            [1, 0, 0]])
-    pose_transform_permuted[:3, :3] = rotation.dot(to_lefthand)
-    pose_transform_permuted = np.transpose(pose_transform_permuted)
-    return {u'pose_transform_permuted': pose_transform_permuted.tolist()}
+    (xmin, ymin, zmin), (xmax, ymax, zmax) = mesh.bounds
+    box_corners = np.array([[xmin, xmax, xmin, xmax, xmin, xmax, xmin, xmax],
+                            [ymin, ymin, ymax, ymax, ymin, ymin, ymax, ymax],
+                            [zmin, zmin, zmin, zmin, zmax, zmax, zmax, zmax]])
+    box_points_camera = object_pose.dot(np.r_[box_corners, np.ones([1, 8])])[0:3, :]
+    if np.any(box_points_camera[2] <= 0):
+        return 0, 0, camera_intrinsics.width - 1, camera_intrinsics.height - 1
+
+    box_points_proj = camera_intrinsics.proj_matrix.dot(box_points_camera)
+    box_image_coords = box_points_proj[0:2, :] / box_points_proj[2, :]
+    # one pixel of padding for rasterization
+    umin = int(max(np.floor(np.min(box_image_coords[0])) - 1, 0))
+    vmin = int(max(np.floor(np.min(box_image_coords[1])) - 1, 0))
+    umax = int(min(max(np.ceil(np.max(box_image_coords[0])) + 1, -1), camera_intrinsics.width - 1))
+    vmax = int(min(max(np.ceil(np.max(box_image_coords[1])) + 1, -1), camera_intrinsics.height - 1))
+    return umin, vmin, umax, vmax
+
+
+def bounds_overlap(bounds_a, bounds_b):
+    (umin_a, vmin_a, umax_a, vmax_a) = bounds_a
+    (umin_b, vmin_b, umax_b, vmax_b) = bounds_b
+    return umin_a <= umax_b and umin_b <= umax_a and vmin_a <= vmax_b and vmin_b <= vmax_a
 
 
 if __name__ == "__main__":
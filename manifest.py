@@ -0,0 +1,59 @@
+"""
+Per-folder manifest of the inputs from which each frame was processed.
+
+For every frame, the manifest stores a hash over all inputs that influence its outputs. A frame only needs to be
+processed again if this hash has changed (or if one of its outputs is missing). A shard of a folder (see sharding.py)
+keeps the hashes of its frames in a manifest of its own, which are merged into the folder manifest once all shards are
+done.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+MANIFEST_FILENAME = '_segmentation_manifest.json'
+
+
+def shard_manifest_filename(shard):
+    # type: (tuple) -> str
+    return '_segmentation_manifest.shard-{}-of-{}.json'.format(*shard)
+
+
+def file_hash(path):
+    # type: (str) -> str
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def inputs_hash(*inputs):
+    """
+    :param inputs: JSON-serializable inputs (e.g. file hashes and parameters)
+    """
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_manifest(data_dir, filename=MANIFEST_FILENAME):
+    # type: (str, str) -> dict
+    """
+    :return dictionary mapping frame annotation filenames to their input hashes; empty if there is no manifest yet
+    """
+    manifest_path = os.path.join(data_dir, filename)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)['frames']
+    except (ValueError, KeyError):
+        print 'Warning: ignoring invalid manifest {}'.format(manifest_path)
+        return {}
+
+
+def save_manifest(data_dir, frame_hashes, filename=MANIFEST_FILENAME):
+    # type: (str, dict, str) -> None
+    (fd, tmp_path) = tempfile.mkstemp(dir=data_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'frames': frame_hashes}, f, indent=2, sort_keys=True)
+    os.rename(tmp_path, os.path.join(data_dir, filename))
@@ -0,0 +1,76 @@
+"""
+Binary cache for the YCB meshes.
+
+Parsing the textured google_16k meshes (including their textures) takes much longer than rendering a frame, but the
+depth rendering only needs the geometry. The cache stores the vertex and face arrays of each scaled mesh as .npy files,
+which are memory-mapped when loading. Cache entries are keyed on the mesh path, its modification time and the mesh
+scaling, so that changed meshes are parsed again.
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import trimesh
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ycb_multicam_dataset_tools', 'meshes')
+
+
+def mesh_cache_key(mesh_path, mesh_scaling):
+    # type: (str, float) -> str
+    mesh_path = os.path.abspath(mesh_path)
+    key = '{}:{!r}:{!r}'.format(mesh_path, os.path.getmtime(mesh_path), float(mesh_scaling))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def load_mesh(mesh_path, mesh_scaling, cache_dir=DEFAULT_CACHE_DIR):
+    # type: (str, float, str) -> trimesh.Trimesh
+    """
+    Loads a mesh and scales it, using the cache if cache_dir is given.
+
+    :param mesh_path: path of the mesh file (e.g. textured.obj)
+    :param mesh_scaling: scaling factor that is applied to the mesh
+    :param cache_dir: directory of the mesh cache; if None, the cache is not used
+    :return geometry-only Trimesh on a cache hit, the full Trimesh otherwise
+    """
+    if cache_dir is None:
+        mesh = trimesh.load_mesh(mesh_path)
+        mesh.apply_scale(mesh_scaling)
+        return mesh
+
+    key = mesh_cache_key(mesh_path, mesh_scaling)
+    vertices_path = os.path.join(cache_dir, key + '.vertices.npy')
+    faces_path = os.path.join(cache_dir, key + '.faces.npy')
+    if os.path.exists(vertices_path) and os.path.exists(faces_path):
+        vertices = np.load(vertices_path, mmap_mode='r')
+        faces = np.load(faces_path, mmap_mode='r')
+        return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+
+    mesh = trimesh.load_mesh(mesh_path)
+    mesh.apply_scale(mesh_scaling)
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            # created concurrently by another process
+            if not os.path.isdir(cache_dir):
+                raise
+    # faces are written last, so that a complete vertices file exists whenever the faces file does
+    save_atomically(vertices_path, np.asarray(mesh.vertices, dtype=np.float64))
+    save_atomically(faces_path, np.asarray(mesh.faces, dtype=np.int64))
+    return mesh
+
+
+def save_atomically(path, array):
+    # type: (str, np.array) -> None
+    """
+    Saves an array as .npy file, so that concurrent readers either see the complete file or none at all.
+    """
+    (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,199 @@
+"""
+CPU depth renderer: a vectorized z-buffer triangle rasterizer in plain NumPy.
+
+It has the same interface as make_segmentation_imgs.SceneRenderer, but needs neither OpenGL nor meshrender. The
+rasterization follows the OpenGL pipeline that meshrender sets up: pixel (u, v) samples the image plane at
+(u + 0.5, v + 0.5), the inverse depth is interpolated linearly in image space (like the depth buffer), and fragments
+outside of [z_near, z_far] are discarded. Unlike OpenGL, triangles are not clipped: triangles with a vertex behind the
+camera are dropped.
+"""
+import numpy as np
+from perception import DepthImage
+
+MAX_CANDIDATES_PER_CHUNK = 1 << 22  # number of (triangle, pixel) pairs tested at once; bounds the memory use
+
+
+class NumpyRenderer(object):
+    """
+    Renders the depth images of the objects of a frame on the CPU.
+    """
+
+    def __init__(self, meshes, camera_intrinsics, unit_scaling):
+        """
+        :param meshes: dictionary mapping class names to meshes
+        :param camera_intrinsics: CameraIntrinsics of the camera to render
+        :param unit_scaling: scaling factor for depth units, used for the clipping planes
+        """
+        self._meshes = meshes
+        self._z_near = 0.05 * unit_scaling
+        self._z_far = 6.5535 * unit_scaling
+        self.set_camera(camera_intrinsics)
+
+    def set_camera(self, camera_intrinsics):
+        self._camera_intrinsics = camera_intrinsics
+
+    def close(self):
+        pass
+
+    def add_mesh(self, class_name, mesh):
+        """
+        Makes another class available for rendering.
+        """
+        self._meshes[class_name] = mesh
+
+    def _rasterize_objects(self, object_poses, class_names):
+        """
+        :return list of (pixels, depths) of the fragments of each object, see rasterize()
+        """
+        fragments = []
+        for object_pose, class_name in zip(object_poses, class_names):
+            mesh = self._meshes[class_name]
+            vertices_camera = object_pose[:3, :3].dot(np.asarray(mesh.vertices).T) + object_pose[:3, 3:4]
+            fragments.append(rasterize(vertices_camera, np.asarray(mesh.faces), self._camera_intrinsics,
+                                       self._z_near, self._z_far))
+        return fragments
+
+    def render_depth_images(self, object_poses, class_names, start_viewer=False):
+        """
+        Renders a separate depth image for each object.
+
+        :param start_viewer: not supported, must be False
+        :return list of DepthImages, like render_depth_image()
+        """
+        if start_viewer:
+            raise ValueError('NumpyRenderer has no viewer')
+        height, width = self._camera_intrinsics.height, self._camera_intrinsics.width
+        depth_images = []
+        for (pixels, depths) in self._rasterize_objects(object_poses, class_names):
+            (pixels, depths, _) = z_buffer(pixels, depths)
+            depth_data = np.zeros(height * width, dtype=np.float32)
+            depth_data[pixels] = depths
+            depth_images.append(DepthImage(depth_data.reshape(height, width), frame=self._camera_intrinsics.frame))
+        return depth_images
+
+    def render_scene(self, object_poses, class_names, start_viewer=False):
+        """
+        Renders all objects of a frame at once. On equal depth, the object with the lower index is in front.
+
+        :param start_viewer: not supported, must be False
+        :return (combined_depth_image, object_index_image, silhouette_bounds), like
+                make_segmentation_imgs.overlay_depth_images()
+        """
+        if start_viewer:
+            raise ValueError('NumpyRenderer has no viewer')
+        height, width = self._camera_intrinsics.height, self._camera_intrinsics.width
+        fragments = self._rasterize_objects(object_poses, class_names)
+
+        # the unoccluded silhouette of an object consists of the pixels of all of its fragments
+        total_pixels = []
+        bounding_boxes = []
+        for (pixels, _) in fragments:
+            pixels = np.unique(pixels)
+            total_pixels.append(len(pixels))
+            if len(pixels) == 0:
+                bounding_boxes.append(None)
+                continue
+            (rows, cols) = np.divmod(pixels, width)
+            bounding_boxes.append((int(rows[0]), int(cols.min()), int(rows[-1]), int(cols.max())))
+
+        object_indices = np.concatenate([np.full(len(pixels), object_index, dtype=np.uint8)
+                                         for object_index, (pixels, _) in enumerate(fragments)])
+        (pixels, depths, object_indices) = z_buffer(np.concatenate([pixels for (pixels, _) in fragments]),
+                                                    np.concatenate([depths for (_, depths) in fragments]),
+                                                    object_indices)
+        combined_depth_image = np.zeros(height * width, dtype=np.float32)
+        combined_depth_image[pixels] = depths
+        object_index_image = np.full(height * width, 255, dtype=np.uint8)
+        object_index_image[pixels] = object_indices
+
+        return (combined_depth_image.reshape(height, width, 1), object_index_image.reshape(height, width, 1),
+                (total_pixels, bounding_boxes))
+
+
+def rasterize(vertices_camera, faces, camera_intrinsics, z_near, z_far):
+    # type: (np.array, np.array, CameraIntrinsics, float, float) -> (np.array, np.array)
+    """
+    Rasterizes a triangle mesh.
+
+    :param vertices_camera: 3 x N vertex coordinates in the camera frame
+    :param faces: M x 3 vertex indices of the triangles
+    :return (pixels, depths): flat pixel index (v * width + u) and float32 depth of every fragment; a pixel has several
+            fragments where triangles overlap
+    """
+    width, height = camera_intrinsics.width, camera_intrinsics.height
+    z = vertices_camera[2]
+    projected = camera_intrinsics.K.dot(vertices_camera)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u = projected[0] / z
+        v = projected[1] / z
+
+    # triangles with a vertex behind the camera are not clipped, but dropped
+    faces = faces[np.all(z[faces] > 0, axis=1)]
+    (u0, u1, u2) = u[faces].T
+    (v0, v1, v2) = v[faces].T
+
+    # bounding box of the pixel centers (u + 0.5, v + 0.5) covered by each triangle
+    umin = np.maximum(np.ceil(np.minimum(np.minimum(u0, u1), u2) - 0.5), 0).astype(np.int64)
+    umax = np.minimum(np.floor(np.maximum(np.maximum(u0, u1), u2) - 0.5), width - 1).astype(np.int64)
+    vmin = np.maximum(np.ceil(np.minimum(np.minimum(v0, v1), v2) - 0.5), 0).astype(np.int64)
+    vmax = np.minimum(np.floor(np.maximum(np.maximum(v0, v1), v2) - 0.5), height - 1).astype(np.int64)
+    area = (u1 - u0) * (v2 - v0) - (u2 - u0) * (v1 - v0)
+    visible = (umin <= umax) & (vmin <= vmax) & (area != 0)
+    faces, umin, umax, vmin, vmax, area = faces[visible], umin[visible], umax[visible], vmin[visible], \
+        vmax[visible], area[visible]
+
+    box_widths = umax - umin + 1
+    num_candidates = box_widths * (vmax - vmin + 1)
+    chunk_ends = np.cumsum(num_candidates)
+
+    all_pixels = []
+    all_depths = []
+    chunk_start = 0
+    while chunk_start < len(faces):
+        offset = chunk_ends[chunk_start] - num_candidates[chunk_start]
+        chunk_end = max(np.searchsorted(chunk_ends, offset + MAX_CANDIDATES_PER_CHUNK, side='right'), chunk_start + 1)
+        chunk = slice(chunk_start, chunk_end)
+        chunk_start = chunk_end
+
+        # one candidate per (triangle, pixel in its bounding box)
+        triangle = np.repeat(np.arange(chunk.start, chunk.stop), num_candidates[chunk])
+        local_index = np.arange(chunk_ends[chunk.stop - 1] - offset) - \
+            np.repeat(chunk_ends[chunk] - num_candidates[chunk] - offset, num_candidates[chunk])
+        pixel_u = umin[triangle] + local_index % box_widths[triangle]
+        pixel_v = vmin[triangle] + local_index // box_widths[triangle]
+
+        # barycentric coordinates of the pixel centers
+        (i0, i1, i2) = faces[triangle].T
+        sample_u = pixel_u + 0.5
+        sample_v = pixel_v + 0.5
+        w0 = ((u[i1] - sample_u) * (v[i2] - sample_v) - (u[i2] - sample_u) * (v[i1] - sample_v)) / area[triangle]
+        w1 = ((u[i2] - sample_u) * (v[i0] - sample_v) - (u[i0] - sample_u) * (v[i2] - sample_v)) / area[triangle]
+        w2 = 1.0 - w0 - w1
+        inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+
+        # the inverse depth is linear in image space
+        depths = 1.0 / (w0[inside] / z[i0[inside]] + w1[inside] / z[i1[inside]] + w2[inside] / z[i2[inside]])
+        in_range = (depths >= z_near) & (depths <= z_far)
+        all_pixels.append((pixel_v[inside] * width + pixel_u[inside])[in_range])
+        all_depths.append(depths[in_range].astype(np.float32))
+
+    if not all_pixels:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return np.concatenate(all_pixels), np.concatenate(all_depths)
+
+
+def z_buffer(pixels, depths, object_indices=None):
+    """
+    Keeps the front fragment of every pixel.
+
+    :param object_indices: if given, the object index of each fragment; on equal depth, the lower index is in front
+    :return (pixels, depths, object_indices) of the front fragments, each pixel only once
+    """
+    keys = (depths, pixels) if object_indices is None else (object_indices, depths, pixels)
+    order = np.lexsort(keys)
+    pixels = pixels[order]
+    front = np.ones(len(pixels), dtype=bool)
+    front[1:] = pixels[1:] != pixels[:-1]
+    if object_indices is not None:
+        object_indices = object_indices[order][front]
+    return pixels[front], depths[order][front], object_indices
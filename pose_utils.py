@@ -0,0 +1,180 @@
+"""
+Pose math on stacks of 4x4 homogeneous matrices.
+
+All functions take and return N x 4 x 4 (or N x 3 x 3, N x 4) arrays, so that the poses of all objects in a frame are
+handled in a few NumPy operations instead of one autolab RigidTransform (with frame checks and allocations) per object
+and step. The arithmetic follows autolab_core (RigidTransform and its transformations module) operation by operation,
+so results are identical to the RigidTransform-based code.
+"""
+import numpy as np
+
+_EPS = np.finfo(float).eps * 4.0
+
+# rotation.dot(TO_LEFTHAND) is the rotation part of a pose_transform_permuted (see pose_transform_permuted_from_json)
+TO_LEFTHAND = np.array([[0, 1, 0],
+                        [0, 0, -1],
+                        [1, 0, 0]])
+TO_RIGHTHAND = TO_LEFTHAND.T
+
+
+def rotations_from_quaternions(quaternions_xyzw):
+    # type: (np.array) -> np.array
+    """
+    :param quaternions_xyzw: N x 4 array (need not be normalized)
+    :return N x 3 x 3 rotation matrices
+    """
+    q = np.array(quaternions_xyzw, dtype=np.float64)
+    nq = np.matmul(q[:, np.newaxis, :], q[:, :, np.newaxis])[:, 0, 0]
+    degenerate = nq < _EPS
+    q *= np.sqrt(2.0 / np.where(degenerate, 1.0, nq))[:, np.newaxis]
+    q[degenerate] = 0.0  # identity
+    qq = q[:, :, np.newaxis] * q[:, np.newaxis, :]
+    return np.stack([
+        np.stack([1.0 - qq[:, 1, 1] - qq[:, 2, 2], qq[:, 0, 1] - qq[:, 2, 3], qq[:, 0, 2] + qq[:, 1, 3]], axis=1),
+        np.stack([qq[:, 0, 1] + qq[:, 2, 3], 1.0 - qq[:, 0, 0] - qq[:, 2, 2], qq[:, 1, 2] - qq[:, 0, 3]], axis=1),
+        np.stack([qq[:, 0, 2] - qq[:, 1, 3], qq[:, 1, 2] + qq[:, 0, 3], 1.0 - qq[:, 0, 0] - qq[:, 1, 1]], axis=1),
+    ], axis=1)
+
+
+def quaternions_from_poses(poses):
+    # type: (np.array) -> np.array
+    """
+    :param poses: N x 4 x 4 array
+    :return N x 4 array of quaternions in xyzw layout
+    """
+    poses = np.asarray(poses, dtype=np.float64)
+    num_poses = len(poses)
+    pose_indices = np.arange(num_poses)
+    trace = poses[:, 0, 0] + poses[:, 1, 1] + poses[:, 2, 2] + poses[:, 3, 3]
+    q = np.empty((num_poses, 4))
+
+    # trace > M[3, 3]
+    q[:, 3] = trace
+    q[:, 2] = poses[:, 1, 0] - poses[:, 0, 1]
+    q[:, 1] = poses[:, 0, 2] - poses[:, 2, 0]
+    q[:, 0] = poses[:, 2, 1] - poses[:, 1, 2]
+    t = trace.copy()
+
+    # otherwise, start from the largest diagonal element i
+    other = trace <= poses[:, 3, 3]
+    i = np.where(poses[:, 1, 1] > poses[:, 0, 0], 1, 0)
+    i = np.where(poses[:, 2, 2] > poses[pose_indices, i, i], 2, i)
+    j = (i + 1) % 3
+    k = (i + 2) % 3
+    (p, i, j, k) = (pose_indices[other], i[other], j[other], k[other])
+    t_other = poses[p, i, i] - (poses[p, j, j] + poses[p, k, k]) + poses[p, 3, 3]
+    q[p, i] = t_other
+    q[p, j] = poses[p, i, j] + poses[p, j, i]
+    q[p, k] = poses[p, k, i] + poses[p, i, k]
+    q[p, 3] = poses[p, k, j] - poses[p, j, k]
+    t[p] = t_other
+
+    q *= (0.5 / np.sqrt(t * poses[:, 3, 3]))[:, np.newaxis]
+    return q
+
+
+def poses_from_rotations_translations(rotations, translations):
+    # type: (np.array, np.array) -> np.array
+    """
+    :param rotations: N x 3 x 3 array
+    :param translations: N x 3 array
+    :return N x 4 x 4 array
+    """
+    rotations = np.asarray(rotations, dtype=np.float64)
+    poses = np.zeros((len(rotations), 4, 4))
+    poses[:, :3, :3] = rotations
+    poses[:, :3, 3] = translations
+    poses[:, 3, 3] = 1.0
+    return poses
+
+
+def poses_from_json(scene_objects_json):
+    # type: (list) -> np.array
+    """
+    Parses the object poses from "location" and "quaternion_xyzw".
+
+    :param scene_objects_json: list of JSON fragments of scene objects
+    :return N x 4 x 4 array
+    """
+    return poses_from_rotations_translations(
+        rotations_from_quaternions([scene_object_json['quaternion_xyzw'] for scene_object_json in scene_objects_json]),
+        [scene_object_json['location'] for scene_object_json in scene_objects_json])
+
+
+def poses_to_json(poses):
+    # type: (np.array) -> list
+    """
+    :return list with a JSON dictionary with "location" and "quaternion_xyzw" for each pose
+    """
+    return [{'location': translation.tolist(), 'quaternion_xyzw': quaternion_xyzw.tolist()}
+            for translation, quaternion_xyzw in zip(poses[:, :3, 3], quaternions_from_poses(poses))]
+
+
+def compose(poses_a, poses_b):
+    # type: (np.array, np.array) -> np.array
+    """
+    :return poses_a * poses_b (broadcasting, e.g. N x 4 x 4 times 4 x 4)
+    """
+    return np.matmul(poses_a, poses_b)
+
+
+def invert(poses):
+    # type: (np.array) -> np.array
+    """
+    :param poses: N x 4 x 4 (or 4 x 4) array of rigid transforms
+    """
+    poses = np.asarray(poses, dtype=np.float64)
+    inverse_rotations = np.swapaxes(poses[..., :3, :3], -1, -2)
+    inverse_poses = np.zeros_like(poses)
+    inverse_poses[..., :3, :3] = inverse_rotations
+    inverse_poses[..., :3, 3] = np.matmul(-inverse_rotations, poses[..., :3, 3:4])[..., 0]
+    inverse_poses[..., 3, 3] = 1.0
+    return inverse_poses
+
+
+def pose_transforms_permuted(poses):
+    # type: (np.array) -> np.array
+    """
+    :param poses: N x 4 x 4 array
+    :return N x 4 x 4 array of the pose_transform_permuted of each pose (as stored in the JSON, i.e. transposed)
+    """
+    poses_permuted = np.tile(np.eye(4), (len(poses), 1, 1))
+    poses_permuted[:, :3, 3] = poses[:, :3, 3]
+    poses_permuted[:, :3, :3] = np.matmul(poses[:, :3, :3], TO_LEFTHAND)
+    return np.transpose(poses_permuted, (0, 2, 1))
+
+
+def object_pose_from_json(scene_object_json):
+    # type: (dict) -> (np.array, np.array)
+    """
+    Parses object pose from "location" and "quaternion_xyzw".
+
+    :param scene_object_json: JSON fragment of a single scene object
+    :return (translation, rotation) in meters
+    """
+    [pose] = poses_from_json([scene_object_json])
+    return pose[:3, 3], pose[:3, :3]
+
+
+def pose_transform_permuted_from_json(scene_object_json):
+    # type: (dict) -> (np.array, np.array)
+    """
+    Parses object pose from "pose_transform_permuted". Equivalent to parse_object_pose.
+
+    *Note:*  Like the `fixed_model_transform`, the `pose_transform_permuted` is actually the transpose of the matrix.
+    Moreover, after transposing, the columns are permuted, and there is a sign flip (due to UE4's use of a lefthand
+    coordinate system).  Specifically, if `A` is the matrix given by `pose_transform_permuted`, then actual transform
+    is given by `A^T * P`, where `^T` denotes transpose, `*` denotes matrix multiplication, and the permutation matrix
+    `P` is given by
+
+        [ 0  0  1]
+    P = [ 1  0  0]
+        [ 0 -1  0]
+
+    :param scene_object_json: JSON fragment of a single scene object
+    :return (translation, rotation) in meters
+    """
+    pose_transform = np.transpose(np.array(scene_object_json['pose_transform_permuted']))
+    rotation = pose_transform[:3, :3].dot(TO_RIGHTHAND)
+    translation = pose_transform[:3, 3]
+    return translation, rotation
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+"""
+Processes all folders of a dataset in one Python process: every folder below the dataset dir that contains a
+_camera_settings.json is processed by make_segmentation_imgs.py (incrementally), which also writes the frame annotations
+in the output units next to the rgb / intensity images (see --output-unit-scaling).
+
+The meshes are loaded once and shared by all folders; with --jobs, the folders are distributed over worker processes
+that inherit the loaded meshes. All arguments that are not listed below are passed on to make_segmentation_imgs.py.
+
+To split a dataset over several machines that share the storage, run one process per shard with --shard K/N (either
+whole folders or the frames of every folder are sharded, see --shard-by), and then once with --merge-shards N to check
+that every folder and frame was processed exactly once.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import StringIO
+import sys
+import time
+import traceback
+
+import make_segmentation_imgs
+from sharding import FOLDERS, check_markers, load_markers, marker_selection, parse_shard, remove_markers, \
+    select_glob, select_shard, unfinished_shards, write_marker
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(TOOLS_DIR, 'config')
+
+
+def main():
+    args, tool_argv = parse_args()
+    if args.merge_shards is not None:
+        if not merge_shards(args.dataset_dir, args.merge_shards):
+            sys.exit(1)
+        return
+    folders = select_folders(args.dataset_dir, args.folders)
+    if args.shard is not None:
+        if args.shard_by == 'folder':
+            folders = select_shard(folders, args.shard)
+        else:
+            tool_argv += ['--shard', '{}/{}'.format(*args.shard)]
+
+    # the models of all classes are loaded before the worker processes are forked, so that they share them
+    template_args = make_segmentation_imgs.parse_args(tool_argv + ['--data-dir', args.dataset_dir])
+    mesh_cache_dir = None if template_args.no_mesh_cache else template_args.mesh_cache_dir
+    models = make_segmentation_imgs.load_models(template_args.object_settings, template_args.target_object_settings,
+                                                template_args.mesh_dir, template_args.mesh_scaling, mesh_cache_dir)
+
+    global worker_state
+    worker_state = (args, tool_argv, models)
+    start = time.time()
+    if args.jobs > 1:
+        # the log output of each folder is collected in the worker and printed in order
+        pool = multiprocessing.Pool(args.jobs)
+        results = []
+        for (log_output, success) in pool.imap(process_folder_in_worker, folders):
+            sys.stdout.write(log_output)
+            results.append(success)
+        pool.close()
+        pool.join()
+    else:
+        results = [process_folder(folder, args, tool_argv, models) for folder in folders]
+
+    failed_folders = [folder for (folder, success) in zip(folders, results) if not success]
+    print '\nProcessed {} folders in {:.1f} s.'.format(len(folders), time.time() - start)
+    if args.shard is not None:
+        # failed folders are left out, so that merging the shards reports them
+        write_marker(args.dataset_dir, FOLDERS, args.shard,
+                     [os.path.relpath(folder, args.dataset_dir) for folder in folders if folder not in failed_folders],
+                     {'folders': args.folders, 'shard_by': args.shard_by})
+    if failed_folders:
+        print 'ERROR: processing failed in {} folders:'.format(len(failed_folders))
+        for folder in failed_folders:
+            print '  ' + folder
+        sys.exit(1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run make_segmentation_imgs.py and the unit conversion on all folders of a dataset. All other '
+                    'arguments are passed on to make_segmentation_imgs.py.')
+    parser.add_argument('-d', '--dataset-dir', default=os.getcwd(),
+                        help='root dir of the dataset; every folder below it that contains a _camera_settings.json '
+                             'is processed. default: current directory')
+    parser.add_argument('-m', '--mesh-dir', help='directory containing the mesh files (required)')
+    parser.add_argument('-o', '--object-settings', default=os.path.join(CONFIG_DIR, 'ycb_object_settings.json'),
+                        help='object_settings file that corresponds to the poses in the frame annotations. '
+                             'default: config/ycb_object_settings.json')
+    parser.add_argument('-t', '--target-object-settings',
+                        default=os.path.join(CONFIG_DIR, 'aligned_m_object_settings.json'),
+                        help='object_settings file that the poses are transformed into. '
+                             'default: config/aligned_m_object_settings.json')
+    parser.add_argument('--folder-object-settings', default=os.path.join(CONFIG_DIR, 'aligned_cm_object_settings.json'),
+                        help='object_settings file that is copied to _object_settings.json in every folder (empty: '
+                             'do not copy). default: config/aligned_cm_object_settings.json')
+    parser.add_argument('--output-unit-scaling', type=float, default=100.0,
+                        help='scaling factor of the converted frame annotations (e.g. 100 to convert from m to cm), '
+                             'see make_segmentation_imgs.py. default: 100')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of folders processed in parallel')
+    parser.add_argument('--folders', metavar='PATTERN',
+                        help='only process the folders whose path relative to the dataset dir matches this glob '
+                             'pattern')
+    parser.add_argument('--shard', type=parse_shard, metavar='K/N',
+                        help='only process shard K of N (1 <= K <= N) of the folders or frames (see --shard-by) and '
+                             'write a completion marker when done (see sharding.py)')
+    parser.add_argument('--shard-by', choices=['folder', 'frame'], default='folder',
+                        help='folder: every N-th folder; frame: every N-th frame of every folder. default: folder')
+    parser.add_argument('--merge-shards', type=int, metavar='N',
+                        help='Do not process anything; check that the N shards are done and covered every folder and '
+                             'frame exactly once, and merge the manifests of frame shards.')
+    (args, tool_argv) = parser.parse_known_args()
+    if args.merge_shards is not None:
+        return args, tool_argv
+    if not args.mesh_dir:
+        parser.error('argument -m/--mesh-dir is required')
+    if args.jobs > 1 and any(arg.startswith('--workers') for arg in tool_argv):
+        parser.error('--workers cannot be combined with --jobs')
+
+    tool_argv += ['--mesh-dir', args.mesh_dir,
+                  '--object-settings', args.object_settings,
+                  '--target-object-settings', args.target_object_settings,
+                  '--output-unit-scaling', repr(args.output_unit_scaling),
+                  '--incremental']
+    return args, tool_argv
+
+
+def select_folders(dataset_dir, pattern=None):
+    # type: (str, str) -> list
+    """
+    :param pattern: if given, only the folders whose path relative to dataset_dir matches this glob pattern
+    :return sorted list of the folders to process, see find_folders()
+    """
+    folders = find_folders(dataset_dir)
+    if pattern is not None:
+        folders = select_glob(folders, pattern, lambda folder: os.path.relpath(folder, dataset_dir))
+    return folders
+
+
+def find_folders(dataset_dir):
+    # type: (str) -> list
+    """
+    :return sorted list of all folders below dataset_dir (including itself) that contain a _camera_settings.json
+    """
+    folders = []
+    for (dir_path, dir_names, file_names) in os.walk(dataset_dir):
+        if '_camera_settings.json' in file_names:
+            folders.append(dir_path)
+    return sorted(folders)
+
+
+# state of a worker process, inherited from the main process: (args, tool_argv, models)
+worker_state = None
+
+
+def process_folder_in_worker(folder):
+    """
+    :return (log_output, success) of the folder
+    """
+    (args, tool_argv, models) = worker_state
+    log_output = StringIO.StringIO()
+    stdout = sys.stdout
+    sys.stdout = log_output
+    try:
+        success = process_folder(folder, args, tool_argv, models)
+    finally:
+        sys.stdout = stdout
+    return log_output.getvalue(), success
+
+
+def process_folder(folder, args, tool_argv, models):
+    """
+    Processes the frames of a folder.
+
+    :param models: preloaded models of all classes, see make_segmentation_imgs.load_models()
+    :return whether the folder was processed successfully
+    """
+    print '\n\n\n\n\n\n\n=================== {}'.format(folder)
+    try:
+        if args.folder_object_settings:
+            shutil.copyfile(args.folder_object_settings, os.path.join(folder, '_object_settings.json'))
+        make_segmentation_imgs.main(tool_argv + ['--data-dir', folder], models)
+        return True
+    except SystemExit as e:
+        # sys.exit() and parser.error() in make_segmentation_imgs.py, which have printed the reason already
+        print 'ERROR: make_segmentation_imgs.py exited with status {}'.format(e.code)
+        return False
+    except Exception:
+        traceback.print_exc(file=sys.stdout)
+        return False
+
+
+def merge_shards(dataset_dir, num_shards):
+    # type: (str, int) -> bool
+    """
+    Checks that the shards of the dataset are done and that every selected folder (or, for frame shards, every
+    selected frame of every folder) was processed exactly once. If so, merges the shards of the folders and removes the
+    completion markers.
+
+    :return whether the check succeeded
+    """
+    markers = load_markers(dataset_dir, FOLDERS, num_shards)
+    selection = marker_selection(markers) or {}
+    folders = select_folders(dataset_dir, selection.get('folders'))
+    if selection.get('shard_by') == 'frame':
+        # every shard processes a part of every folder
+        problems = unfinished_shards(markers, num_shards)
+        for folder in folders:
+            problems += ['{}: {}'.format(folder, problem)
+                         for problem in make_segmentation_imgs.check_shards(folder, num_shards)]
+    else:
+        problems = check_markers(markers, [os.path.relpath(folder, dataset_dir) for folder in folders], num_shards)
+    for problem in problems:
+        print 'ERROR: ' + problem
+    if problems:
+        return False
+
+    if selection.get('shard_by') == 'frame':
+        for folder in folders:
+            make_segmentation_imgs.merge_shards(folder, num_shards)
+    remove_markers(dataset_dir, FOLDERS, num_shards)
+    print 'Merged {} shards of {} folders.'.format(num_shards, len(folders))
+    return True
+
+
+if __name__ == "__main__":
+    main()
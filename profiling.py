@@ -0,0 +1,195 @@
+"""
+Per-stage timing of the frames processed by make_segmentation_imgs.py (--profile).
+
+Code marks its stages with `with PROFILER.stage('render'):`. The time of a stage is attributed to the frame that the
+current thread works on (see Profiler.frame()), so that stages in the reader and writer threads are counted for the
+right frame; stages outside of any frame (e.g. loading the meshes) are counted as setup. Stages can be nested, a stage
+is only charged the time not spent in its nested stages. While the profiler is disabled, stage() and frame() do
+nothing.
+
+Every finished frame is appended to a JSON-lines trace, together with the peak resident memory of the process since the
+previous frame finished (on Linux, the peak is reset after every frame, see clear_peak_rss()); summary() aggregates the
+frames into percentiles per stage, the throughput and the peak memory.
+"""
+import collections
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+
+PROFILE_FILENAME = '_profile.jsonl'
+SETUP = None  # frame key of the stages outside of any frame
+
+
+class Profiler(object):
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._frames = {}  # frame -> OrderedDict mapping stage names to seconds, for frames in progress
+        self._records = []
+        self._trace_file = None
+        self._trace_path = None
+        self._start_time = None
+
+    def start(self, trace_path=None):
+        """
+        Enables the profiler.
+
+        :param trace_path: if given, every finished frame is written to this JSON-lines file
+        """
+        self.enabled = True
+        self._start_time = time.time()
+        clear_peak_rss()
+        if trace_path is not None:
+            self._trace_path = trace_path
+            self._trace_file = open(trace_path, 'w')
+
+    def stop(self):
+        """
+        Records the setup stages, closes the trace and disables the profiler.
+
+        :return summary of the run, see summary()
+        """
+        if not self.enabled:
+            return None
+        elapsed = time.time() - self._start_time
+        self.add_record(self.finish_frame(SETUP))
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
+        self.enabled = False
+        return self.summary(elapsed)
+
+    @contextlib.contextmanager
+    def frame(self, frame):
+        """
+        Attributes the stages of the current thread to a frame.
+
+        :param frame: key of the frame, e.g. the path of its annotation
+        """
+        if not self.enabled:
+            yield
+            return
+        previous_frame = getattr(self._local, 'frame', SETUP)
+        self._local.frame = frame
+        try:
+            yield
+        finally:
+            self._local.frame = previous_frame
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)  # time spent in nested stages
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            frame = getattr(self._local, 'frame', SETUP)
+            with self._lock:
+                stages = self._frames.setdefault(frame, collections.OrderedDict())
+                stages[name] = stages.get(name, 0.0) + elapsed - nested
+
+    def finish_frame(self, frame):
+        """
+        :return the record of a frame: a JSON dictionary with the seconds spent in each stage and the peak resident
+                memory since the previous frame finished, which starts the peak of the next frame
+        """
+        with self._lock:
+            stages = self._frames.pop(frame, collections.OrderedDict())
+            frame_peak_rss_mb = peak_rss_mb()
+            clear_peak_rss()
+        return {'frame': None if frame is SETUP else os.path.basename(frame), 'stages': stages,
+                'total': sum(stages.values()), 'peak_rss_mb': frame_peak_rss_mb}
+
+    def add_record(self, record):
+        """
+        Adds the record of a finished frame (possibly from a worker process) to the summary and the trace.
+        """
+        self._records.append(record)
+        if self._trace_file is not None:
+            self._trace_file.write(json.dumps(record) + '\n')
+            self._trace_file.flush()
+
+    def summary(self, elapsed):
+        # type: (float) -> str
+        """
+        :param elapsed: wall time of the run in seconds
+        :return table of the time per frame in each stage (mean, percentiles and max), plus the throughput
+        """
+        frame_records = [record for record in self._records if record['frame'] is not None]
+        setup_seconds = sum(record['total'] for record in self._records if record['frame'] is None)
+        stage_names = []
+        for record in frame_records:
+            stage_names.extend(name for name in record['stages'] if name not in stage_names)
+
+        # the records cover the whole run, one interval each; with worker processes, this is the peak of the largest
+        # process
+        max_rss_mb = max([record.get('peak_rss_mb', 0.0) for record in self._records] + [peak_rss_mb()])
+
+        lines = ['Profile: {} frames in {:.2f} s ({:.2f} frames/sec), setup {:.2f} s, peak RSS {:.1f} MB'.format(
+            len(frame_records), elapsed, len(frame_records) / elapsed if elapsed > 0 else 0.0, setup_seconds,
+            max_rss_mb)]
+        if self._trace_path is not None:
+            lines.append('Trace: {}'.format(self._trace_path))
+        if not frame_records:
+            return '\n'.join(lines)
+        lines.append('{:16} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+            'stage', 'total [s]', 'mean [ms]', 'p50 [ms]', 'p90 [ms]', 'p99 [ms]', 'max [ms]'))
+        for name in stage_names + ['total']:
+            if name == 'total':
+                seconds = np.array([record['total'] for record in frame_records])
+            else:
+                seconds = np.array([record['stages'].get(name, 0.0) for record in frame_records])
+            (p50, p90, p99) = np.percentile(seconds, [50, 90, 99])
+            lines.append('{:16} {:10.2f} {:10.2f} {:10.2f} {:10.2f} {:10.2f} {:10.2f}'.format(
+                name, np.sum(seconds), 1000.0 * np.mean(seconds), 1000.0 * p50, 1000.0 * p90, 1000.0 * p99,
+                1000.0 * np.max(seconds)))
+        return '\n'.join(lines)
+
+
+def clear_peak_rss():
+    # type: () -> None
+    """
+    Resets the peak resident set size of the current process to its current resident set size (Linux only; elsewhere,
+    the peak stays the one since the start of the process).
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except IOError:
+        pass
+
+
+def peak_rss_mb():
+    # type: () -> float
+    """
+    :return peak resident set size of the current process in MB since the last clear_peak_rss()
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0  # in kB
+    except IOError:
+        pass
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else max_rss / 1024.0
+
+
+PROFILER = Profiler()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""
+Long-running server for make_segmentation_imgs.py that keeps the models and the renderer warm between jobs, so that
+re-running a folder (e.g. after a correction with fix_rotation.py) does not wait for the imports, the meshes and the
+OpenGL setup again.
+
+    segmentation_daemon.py serve --socket PATH -m <mesh dir> [make_segmentation_imgs.py options]
+    segmentation_daemon.py submit --socket PATH -d <data dir> [make_segmentation_imgs.py options]
+    segmentation_daemon.py stop --socket PATH
+
+A job is one make_segmentation_imgs.py run on a folder (or on some of its frames, see --frames and --frame-glob); its
+options are appended to those of the server, with all paths made absolute. The server runs the jobs one after another
+in its main thread, which owns the OpenGL context. Models are loaded (and renderers set up) once per set of object
+settings, mesh dir and renderer options; restart the server after changing the meshes. Only the server imports
+make_segmentation_imgs.py, so that submitting a job is fast.
+
+Client and server exchange JSON lines over a Unix socket. The client sends {"argv": [...]} or {"stop": true}; the
+server streams back {"log": text} for the log output of the job, {"frame": name, "seconds": s, "profile": records} for
+every finished frame (the profile records with --profile only) and finally {"status": exit status, "seconds": s}.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from manifest import file_hash
+
+# make_segmentation_imgs.py options whose values are paths; they are made absolute, since the server does not run in
+# the working directory of the client
+PATH_OPTIONS = ['-d', '--data-dir', '-m', '--mesh-dir', '-o', '--object-settings', '-t', '--target-object-settings',
+                '--mesh-cache-dir', '--depth-cache', '--profile']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Keep the models and renderer of make_segmentation_imgs.py warm and process jobs from a Unix '
+                    'socket. All other arguments are passed on to make_segmentation_imgs.py.')
+    parser.add_argument('command', choices=['serve', 'submit', 'stop'],
+                        help='serve: run the server; submit: run a job on the server and print its output; stop: stop '
+                             'the server')
+    parser.add_argument('--socket', required=True, help='path of the Unix socket')
+    (args, tool_argv) = parser.parse_known_args()
+    tool_argv = absolute_paths(tool_argv)
+    if args.command == 'serve':
+        serve(args.socket, tool_argv)
+    elif args.command == 'submit':
+        if not any(arg in ['-d', '--data-dir'] or arg.startswith('--data-dir=') for arg in tool_argv):
+            tool_argv += ['--data-dir', os.getcwd()]
+        sys.exit(submit(args.socket, tool_argv))
+    else:
+        sys.exit(submit(args.socket, None))
+
+
+def absolute_paths(argv):
+    # type: (list) -> list
+    """
+    :return argv with the values of PATH_OPTIONS made absolute
+    """
+    argv = list(argv)
+    for (i, arg) in enumerate(argv):
+        (option, equals, value) = arg.partition('=')
+        if option in PATH_OPTIONS and equals and value:
+            argv[i] = option + '=' + os.path.abspath(value)
+        elif arg in PATH_OPTIONS and i + 1 < len(argv) and argv[i + 1] and not argv[i + 1].startswith('-'):
+            argv[i + 1] = os.path.abspath(argv[i + 1])
+    return argv
+
+
+class Channel(object):
+    """
+    Sends JSON lines to a client; also serves as sys.stdout of a job. After the client has disconnected, all messages
+    are dropped, so that the job still finishes.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._lock = threading.Lock()  # the writer threads of a job print, too
+        self.connected = True
+
+    def send(self, message):
+        with self._lock:
+            if not self.connected:
+                return
+            try:
+                self._connection.sendall(json.dumps(message) + '\n')
+            except socket.error:
+                self.connected = False
+
+    def write(self, text):
+        self.send({'log': text})
+
+    def flush(self):
+        pass
+
+
+def serve(socket_path, base_argv):
+    """
+    Processes jobs until a stop request arrives.
+
+    :param base_argv: make_segmentation_imgs.py options of all jobs
+    """
+    if os.path.exists(socket_path):
+        if is_serving(socket_path):
+            sys.exit('ERROR: a server is already listening on {}'.format(socket_path))
+        os.remove(socket_path)  # left over from a server that was killed
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(8)
+    print 'Listening on {}'.format(socket_path)
+    warm_state = {}
+    try:
+        while True:
+            (connection, _) = server.accept()
+            try:
+                line = connection.makefile('r').readline().strip()
+                if not line:
+                    continue  # see is_serving()
+                request = json.loads(line)
+                channel = Channel(connection)
+                if request.get('stop'):
+                    channel.send({'status': 0, 'seconds': 0.0})
+                    break
+                print 'Job: {}'.format(' '.join(request['argv']))
+                status = run_job(channel, base_argv + request['argv'], warm_state)
+                print 'Job finished with status {}'.format(status)
+            finally:
+                connection.close()
+    finally:
+        server.close()
+        os.remove(socket_path)
+        for (_, renderer) in warm_state.values():
+            renderer.close()
+
+
+def is_serving(socket_path):
+    # type: (str) -> bool
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall('\n')  # empty request
+        return True
+    except socket.error:
+        return False
+    finally:
+        client.close()
+
+
+def run_job(channel, argv, warm_state):
+    """
+    Runs make_segmentation_imgs.py with the warm models and renderer and streams its output to the client.
+
+    :param warm_state: dictionary mapping warm_state_key() to (models, renderer); new entries are added
+    :return exit status of the job
+    """
+    import make_segmentation_imgs
+    start = time.time()
+
+    def frame_done(json_file, profile_records):
+        channel.send({'frame': os.path.basename(json_file), 'seconds': time.time() - start,
+                      'profile': profile_records})
+
+    (stdout, stderr) = (sys.stdout, sys.stderr)
+    sys.stdout = sys.stderr = channel
+    try:
+        args = make_segmentation_imgs.parse_args(argv)
+        models = renderer = None
+        if args.merge_shards is None:
+            key = warm_state_key(args)
+            if key not in warm_state:
+                warm_state[key] = load_warm_state(args)
+            (models, renderer) = warm_state[key]
+        make_segmentation_imgs.main(argv, models, renderer, frame_done)
+        status = 0
+    except SystemExit as e:
+        # argument errors and failed shard merges
+        status = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except Exception:
+        traceback.print_exc(file=channel)
+        status = 1
+    finally:
+        (sys.stdout, sys.stderr) = (stdout, stderr)
+    channel.send({'status': status, 'seconds': time.time() - start})
+    return status
+
+
+def warm_state_key(args):
+    # type: (argparse.Namespace) -> tuple
+    """
+    :return the options that the models and the renderer depend on
+    """
+    return (file_hash(args.object_settings), file_hash(args.target_object_settings), os.path.abspath(args.mesh_dir),
+            args.mesh_scaling, args.renderer, args.unit_scaling)
+
+
+def load_warm_state(args):
+    """
+    Loads the models of all classes and sets up a renderer with all meshes.
+
+    :return (models, renderer)
+    """
+    import make_segmentation_imgs
+    mesh_cache_dir = None if args.no_mesh_cache else args.mesh_cache_dir
+    models = make_segmentation_imgs.load_models(args.object_settings, args.target_object_settings, args.mesh_dir,
+                                                args.mesh_scaling, mesh_cache_dir)
+    (_, _, renderer) = make_segmentation_imgs.load_folder(args, models=models)
+    return models, renderer
+
+
+def submit(socket_path, argv):
+    """
+    Sends a job (or a stop request) to the server and prints the output of the job.
+
+    :param argv: make_segmentation_imgs.py options of the job; None to stop the server
+    :return exit status of the job
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except socket.error as e:
+        print 'ERROR: cannot connect to {}: {}'.format(socket_path, e)
+        return 1
+    try:
+        client.sendall(json.dumps({'stop': True} if argv is None else {'argv': argv}) + '\n')
+        for line in client.makefile('r'):
+            message = json.loads(line)
+            if 'log' in message:
+                sys.stdout.write(message['log'])
+            elif 'frame' in message:
+                print '[{:8.2f} s] {} done'.format(message['seconds'], message['frame'])
+            elif 'status' in message:
+                print '[{:8.2f} s] job finished with status {}'.format(message['seconds'], message['status'])
+                return message['status']
+        print 'ERROR: the server closed the connection'
+        return 1
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
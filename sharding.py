@@ -0,0 +1,151 @@
+"""
+Deterministic sharding of the frames or folders of a dataset over several processes or machines (--shard K/N).
+
+Shard K of N (1 <= K <= N) takes every N-th item of the sorted list of selected items, starting with the K-th one, so
+that every node that sees the same files gets the same assignment. When a shard is done, it writes a completion marker
+that lists its items and the selection they were taken from; check_markers() verifies that the finished shards
+together covered every item exactly once.
+"""
+import argparse
+import collections
+import fnmatch
+import json
+import os
+import re
+import tempfile
+
+FRAMES = 'frames'  # markers of make_segmentation_imgs.py, in the data dir
+FOLDERS = 'folders'  # markers of process_dataset.py, in the dataset dir
+
+
+def parse_shard(text):
+    # type: (str) -> tuple
+    """
+    argparse type of --shard.
+
+    :return (K, N)
+    """
+    match = re.match(r'^(\d+)/(\d+)$', text)
+    if match is None or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError('expected K/N with 1 <= K <= N, got {}'.format(text))
+    return int(match.group(1)), int(match.group(2))
+
+
+def parse_range(text):
+    # type: (str) -> tuple
+    """
+    argparse type of a range of frame numbers START:END (END exclusive; either one may be omitted).
+
+    :return (start, end); None for an omitted bound
+    """
+    match = re.match(r'^(\d*):(\d*)$', text)
+    if match is None:
+        raise argparse.ArgumentTypeError('expected START:END, got {}'.format(text))
+    return tuple(int(bound) if bound else None for bound in match.groups())
+
+
+def in_range(number, number_range):
+    # type: (int, tuple) -> bool
+    (start, end) = number_range
+    return (start is None or number >= start) and (end is None or number < end)
+
+
+def select_glob(items, pattern, key=os.path.basename):
+    # type: (list, str, callable) -> list
+    """
+    :return the items whose key matches the glob pattern
+    """
+    return [item for item in items if fnmatch.fnmatch(key(item), pattern)]
+
+
+def select_shard(items, shard):
+    # type: (list, tuple) -> list
+    """
+    :param items: sorted list of all items
+    :param shard: (K, N)
+    :return the items of shard K of N
+    """
+    (k, n) = shard
+    return items[k - 1::n]
+
+
+def marker_path(directory, kind, shard):
+    # type: (str, str, tuple) -> str
+    return os.path.join(directory, '_{}_shard-{}-of-{}.done.json'.format(kind, *shard))
+
+
+def write_marker(directory, kind, shard, items, selection):
+    # type: (str, str, tuple, list, dict) -> None
+    """
+    Marks a shard as done.
+
+    :param items: items that the shard processed
+    :param selection: JSON-serializable options from which the list of all items was selected (e.g. a glob pattern)
+    """
+    (fd, tmp_path) = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'shard': list(shard), 'items': sorted(items), 'selection': selection}, f, indent=2, sort_keys=True)
+    os.rename(tmp_path, marker_path(directory, kind, shard))
+
+
+def load_markers(directory, kind, num_shards):
+    # type: (str, str, int) -> dict
+    """
+    :return dictionary mapping K to the marker of each finished shard K of num_shards
+    """
+    markers = {}
+    for k in range(1, num_shards + 1):
+        path = marker_path(directory, kind, (k, num_shards))
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                markers[k] = json.load(f)
+    return markers
+
+
+def marker_selection(markers):
+    # type: (dict) -> dict
+    """
+    :return the selection that all shards were run with; None if there are no markers or the selections differ
+    """
+    selections = [marker['selection'] for marker in markers.values()]
+    if not selections or any(selection != selections[0] for selection in selections):
+        return None
+    return selections[0]
+
+
+def unfinished_shards(markers, num_shards):
+    # type: (dict, int) -> list
+    """
+    :return list of problems, one for each shard that has no marker
+    """
+    return ['shard {}/{} is not done'.format(k, num_shards) for k in range(1, num_shards + 1) if k not in markers]
+
+
+def check_markers(markers, items, num_shards):
+    # type: (dict, list, int) -> list
+    """
+    :param markers: see load_markers()
+    :param items: all items that the shards should have covered
+    :return list of problems; empty if all shards are done and every item was covered by exactly one of them
+    """
+    problems = unfinished_shards(markers, num_shards)
+    if markers and marker_selection(markers) is None:
+        problems.append('the shards were run with different selections')
+    counts = collections.Counter(item for marker in markers.values() for item in marker['items'])
+    items = set(items)
+    for item in sorted(items | set(counts)):
+        if counts[item] == 0:
+            problems.append('{} was not processed'.format(item))
+        elif counts[item] > 1:
+            problems.append('{} was processed by {} shards'.format(item, counts[item]))
+        elif item not in items:
+            problems.append('{} was processed, but is not selected (any more)'.format(item))
+    return problems
+
+
+def remove_markers(directory, kind, num_shards):
+    # type: (str, str, int) -> None
+    for k in range(1, num_shards + 1):
+        path = marker_path(directory, kind, (k, num_shards))
+        if os.path.exists(path):
+            os.remove(path)
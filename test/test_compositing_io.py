@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from compositing_io import Compositing, compositing_filename, load_compositing, save_compositing
+
+
+class TestCompositingIo(unittest.TestCase):
+
+    def test_save_load(self):
+        object_index_image = np.full((24, 32, 1), 255, dtype=np.uint8)
+        object_index_image[2:10, 3:20] = 0
+        object_index_image[8:20, 15:30] = 1
+        combined_depth_image = np.where(object_index_image != 255,
+                                        np.random.uniform(0.5, 2.0, (24, 32, 1)), 0.0).astype(np.float32)
+        # the third object is outside of the image
+        compositing = Compositing(combined_depth_image, object_index_image, [136, 180, 0],
+                                  [(2, 3, 9, 19), (8, 15, 19, 29), None],
+                                  [(2, 1, 21, 11), (14, 7, 31, 21), (0, 0, -1, -1)])
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            prefix = os.path.join(tmp_dir, '000000.')
+            self.assertEqual(save_compositing(prefix, compositing), compositing_filename(prefix))
+            loaded = load_compositing(prefix)
+        finally:
+            shutil.rmtree(tmp_dir)
+        np.testing.assert_array_equal(loaded.combined_depth_image, combined_depth_image)
+        self.assertEqual(loaded.combined_depth_image.dtype, np.float32)
+        np.testing.assert_array_equal(loaded.object_index_image, object_index_image)
+        self.assertEqual(loaded.total_pixels, compositing.total_pixels)
+        self.assertEqual(loaded.bounding_boxes, compositing.bounding_boxes)
+        self.assertEqual(loaded.rois, compositing.rois)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from convert_json_units import convert_frame, get_converted_filename
+
+
+class TestConvertJsonUnits(unittest.TestCase):
+
+    def test_convert_frame(self):
+        frame_json = {'camera_data': {'location_worldframe': [1.0, 2.0, 3.0],
+                                      'quaternion_xyzw_worldframe': [0.0, 0.0, 0.0, 1.0]},
+                      'objects': [{'class': '003_cracker_box', 'visibility': 0.5, 'ground_truth_mismatch': 0.1,
+                                   'location': [0.1, 0.2, 0.3], 'quaternion_xyzw': [0.0, 0.0, 0.0, 1.0],
+                                   'pose_transform_permuted': [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0],
+                                                               [0.0, 0.0, 1.0, 0.0], [0.1, 0.2, 0.3, 1.0]],
+                                   'cuboid_centroid': [0.1, 0.2, 0.3], 'projected_cuboid_centroid': [320.0, 240.0],
+                                   'bounding_box': {'top_left': [1, 2], 'bottom_right': [3, 4]},
+                                   'cuboid': 8 * [[0.1, 0.2, 0.3]], 'projected_cuboid': 8 * [[320.0, 240.0]]}]}
+        converted_json = convert_frame(frame_json, 100.0)
+        self.assertEqual(converted_json['camera_data']['location_worldframe'], [100.0, 200.0, 300.0])
+        self.assertEqual(converted_json['objects'][0]['pose_transform_permuted'][3], [10.0, 20.0, 30.0, 1.0])
+        self.assertEqual(converted_json['objects'][0]['projected_cuboid'], 8 * [[320.0, 240.0]])
+        self.assertNotIn('ground_truth_mismatch', converted_json['objects'][0])
+        # the input is not modified
+        self.assertEqual(frame_json['objects'][0]['location'], [0.1, 0.2, 0.3])
+
+    def test_get_converted_filename(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            prefix = os.path.join(tmp_dir, '000000.')
+            self.assertIsNone(get_converted_filename(prefix))
+            open(prefix + 'intensity.jpg', 'w').close()
+            self.assertEqual(get_converted_filename(prefix), prefix + 'intensity.json')
+            open(prefix + 'rgb.jpg', 'w').close()
+            self.assertEqual(get_converted_filename(prefix), prefix + 'rgb.json')
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
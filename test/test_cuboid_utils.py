@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+from autolab_core import RigidTransform
+from perception import CameraIntrinsics
+
+from cuboid_utils import get_cuboid, get_cuboids, cuboids_to_json
+
+
+class TestCuboidUtils(unittest.TestCase):
+
+    def test_get_cuboids(self):
+        camera_intrinsics = CameraIntrinsics(frame='camera', fx=768.16, fy=768.16, cx=480, cy=270, skew=0,
+                                             height=540, width=960)
+        random_state = np.random.RandomState(0)
+        object_poses = []
+        for _ in range(5):
+            quaternion_wxyz = random_state.randn(4)
+            object_poses.append(RigidTransform(
+                rotation=RigidTransform.rotation_from_quaternion(quaternion_wxyz / np.linalg.norm(quaternion_wxyz)),
+                translation=random_state.uniform([-0.2, -0.2, 0.5], [0.2, 0.2, 1.5]),
+                from_frame='target_model', to_frame='camera'))
+        cuboid_dimensions = random_state.uniform(0.02, 0.2, (5, 3))
+
+        cuboids = get_cuboids(np.array([object_pose.matrix for object_pose in object_poses]), cuboid_dimensions,
+                              camera_intrinsics)
+        self.assertEqual([array.shape for array in cuboids], [(5, 8, 3), (5, 3), (5, 8, 2), (5, 2)])
+
+        # same as one object at a time
+        for object_pose, dimensions, cuboid_json in zip(object_poses, cuboid_dimensions, cuboids_to_json(*cuboids)):
+            self.assertEqual(cuboid_json, get_cuboid(object_pose.matrix, dimensions, camera_intrinsics))
+
+        # the corners span the cuboid dimensions in the model frame (which cannot be projected)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            (cuboids_model, _, _, _) = get_cuboids(np.tile(np.eye(4), (5, 1, 1)), cuboid_dimensions,
+                                                   camera_intrinsics)
+        np.testing.assert_array_equal(np.ptp(cuboids_model, axis=1), cuboid_dimensions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from perception import CameraIntrinsics, DepthImage
+
+from depth_cache import DepthCache
+
+
+class TestDepthCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.depth_cache = DepthCache(self.tmp_dir, {'a': 'mesh_key_a', 'b': 'mesh_key_b'}, 'numpy', 1.0)
+        self.camera_intrinsics = CameraIntrinsics(frame='camera', fx=500.0, fy=500.0, cx=16.0, cy=12.0, skew=0.0,
+                                                  height=24, width=32)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_key(self):
+        pose = np.eye(4)
+        pose[:3, 3] = [0.1, -0.2, 1.0]
+        key = self.depth_cache.key('a', pose, self.camera_intrinsics)
+        self.assertNotEqual(self.depth_cache.key('b', pose, self.camera_intrinsics), key)
+
+        # differences below the pose quantization (including -0.0) do not matter
+        rounded_pose = pose + 1e-9
+        rounded_pose[0, 1] = -0.0
+        self.assertEqual(self.depth_cache.key('a', rounded_pose, self.camera_intrinsics), key)
+        moved_pose = pose.copy()
+        moved_pose[2, 3] += 1e-4
+        self.assertNotEqual(self.depth_cache.key('a', moved_pose, self.camera_intrinsics), key)
+
+        camera_intrinsics = CameraIntrinsics(frame='camera', fx=501.0, fy=500.0, cx=16.0, cy=12.0, skew=0.0,
+                                             height=24, width=32)
+        self.assertNotEqual(self.depth_cache.key('a', pose, camera_intrinsics), key)
+        other_cache = DepthCache(self.tmp_dir, {'a': 'mesh_key_a'}, 'numpy', 100.0)
+        self.assertNotEqual(other_cache.key('a', pose, self.camera_intrinsics), key)
+
+    def test_save_load(self):
+        self.assertIsNone(self.depth_cache.load('0' * 40, self.camera_intrinsics))
+
+        depth_data = np.zeros((24, 32), dtype=np.float32)
+        depth_data[5:9, 10:20] = np.random.uniform(0.5, 1.5, (4, 10))
+        depth_data[6, 12] = 0.0
+        self.depth_cache.save('1' * 40, DepthImage(depth_data, frame='camera'))
+        depth_image = self.depth_cache.load('1' * 40, self.camera_intrinsics)
+        self.assertEqual(depth_image.frame, 'camera')
+        np.testing.assert_array_equal(depth_image.raw_data, depth_data[:, :, np.newaxis])
+
+        # an object outside of the image
+        self.depth_cache.save('2' * 40, DepthImage(np.zeros((24, 32), dtype=np.float32), frame='camera'))
+        np.testing.assert_array_equal(self.depth_cache.load('2' * 40, self.camera_intrinsics).raw_data,
+                                      np.zeros((24, 32, 1), dtype=np.float32))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import threading
+import time
+import unittest
+
+from frame_pipeline import BackgroundWriter, prefetch
+
+
+class TestFramePipeline(unittest.TestCase):
+
+    def test_prefetch(self):
+        for depth in [0, 1, 3]:
+            self.assertEqual(list(prefetch(lambda item: item * 2, range(10), depth)),
+                             [(item, item * 2) for item in range(10)])
+
+    def test_prefetch_is_bounded(self):
+        loaded = []
+
+        def load(item):
+            loaded.append(item)
+            return item
+
+        frames = prefetch(load, range(10), 2)
+        next(frames)
+        time.sleep(0.2)
+        # the consumed item, two items in the queue and one that waits to be put into the queue
+        self.assertLessEqual(len(loaded), 4)
+        frames.close()
+
+    def test_prefetch_reraises(self):
+        def load(item):
+            if item == 2:
+                raise ValueError('cannot load {}'.format(item))
+            return item
+
+        frames = prefetch(load, range(5), 2)
+        self.assertEqual([next(frames), next(frames)], [(0, 0), (1, 1)])
+        self.assertRaises(ValueError, next, frames)
+
+    def test_background_writer(self):
+        for num_threads in [0, 3]:
+            written = []
+            done = []
+            lock = threading.Lock()
+
+            def write(item):
+                time.sleep(0.01 * (item % 3))
+                with lock:
+                    written.append(item)
+
+            writer = BackgroundWriter(num_threads, 4)
+            for item in range(10):
+                writer.submit(write, (item,), lambda item=item: done.append(item))
+            writer.close()
+            self.assertEqual(sorted(written), range(10))
+            # callbacks run in submission order, even though the writes finish out of order
+            self.assertEqual(done, range(10))
+
+    def test_background_writer_reraises(self):
+        def write(item):
+            if item == 1:
+                raise IOError('disk full')
+
+        writer = BackgroundWriter(2, 2)
+        with self.assertRaises(IOError):
+            try:
+                for item in range(5):
+                    writer.submit(write, (item,))
+            finally:
+                writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,24 @@
+import argparse
+import os
+import shutil
+import tempfile
 import unittest
 
+import imageio
 import numpy as np
 import json
 
+import trimesh
 from autolab_core import RigidTransform
-from perception import CameraIntrinsics
+from perception import CameraIntrinsics, DepthImage
 
-from make_segmentation_imgs import get_cuboid, get_cuboid2d_visibility
+from cuboid_utils import get_cuboid, get_cuboid2d_visibility
+from make_segmentation_imgs import overlay_depth_images, bounds_overlap, \
+    get_projected_bounds, get_vertmap, get_segmentation_image, get_mask_bounds, select_frames, \
+    frame_is_complete, frame_done, check_compositing_files, process_frame, rethreshold_frame, write_frame, \
+    has_outputs, ManifestWriter, ModelConfig, MAX_DEPTH_DIFF, MANIFEST_SAVE_INTERVAL
+from manifest import MANIFEST_FILENAME, load_manifest
+from vertmap_io import find_vertmap, vertmap_filename
 
 
 class TestMakeSegmentationImgs(unittest.TestCase):
@@ -61,7 +73,7 @@ class TestMakeSegmentationImgs(unittest.TestCase):
             }
             """
         )
-        actual_json = get_cuboid(object_pose, cuboid_dimensions, camera_intrinsics)
+        actual_json = get_cuboid(object_pose.matrix, cuboid_dimensions, camera_intrinsics)
 
         np.testing.assert_almost_equal(actual_json['cuboid_centroid'],
                                        expected_json['cuboid_centroid'], decimal=4)
@@ -101,6 +113,226 @@ class TestMakeSegmentationImgs(unittest.TestCase):
         vis = get_cuboid2d_visibility(cuboid2d, img_width, img_height)
         self.assertAlmostEqual(vis, 0.0)
 
+    def test_overlay_depth_images(self):
+        depth_0 = np.array([[0.0, 1.0, 1.0],
+                            [0.0, 1.0, 1.0]], dtype=np.float32)
+        depth_1 = np.array([[2.0, 2.0, 0.5],
+                            [0.0, 0.0, 0.0]], dtype=np.float32)
+        for rois in [None, [(1, 0, 2, 1), (0, 0, 2, 0)]]:
+            depth_images = [DepthImage(depth_0, frame='camera'), DepthImage(depth_1, frame='camera')]
+            combined_depth_image, object_index_image, silhouette_bounds = overlay_depth_images(depth_images, rois)
+            np.testing.assert_array_equal(combined_depth_image[:, :, 0], [[2.0, 1.0, 0.5],
+                                                                          [0.0, 1.0, 1.0]])
+            np.testing.assert_array_equal(object_index_image[:, :, 0], [[1, 0, 1],
+                                                                        [255, 0, 0]])
+            self.assertEqual(silhouette_bounds, ([4, 3], [(0, 1, 1, 2), (0, 0, 0, 2)]))
+            # the depth images are freed while overlaying
+            self.assertEqual(depth_images, [None, None])
+
+    def test_bounds_overlap(self):
+        self.assertTrue(bounds_overlap((0, 0, 10, 10), (10, 10, 20, 20)))
+        self.assertFalse(bounds_overlap((0, 0, 10, 10), (11, 0, 20, 10)))
+        self.assertFalse(bounds_overlap((0, 0, 10, 10), (0, 11, 10, 20)))
+
+    def test_get_projected_bounds(self):
+        mesh = trimesh.creation.box(extents=[0.1, 0.1, 0.1])
+        camera_intrinsics = CameraIntrinsics(frame='camera', fx=500.0, fy=500.0, cx=320.0, cy=240.0, skew=0.0,
+                                             height=480, width=640)
+
+        object_pose = RigidTransform(translation=np.array([0.0, 0.0, 1.0]), from_frame='target_model',
+                                     to_frame='camera')
+        self.assertEqual(get_projected_bounds(object_pose.matrix, mesh, camera_intrinsics), (292, 212, 348, 268))
+
+        # entirely left of the image: the region is empty, so that it does not select any pixels when sliced
+        object_pose = RigidTransform(translation=np.array([-2.0, 0.0, 1.0]), from_frame='target_model',
+                                     to_frame='camera')
+        (umin, vmin, umax, vmax) = get_projected_bounds(object_pose.matrix, mesh, camera_intrinsics)
+        self.assertEqual(np.zeros((480, 640))[vmin:vmax + 1, umin:umax + 1].size, 0)
+
+    def test_get_vertmap(self):
+        camera_intrinsics = CameraIntrinsics(frame='camera', fx=50.0, fy=50.0, cx=16.0, cy=12.0, skew=0.0,
+                                             height=24, width=32)
+        object_poses = [RigidTransform(rotation=RigidTransform.x_axis_rotation(0.3),
+                                       translation=np.array([0.1, 0.0, 1.0]), from_frame='camera', to_frame='camera'),
+                        RigidTransform(translation=np.array([0.0, 0.2, 1.5]), from_frame='camera', to_frame='camera')]
+        depth = np.random.RandomState(0).uniform(0.5, 2.0, (24, 32, 1)).astype(np.float32)
+        object_index_image = np.full((24, 32, 1), 255, dtype=np.uint8)
+        object_index_image[2:10, 3:20] = 0
+        object_index_image[8:20, 15:30] = 1
+        depth[object_index_image == 255] = 0.0
+
+        vertmap = get_vertmap(depth, object_index_image, camera_intrinsics,
+                              np.array([object_pose.matrix for object_pose in object_poses]),
+                              [(3, 2, 19, 9), (15, 8, 29, 19)])
+
+        # same as deprojecting and transforming the whole image for every object
+        points_camera = camera_intrinsics.deproject(DepthImage(depth, frame='camera'))
+        expected_vertmap = np.zeros((24, 32, 3))
+        for object_index in range(2):
+            points_model = np.transpose(object_poses[object_index].inverse().apply(points_camera).data)
+            expected_vertmap = np.where(object_index_image == object_index, points_model.reshape(24, 32, 3),
+                                        expected_vertmap)
+        np.testing.assert_array_equal(vertmap, expected_vertmap)
+
+    def test_get_segmentation_image_depth_filter(self):
+        camera_intrinsics = CameraIntrinsics(frame='camera', fx=50.0, fy=50.0, cx=16.0, cy=12.0, skew=0.0,
+                                             height=24, width=32)
+        random_state = np.random.RandomState(0)
+        depth_0 = np.zeros((24, 32, 1), dtype=np.float32)
+        depth_0[2:10, 3:20] = random_state.uniform(0.5, 2.0, (8, 17, 1))
+        depth_1 = np.zeros((24, 32, 1), dtype=np.float32)
+        depth_1[8:20, 15:30] = random_state.uniform(0.5, 2.0, (12, 15, 1))
+        combined_depth_image, object_index_image, silhouette_bounds = overlay_depth_images(
+            [DepthImage(depth_0, frame='camera'), DepthImage(depth_1, frame='camera')])
+
+        # raw values of the depth PNG: 1/10000 m, some pixels without measurement and some off by more than the limit
+        real_depth_raw = np.round(combined_depth_image * 10000.0 + random_state.normal(0.0, 300.0, (24, 32, 1)))
+        real_depth_raw[random_state.uniform(size=(24, 32, 1)) < 0.1] = 0
+        real_depth_raw = np.clip(real_depth_raw, 0, 65535).astype(np.uint16)
+
+        frame_json = {'objects': [{'class': 'a', 'projected_cuboid': [[2, 2], [20, 2], [20, 20], [2, 20]]},
+                                  {'class': 'b', 'projected_cuboid': [[2, 2], [20, 2], [20, 20], [2, 20]]}]}
+        models = {'a': ModelConfig('a', 10, None, None, None), 'b': ModelConfig('b', 20, None, None, None)}
+        object_poses = np.array([np.eye(4), np.eye(4)])
+        real_depth_image = real_depth_raw / 10000.0
+        self.assertEqual(silhouette_bounds, ([8 * 17, 12 * 15], [(2, 3, 9, 19), (8, 15, 19, 29)]))
+        self.assertEqual(get_mask_bounds(depth_0[:, :, 0] > 0), (8 * 17, (2, 3, 9, 19)))
+        self.assertEqual(get_mask_bounds(depth_1[5:, 10:, 0] > 0, 10, 5), (12 * 15, (8, 15, 19, 29)))
+        for max_depth_diff in [MAX_DEPTH_DIFF, 0.02]:
+            segmentation_image, updated_frame_json, _ = get_segmentation_image(
+                frame_json, combined_depth_image, object_index_image, silhouette_bounds, real_depth_raw,
+                camera_intrinsics, object_poses, models, real_depth_scale=10000.0, max_depth_diff=max_depth_diff)
+
+            # same as comparing with the real depth image converted to meters
+            expected_index_image = np.where(np.logical_or(real_depth_image == 0.0, np.absolute(
+                combined_depth_image - real_depth_image) < max_depth_diff), object_index_image, 255)
+            np.testing.assert_array_equal(segmentation_image, np.array([10, 20] + 254 * [0])[expected_index_image])
+            self.assertGreater(np.count_nonzero(expected_index_image != object_index_image), 0)
+            for object_index in range(2):
+                self.assertAlmostEqual(updated_frame_json['objects'][object_index]['visibility'],
+                                       float(np.sum(expected_index_image == object_index)) /
+                                       silhouette_bounds[0][object_index])
+
+    def test_select_frames(self):
+        json_files = ['/data/{:06d}.ycbm.json'.format(i) for i in range(0, 30, 3)]
+        self.assertEqual(select_frames(json_files), json_files)
+        self.assertEqual(select_frames(json_files, (3, 9)), ['/data/000003.ycbm.json', '/data/000006.ycbm.json'])
+        self.assertEqual(select_frames(json_files, (None, 4), '*3.ycbm.json'), ['/data/000003.ycbm.json'])
+
+    def test_frame_is_complete(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            json_file = os.path.join(tmp_dir, '000000.ycbm.json')
+            depth_file = os.path.join(tmp_dir, '000000.depth.png')
+            self.assertFalse(frame_is_complete(json_file))
+            with open(json_file, 'w') as f:
+                f.write('{"objects": [')
+            imageio.imwrite(depth_file, np.zeros((4, 4), dtype=np.uint16))
+            self.assertFalse(frame_is_complete(json_file))
+            with open(json_file, 'w') as f:
+                f.write('{"objects": []}')
+            self.assertTrue(frame_is_complete(json_file))
+            self.assertFalse(frame_is_complete(json_file, require_image=True))
+            open(os.path.join(tmp_dir, '000000.rgb.jpg'), 'w').close()
+            self.assertTrue(frame_is_complete(json_file, require_image=True))
+
+            with open(depth_file, 'rb') as f:
+                png = f.read()
+            for length in [5, len(png) - 1]:
+                with open(depth_file, 'wb') as f:
+                    f.write(png[:length])
+                self.assertFalse(frame_is_complete(json_file))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_frame_done_saves_manifest(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            args = argparse.Namespace(incremental=True, data_dir=tmp_dir, shard=None)
+            # a forced re-run: all frames are in the manifest already, so its size does not change
+            json_files = ['{:06d}.ycbm.json'.format(i) for i in range(2 * MANIFEST_SAVE_INTERVAL)]
+            manifest = {json_file: 'old' for json_file in json_files}
+            input_hashes = {json_file: 'new' for json_file in json_files}
+            manifest_writer = ManifestWriter(manifest, input_hashes, tmp_dir)
+            for i, json_file in enumerate(json_files):
+                frame_done(json_file, args, manifest_writer)
+                saved = load_manifest(tmp_dir)
+                if i + 1 < MANIFEST_SAVE_INTERVAL:
+                    self.assertFalse(os.path.exists(os.path.join(tmp_dir, MANIFEST_FILENAME)))
+                elif i + 1 == MANIFEST_SAVE_INTERVAL:
+                    self.assertEqual(saved[json_files[i]], 'new')
+                    self.assertEqual(saved[json_files[i + 1]], 'old')
+                elif i + 1 < 2 * MANIFEST_SAVE_INTERVAL:
+                    # not saved again after every frame
+                    self.assertEqual(saved[json_files[i]], 'old')
+            self.assertEqual(load_manifest(tmp_dir), input_hashes)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_frame_without_objects(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            camera_intrinsics = CameraIntrinsics(frame='camera', fx=500.0, fy=500.0, cx=16.0, cy=12.0, skew=0.0,
+                                                 height=24, width=32)
+            real_depth_image = np.zeros((24, 32, 1), dtype=np.uint16)
+            outputs = process_frame({'objects': []}, real_depth_image, camera_intrinsics, {}, 1.0)
+            self.assertEqual(len(outputs), 4)
+            self.assertFalse(has_outputs(outputs))
+            self.assertEqual(rethreshold_frame({'objects': []}, real_depth_image, None, camera_intrinsics, {}, 1.0,
+                                               MAX_DEPTH_DIFF), outputs)
+
+            # nothing is written and the frame is not recorded in the manifest, so that it is checked again
+            json_file = os.path.join(tmp_dir, '000000.ycbm.json')
+            args = argparse.Namespace(incremental=True, data_dir=tmp_dir, shard=None)
+            write_frame(json_file, args, *outputs)
+            manifest = {}
+            frame_done(json_file, args, ManifestWriter(manifest, {json_file: 'hash'}, tmp_dir),
+                       frame_has_outputs=has_outputs(outputs))
+            self.assertEqual(os.listdir(tmp_dir), [])
+            self.assertEqual(manifest, {})
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_write_frame_vertmap_format(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            json_file = os.path.join(tmp_dir, '000000.ycbm.json')
+            filename_prefix = os.path.join(tmp_dir, '000000.')
+            segmentation_image = np.zeros((24, 32, 1), dtype=np.uint8)
+            segmentation_image[2:10, 3:20] = 12
+            vertmap = np.zeros((24, 32, 3))
+            vertmap[2:10, 3:20] = 0.05
+            outputs = (segmentation_image, {'objects': []}, vertmap)
+            args = argparse.Namespace(no_save_full_json=True, output_unit_scaling=None, no_save_vertmap=False,
+                                      vertmap_format='sparse')
+            write_frame(json_file, args, *outputs)
+            self.assertEqual(find_vertmap(filename_prefix), vertmap_filename(filename_prefix, 'sparse'))
+
+            # switching to a format that comes first in VERTMAP_FORMATS must not leave the old file behind
+            args.vertmap_format = 'npz'
+            write_frame(json_file, args, *outputs)
+            self.assertEqual(find_vertmap(filename_prefix), vertmap_filename(filename_prefix, 'npz'))
+            self.assertFalse(os.path.exists(vertmap_filename(filename_prefix, 'sparse')))
+
+            args.no_save_vertmap = True
+            write_frame(json_file, args, *outputs)
+            self.assertIsNone(find_vertmap(filename_prefix))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_check_compositing_files(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            json_files = [os.path.join(tmp_dir, '{:06d}.ycbm.json'.format(i)) for i in range(3)]
+            frame_classes = {json_files[0]: ['a'], json_files[1]: ['a', 'b'], json_files[2]: []}
+            open(os.path.join(tmp_dir, '000000.compositing.npz'), 'w').close()
+            # a frame without objects needs no compositing file
+            problems = check_compositing_files(json_files, frame_classes)
+            self.assertEqual(len(problems), 1)
+            self.assertIn('000001.ycbm.json', problems[0])
+            self.assertIn('--save-compositing', problems[0])
+        finally:
+            shutil.rmtree(tmp_dir)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,31 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from manifest import MANIFEST_FILENAME, inputs_hash, load_manifest, save_manifest
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_and_load_manifest(self):
+        self.assertEqual(load_manifest(self.tmp_dir), {})
+        frame_hashes = {'000000.ycbm.json': inputs_hash('a', 1.0), '000001.ycbm.json': inputs_hash('b', 1.0)}
+        save_manifest(self.tmp_dir, frame_hashes)
+        self.assertEqual(load_manifest(self.tmp_dir), frame_hashes)
+        self.assertEqual(os.listdir(self.tmp_dir), [MANIFEST_FILENAME])
+
+    def test_inputs_hash(self):
+        self.assertEqual(inputs_hash('a', [1, 2], 0.04), inputs_hash('a', [1, 2], 0.04))
+        self.assertNotEqual(inputs_hash('a', [1, 2], 0.04), inputs_hash('a', [2, 1], 0.04))
+        self.assertNotEqual(inputs_hash('a', [1, 2], 0.04), inputs_hash('a', [1, 2], 0.05))
+
+
+if __name__ == '__main__':
+    unittest.main()
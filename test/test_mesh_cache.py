@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import trimesh
+
+from mesh_cache import load_mesh, mesh_cache_key
+
+
+class TestMeshCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.mesh_path = os.path.join(self.tmp_dir, 'textured.obj')
+        trimesh.creation.icosphere(subdivisions=2).export(self.mesh_path)
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_mesh_cached(self):
+        mesh = load_mesh(self.mesh_path, 0.01, self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        cached_mesh = load_mesh(self.mesh_path, 0.01, self.cache_dir)
+        np.testing.assert_array_equal(cached_mesh.triangles, mesh.triangles)
+        np.testing.assert_array_equal(cached_mesh.triangles, load_mesh(self.mesh_path, 0.01, None).triangles)
+
+    def test_mesh_cache_key(self):
+        key = mesh_cache_key(self.mesh_path, 0.01)
+        self.assertNotEqual(key, mesh_cache_key(self.mesh_path, 1.0))
+
+        mtime = os.path.getmtime(self.mesh_path)
+        os.utime(self.mesh_path, (mtime + 10, mtime + 10))
+        self.assertNotEqual(key, mesh_cache_key(self.mesh_path, 0.01))
+
+
+if __name__ == '__main__':
+    unittest.main()
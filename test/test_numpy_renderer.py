@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+import trimesh
+from perception import CameraIntrinsics
+
+from make_segmentation_imgs import overlay_depth_images
+from numpy_renderer import NumpyRenderer
+
+
+class TestNumpyRenderer(unittest.TestCase):
+
+    def setUp(self):
+        camera_intrinsics = CameraIntrinsics(frame='camera', fx=500.0, fy=500.0, cx=320.0, cy=240.0, skew=0.0,
+                                             height=480, width=640)
+        meshes = {'box': trimesh.creation.box(extents=[0.1, 0.1, 0.1]),
+                  'small_box': trimesh.creation.box(extents=[0.02, 0.02, 0.02])}
+        self.renderer = NumpyRenderer(meshes, camera_intrinsics, 1.0)
+
+    @staticmethod
+    def pose(x, y, z):
+        object_pose = np.eye(4)
+        object_pose[:3, 3] = [x, y, z]
+        return object_pose
+
+    def test_render_depth_images(self):
+        [depth_image] = self.renderer.render_depth_images([self.pose(0.0, 0.0, 1.0)], ['box'])
+        depth = depth_image.data
+        self.assertEqual(depth.dtype, np.float32)
+
+        # the front face at z = 0.95 covers the pixel centers from 320 - 26.3 to 320 + 26.3
+        columns = np.nonzero(np.any(depth > 0, axis=0))[0]
+        rows = np.nonzero(np.any(depth > 0, axis=1))[0]
+        self.assertEqual((columns[0], columns[-1]), (294, 345))
+        self.assertEqual((rows[0], rows[-1]), (214, 265))
+        np.testing.assert_allclose(depth[depth > 0], 0.95, rtol=1e-6)
+
+    def test_render_scene(self):
+        object_poses = [self.pose(0.0, 0.0, 1.0), self.pose(0.0, 0.0, 0.5), self.pose(0.0, 0.0, -1.0)]
+        class_names = ['box', 'small_box', 'box']
+        combined_depth_image, object_index_image, silhouette_bounds = self.renderer.render_scene(object_poses,
+                                                                                                 class_names)
+
+        self.assertEqual(object_index_image[240, 320, 0], 1)
+        self.assertAlmostEqual(combined_depth_image[240, 320, 0], 0.49, places=6)
+        self.assertEqual(object_index_image[240, 300, 0], 0)
+        self.assertAlmostEqual(combined_depth_image[240, 300, 0], 0.95, places=6)
+        self.assertEqual(object_index_image[0, 0, 0], 255)
+        self.assertEqual(combined_depth_image[0, 0, 0], 0.0)
+
+        # silhouettes are not occluded; objects behind the camera are not rendered
+        (total_pixels, bounding_boxes) = silhouette_bounds
+        (vmin, umin, vmax, umax) = bounding_boxes[0]
+        self.assertTrue(vmin <= 240 <= vmax and umin <= 320 <= umax)
+        self.assertEqual(total_pixels[1], np.count_nonzero(object_index_image == 1))
+        self.assertEqual((total_pixels[2], bounding_boxes[2]), (0, None))
+
+        # the same as overlaying the separate depth images
+        self.assertEqual(silhouette_bounds, overlay_depth_images(self.renderer.render_depth_images(object_poses,
+                                                                                                  class_names))[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
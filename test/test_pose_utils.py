@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+from autolab_core import RigidTransform
+
+from pose_utils import compose, invert, object_pose_from_json, pose_transform_permuted_from_json, \
+    pose_transforms_permuted, poses_from_json, poses_from_rotations_translations, poses_to_json, \
+    quaternions_from_poses, rotations_from_quaternions
+
+
+class TestPoseUtils(unittest.TestCase):
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.quaternions_xyzw = random_state.randn(200, 4)
+        self.quaternions_xyzw[0] = [0.0, 0.0, 0.0, 0.0]  # degenerate: identity
+        self.quaternions_xyzw[1:50, [0, 3]] *= 0.01  # small trace, i.e. the other branch of quaternions_from_poses()
+        self.translations = random_state.uniform(-1.0, 1.0, (200, 3))
+        self.rigid_transforms = [
+            RigidTransform(rotation=RigidTransform.rotation_from_quaternion(np.roll(quaternion_xyzw, 1)),
+                           translation=translation, from_frame='a', to_frame='a')
+            for quaternion_xyzw, translation in zip(self.quaternions_xyzw, self.translations)]
+
+    def test_same_as_rigid_transform(self):
+        rotations = rotations_from_quaternions(self.quaternions_xyzw)
+        poses = poses_from_rotations_translations(rotations, self.translations)
+        quaternions_xyzw = quaternions_from_poses(poses)
+        inverse_poses = invert(poses)
+        composed_poses = compose(poses, poses[::-1])
+        for i, rigid_transform in enumerate(self.rigid_transforms):
+            np.testing.assert_array_equal(poses[i], rigid_transform.matrix)
+            np.testing.assert_array_equal(quaternions_xyzw[i], np.roll(rigid_transform.quaternion, -1))
+            np.testing.assert_array_equal(inverse_poses[i], rigid_transform.inverse().matrix)
+            np.testing.assert_array_equal(composed_poses[i], rigid_transform.dot(self.rigid_transforms[-1 - i]).matrix)
+        np.testing.assert_allclose(compose(inverse_poses, poses), np.tile(np.eye(4), (200, 1, 1)), atol=1e-12)
+
+    def test_json(self):
+        scene_objects_json = [{'location': translation.tolist(), 'quaternion_xyzw': quaternion_xyzw.tolist()}
+                              for quaternion_xyzw, translation in zip(self.quaternions_xyzw, self.translations)]
+        poses = poses_from_json(scene_objects_json)
+        (translation, rotation) = object_pose_from_json(scene_objects_json[5])
+        np.testing.assert_array_equal(translation, poses[5, :3, 3])
+        np.testing.assert_array_equal(rotation, poses[5, :3, :3])
+
+        # round trip through location and quaternion_xyzw
+        np.testing.assert_allclose(poses_from_json(poses_to_json(poses)), poses, atol=1e-12)
+
+        # round trip through pose_transform_permuted
+        for pose, pose_transform_permuted in zip(poses, pose_transforms_permuted(poses)):
+            (translation, rotation) = pose_transform_permuted_from_json(
+                {'pose_transform_permuted': pose_transform_permuted.tolist()})
+            np.testing.assert_array_equal(translation, pose[:3, 3])
+            np.testing.assert_array_equal(rotation, pose[:3, :3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+import imageio
+import numpy as np
+
+from process_dataset import CONFIG_DIR, find_folders, process_folder
+
+
+class TestProcessDataset(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def touch(self, *path):
+        path = os.path.join(self.tmp_dir, *path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+
+    def test_find_folders(self):
+        self.touch('b', '_camera_settings.json')
+        self.touch('a', 'x', '_camera_settings.json')
+        self.touch('a', 'y', '000000.ycbm.json')
+        self.assertEqual(find_folders(self.tmp_dir),
+                         [os.path.join(self.tmp_dir, 'a', 'x'), os.path.join(self.tmp_dir, 'b')])
+
+    def make_folder(self, name):
+        folder = os.path.join(self.tmp_dir, name)
+        os.makedirs(folder)
+        with open(os.path.join(folder, '_camera_settings.json'), 'w') as f:
+            json.dump({'camera_settings': [{'intrinsic_settings': {'resX': 32, 'resY': 24, 'fx': 500.0, 'fy': 500.0,
+                                                                   'cx': 16.0, 'cy': 12.0, 's': 0}}]}, f)
+        with open(os.path.join(folder, '000000.ycbm.json'), 'w') as f:
+            json.dump({'objects': [{'class': '010_potted_meat_can', 'location': [0.0, 0.0, 1.0],
+                                    'quaternion_xyzw': [0.0, 0.0, 0.0, 1.0]}]}, f)
+        imageio.imwrite(os.path.join(folder, '000000.depth.png'), np.zeros((24, 32), dtype=np.uint16))
+        self.touch(name, '000000.rgb.jpg')
+        return folder
+
+    def test_process_folder_failure(self):
+        args = argparse.Namespace(folder_object_settings=None)
+        tool_argv = ['--mesh-dir', os.path.join(self.tmp_dir, 'meshes'), '--no-mesh-cache',
+                     '--object-settings', os.path.join(CONFIG_DIR, 'ycb_object_settings.json'),
+                     '--target-object-settings', os.path.join(CONFIG_DIR, 'aligned_m_object_settings.json')]
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            # the mesh of the object is missing
+            self.assertFalse(process_folder(self.make_folder('a'), args, tool_argv, None))
+            # make_segmentation_imgs.py exits (here: in parser.error())
+            self.assertFalse(process_folder(self.make_folder('b'), args, tool_argv + ['--watch', '--workers', '2'],
+                                            None))
+        finally:
+            log_output = sys.stdout.getvalue()
+            sys.stdout = stdout
+        self.assertIn('string is not a file: ' + os.path.join(self.tmp_dir, 'meshes', '010_potted_meat_can'),
+                      log_output)
+        self.assertIn('exited with status 2', log_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
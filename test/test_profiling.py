@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from profiling import Profiler, SETUP
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_disabled(self):
+        profiler = Profiler()
+        with profiler.frame('000000.ycbm.json'), profiler.stage('render'):
+            pass
+        self.assertEqual(profiler.finish_frame('000000.ycbm.json')['stages'], {})
+        self.assertIsNone(profiler.stop())
+
+    def test_stages(self):
+        profiler = Profiler()
+        trace_path = os.path.join(self.tmp_dir, 'trace.jsonl')
+        profiler.start(trace_path)
+        with profiler.stage('mesh_load'):
+            time.sleep(0.01)
+
+        def write():
+            with profiler.frame('/data/000000.ycbm.json'), profiler.stage('png_encode'):
+                time.sleep(0.01)
+
+        with profiler.frame('/data/000000.ycbm.json'):
+            with profiler.stage('compositing'):
+                time.sleep(0.01)
+                # nested stages are only counted once
+                with profiler.stage('vertmap'):
+                    time.sleep(0.05)
+            thread = threading.Thread(target=write)
+            thread.start()
+            thread.join()
+        profiler.add_record(profiler.finish_frame('/data/000000.ycbm.json'))
+        summary = profiler.stop()
+
+        with open(trace_path, 'r') as f:
+            [frame_record, setup_record] = [json.loads(line) for line in f]
+        self.assertEqual(frame_record['frame'], '000000.ycbm.json')
+        self.assertEqual(sorted(frame_record['stages']), ['compositing', 'png_encode', 'vertmap'])
+        self.assertGreaterEqual(frame_record['stages']['vertmap'], 0.05)
+        self.assertLess(frame_record['stages']['compositing'], 0.04)
+        self.assertAlmostEqual(frame_record['total'], sum(frame_record['stages'].values()))
+        self.assertGreater(frame_record['peak_rss_mb'], 0.0)
+        self.assertEqual(setup_record['frame'], SETUP)
+        self.assertEqual(list(setup_record['stages']), ['mesh_load'])
+
+        self.assertIn('1 frames', summary)
+        self.assertIn('peak RSS', summary)
+        self.assertEqual([line.split()[0] for line in summary.splitlines()[3:]],
+                         ['vertmap', 'compositing', 'png_encode', 'total'])
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'the peak memory can only be reset on Linux')
+    def test_peak_rss_per_frame(self):
+        profiler = Profiler()
+        profiler.start()
+        with profiler.frame('000000.ycbm.json'):
+            np.ones(100 * 1024 * 1024 // 8)  # 100 MB, freed right away
+        first_record = profiler.finish_frame('000000.ycbm.json')
+        second_record = profiler.finish_frame('000001.ycbm.json')
+        profiler.stop()
+        # the peak of the first frame is not carried over to the second one
+        self.assertGreater(first_record['peak_rss_mb'] - second_record['peak_rss_mb'], 50.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from StringIO import StringIO
+
+import segmentation_daemon
+from segmentation_daemon import absolute_paths, submit
+
+
+class TestSegmentationDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_absolute_paths(self):
+        cwd = os.getcwd()
+        self.assertEqual(absolute_paths(['-d', 'data', '--mesh-dir=meshes', '--profile', '--incremental', '-o', '/a']),
+                         ['-d', os.path.join(cwd, 'data'), '--mesh-dir=' + os.path.join(cwd, 'meshes'), '--profile',
+                          '--incremental', '-o', '/a'])
+
+    def test_serve(self):
+        socket_path = os.path.join(self.tmp_dir, 'daemon.sock')
+        # a separate process, since a job redirects sys.stdout of the whole server process
+        script = os.path.splitext(segmentation_daemon.__file__)[0] + '.py'
+        server = subprocess.Popen([sys.executable, script, 'serve', '--socket', socket_path, '-m', self.tmp_dir],
+                                  stdout=open(os.devnull, 'w'))
+        for _ in range(500):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.01)
+
+        stdout = sys.stdout
+        sys.stdout = output = StringIO()
+        try:
+            # the job fails, but the server keeps running
+            self.assertEqual(submit(socket_path, ['--no-such-option']), 2)
+            self.assertEqual(submit(socket_path, ['--merge-shards', '2', '-d', self.tmp_dir]), 1)
+            self.assertEqual(submit(socket_path, None), 0)
+        finally:
+            sys.stdout = stdout
+            for _ in range(500):
+                if server.poll() is not None:
+                    break
+                time.sleep(0.01)
+            else:
+                server.kill()
+        self.assertIn('unrecognized arguments: --no-such-option', output.getvalue())
+        self.assertIn('ERROR: shard 1/2 is not done', output.getvalue())
+        self.assertFalse(os.path.exists(socket_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import shutil
+import tempfile
+import unittest
+
+from sharding import FRAMES, check_markers, load_markers, parse_range, parse_shard, remove_markers, select_glob, \
+    select_shard, write_marker
+
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('1/4'), (1, 4))
+        self.assertEqual(parse_shard('4/4'), (4, 4))
+        for text in ['0/4', '5/4', '1', '1/x']:
+            self.assertRaises(argparse.ArgumentTypeError, parse_shard, text)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('10:20'), (10, 20))
+        self.assertEqual(parse_range(':20'), (None, 20))
+        self.assertEqual(parse_range('10:'), (10, None))
+        self.assertRaises(argparse.ArgumentTypeError, parse_range, '10')
+
+    def test_select(self):
+        items = ['{:06d}.ycbm.json'.format(i) for i in range(10)]
+        shards = [select_shard(items, (k, 3)) for k in [1, 2, 3]]
+        self.assertEqual(shards[0], ['000000.ycbm.json', '000003.ycbm.json', '000006.ycbm.json', '000009.ycbm.json'])
+        self.assertEqual(sorted(sum(shards, [])), items)
+        self.assertEqual(select_glob(items, '00000[12]*'), ['000001.ycbm.json', '000002.ycbm.json'])
+
+    def test_check_markers(self):
+        items = ['a', 'b', 'c']
+        write_marker(self.tmp_dir, FRAMES, (1, 2), ['a', 'c'], {'frame_glob': None})
+        markers = load_markers(self.tmp_dir, FRAMES, 2)
+        self.assertEqual(check_markers(markers, items, 2), ['shard 2/2 is not done', 'b was not processed'])
+
+        write_marker(self.tmp_dir, FRAMES, (2, 2), ['b', 'c'], {'frame_glob': None})
+        markers = load_markers(self.tmp_dir, FRAMES, 2)
+        self.assertEqual(check_markers(markers, items, 2), ['c was processed by 2 shards'])
+
+        write_marker(self.tmp_dir, FRAMES, (2, 2), ['b'], {'frame_glob': None})
+        markers = load_markers(self.tmp_dir, FRAMES, 2)
+        self.assertEqual(check_markers(markers, items, 2), [])
+        self.assertEqual(check_markers(markers, ['a', 'b'], 2), ['c was processed, but is not selected (any more)'])
+
+        write_marker(self.tmp_dir, FRAMES, (2, 2), ['b'], {'frame_glob': '*'})
+        markers = load_markers(self.tmp_dir, FRAMES, 2)
+        self.assertEqual(check_markers(markers, items, 2), ['the shards were run with different selections'])
+
+        remove_markers(self.tmp_dir, FRAMES, 2)
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
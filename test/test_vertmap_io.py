@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from vertmap_io import VERTMAP_FORMATS, find_vertmap, load_vertmap, save_vertmap
+
+
+class TestVertmapIO(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename_prefix = os.path.join(self.tmp_dir, '000000.')
+
+        random_state = np.random.RandomState(0)
+        self.labels = np.zeros((24, 32, 1), dtype=np.uint8)
+        self.labels[2:10, 3:20] = 12
+        self.labels[8:20, 15:30] = 24
+        self.vertmap = random_state.uniform(-0.1, 0.1, (24, 32, 3))
+        self.vertmap[self.labels[:, :, 0] == 0] = 0.0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_lossless_formats(self):
+        for vertmap_format in ['npz', 'npy', 'npy.gz', 'sparse']:
+            path = save_vertmap(self.filename_prefix, self.vertmap, self.labels, vertmap_format)
+            vertmap = load_vertmap(path)
+            self.assertEqual(vertmap.dtype, self.vertmap.dtype)
+            np.testing.assert_array_equal(vertmap, self.vertmap)
+
+    def test_lossy_formats(self):
+        path = save_vertmap(self.filename_prefix, self.vertmap, self.labels, 'float16')
+        np.testing.assert_allclose(load_vertmap(path, mmap_mode='r'), self.vertmap, atol=1e-4)
+
+        path = save_vertmap(self.filename_prefix, self.vertmap, self.labels, 'uint16')
+        vertmap = load_vertmap(path)
+        np.testing.assert_allclose(vertmap, self.vertmap, atol=0.2 / 65535)
+        np.testing.assert_array_equal(vertmap[self.labels[:, :, 0] == 0], 0.0)
+
+    def test_find_vertmap(self):
+        self.assertIsNone(find_vertmap(self.filename_prefix))
+        for vertmap_format in VERTMAP_FORMATS:
+            path = save_vertmap(self.filename_prefix, self.vertmap, self.labels, vertmap_format)
+            self.assertEqual(find_vertmap(self.filename_prefix), path)
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
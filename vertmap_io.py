@@ -0,0 +1,151 @@
+"""
+Storage formats for vertmaps.
+
+The default format (a compressed .npz file, as read by the PoseCNN loader) is slow to write and read. The other formats
+trade file size, precision and speed differently:
+
+    npz       np.savez_compressed, lossless (default)
+    npy       uncompressed .npy, lossless, can be memory-mapped
+    npy.gz    .npy with fast gzip compression (level 1), lossless
+    float16   uncompressed .npy in half precision, can be memory-mapped
+    uint16    coordinates quantized to 16 bits over the range of each class in the frame, plus the class labels
+    sparse    pixel indices and coordinates of the labelled pixels only, lossless
+
+load_vertmap() reads any of them back into an H x W x 3 array.
+"""
+import collections
+import gzip
+import os
+
+import numpy as np
+
+# format name -> filename suffix
+VERTMAP_FORMATS = collections.OrderedDict([
+    ('npz', 'vertmap.npz'),
+    ('npy', 'vertmap.npy'),
+    ('npy.gz', 'vertmap.npy.gz'),
+    ('float16', 'vertmap.f16.npy'),
+    ('uint16', 'vertmap.u16.npz'),
+    ('sparse', 'vertmap.sparse.npz'),
+])
+
+QUANTIZATION_LEVELS = 65535
+
+
+def vertmap_filename(filename_prefix, vertmap_format='npz'):
+    # type: (str, str) -> str
+    return filename_prefix + VERTMAP_FORMATS[vertmap_format]
+
+
+def save_vertmap(filename_prefix, vertmap, labels, vertmap_format='npz'):
+    # type: (str, np.array, np.array, str) -> str
+    """
+    :param filename_prefix: e.g. '/path/to/000000.'
+    :param vertmap: H x W x 3 array
+    :param labels: H x W (x 1) segmentation image; the vertmap is 0 wherever the label is 0
+    :param vertmap_format: one of VERTMAP_FORMATS
+    :return path of the written file
+    """
+    path = vertmap_filename(filename_prefix, vertmap_format)
+    labels = labels.reshape(vertmap.shape[:2])
+    if vertmap_format == 'npz':
+        np.savez_compressed(path, vertmap=vertmap)
+    elif vertmap_format == 'npy':
+        np.save(path, vertmap)
+    elif vertmap_format == 'npy.gz':
+        f = gzip.open(path, 'wb', compresslevel=1)
+        try:
+            np.lib.format.write_array(f, np.ascontiguousarray(vertmap))
+        finally:
+            f.close()
+    elif vertmap_format == 'float16':
+        np.save(path, vertmap.astype(np.float16))
+    elif vertmap_format == 'uint16':
+        class_ids = np.unique(labels[labels != 0])
+        offsets = np.zeros((len(class_ids), 3))
+        scales = np.ones((len(class_ids), 3))
+        quantized = np.zeros(vertmap.shape, dtype=np.uint16)
+        for i, class_id in enumerate(class_ids):
+            mask = labels == class_id
+            points = vertmap[mask]
+            offsets[i] = np.min(points, axis=0)
+            extent = np.max(points, axis=0) - offsets[i]
+            scales[i] = np.where(extent > 0, extent / QUANTIZATION_LEVELS, 1.0)
+            quantized[mask] = np.round((points - offsets[i]) / scales[i]).astype(np.uint16)
+        np.savez(path, quantized=quantized, labels=labels.astype(np.uint8), class_ids=class_ids, offsets=offsets,
+                 scales=scales)
+    elif vertmap_format == 'sparse':
+        indices = np.flatnonzero(labels).astype(np.uint32)
+        np.savez(path, shape=np.array(vertmap.shape), indices=indices, xyz=vertmap.reshape(-1, 3)[indices])
+    else:
+        raise ValueError('Unknown vertmap format: {}'.format(vertmap_format))
+    return path
+
+
+def load_vertmap(path, mmap_mode=None):
+    # type: (str, str) -> np.array
+    """
+    Loads a vertmap in any of the VERTMAP_FORMATS, which is determined from the filename.
+
+    :param mmap_mode: passed on to np.load for the uncompressed formats (npy, float16)
+    :return H x W x 3 array; float16 for the float16 format, float32 for the uint16 format and the stored dtype
+            otherwise
+    """
+    vertmap_format = get_vertmap_format(path)
+    if vertmap_format == 'npz':
+        with np.load(path) as npz:
+            return npz['vertmap']
+    elif vertmap_format in ('npy', 'float16'):
+        return np.load(path, mmap_mode=mmap_mode)
+    elif vertmap_format == 'npy.gz':
+        f = gzip.open(path, 'rb')
+        try:
+            return np.lib.format.read_array(f)
+        finally:
+            f.close()
+    elif vertmap_format == 'uint16':
+        with np.load(path) as npz:
+            labels = npz['labels']
+            offsets = np.zeros((256, 3), dtype=np.float32)
+            scales = np.zeros((256, 3), dtype=np.float32)
+            offsets[npz['class_ids']] = npz['offsets']
+            scales[npz['class_ids']] = npz['scales']
+            return npz['quantized'] * scales[labels] + offsets[labels]
+    else:
+        with np.load(path) as npz:
+            xyz = npz['xyz']
+            vertmap = np.zeros(tuple(npz['shape']), dtype=xyz.dtype)
+            vertmap.reshape(-1, 3)[npz['indices']] = xyz
+            return vertmap
+
+
+def remove_vertmaps(filename_prefix, keep_format=None):
+    # type: (str, str) -> None
+    """
+    Removes the vertmap files of a frame in all VERTMAP_FORMATS except keep_format, so that find_vertmap() does not
+    return a stale vertmap written in another format.
+    """
+    for vertmap_format in VERTMAP_FORMATS:
+        path = vertmap_filename(filename_prefix, vertmap_format)
+        if vertmap_format != keep_format and os.path.exists(path):
+            os.remove(path)
+
+
+def get_vertmap_format(path):
+    # type: (str) -> str
+    for vertmap_format, suffix in VERTMAP_FORMATS.items():
+        if path.endswith(suffix):
+            return vertmap_format
+    raise ValueError('Not a vertmap file: {}'.format(path))
+
+
+def find_vertmap(filename_prefix):
+    # type: (str) -> str
+    """
+    :return path of the vertmap of a frame in any of the VERTMAP_FORMATS, or None if there is none
+    """
+    for vertmap_format in VERTMAP_FORMATS:
+        path = vertmap_filename(filename_prefix, vertmap_format)
+        if os.path.exists(path):
+            return path
+    return None